@@ -6,9 +6,6 @@
 # The University of British Columbia, Okanagan
 ###############################################
 
-import multiprocessing
-import psutil
-import time
 import os
 import sys
 import glob
@@ -22,78 +19,25 @@ except IndexError:
     pass
 
 import carla
-import utils
+from scenario import Scenario, run_scenario
 import logging
 from numpy import random
-import TTS
-def get_actor_blueprints(world, filter, generation):
-    bps = world.get_blueprint_library().filter(filter)
 
-    if generation.lower() == "all":
-        return bps
 
-    # If the filter returns only one bp, we assume that this one needed
-    # and therefore, we ignore the generation
-    if len(bps) == 1:
-        return bps
+class ExtremeWeather(Scenario):
+    name = "EW"
+    speed_difference = -500.0
+    # Measure handover performance for 10 seconds of simulation time
+    handover_duration = 10
 
-    try:
-        int_generation = int(generation)
-        # Check if generation is in available generations
-        if int_generation in [1, 2]:
-            bps = [x for x in bps if int(x.get_attribute('generation')) == int_generation]
-            return bps
-        else:
-            print("   Warning! Actor Generation is not valid. No actor will be spawned.")
-            return []
-    except:
-        print("   Warning! Actor Generation is not valid. No actor will be spawned.")
-        return []
+    #####:EDIT:#####
+    number_of_vehicles = 40
+    #####:EDIT:#####
 
+    def setup(self, run):
+        world = run.world
+        number_of_vehicles = self.number_of_vehicles
 
-def run(CONTENT_FOLDER_PATH):
-
-    ################## Signal Reading and software logging ##################
-    SIGNAL_FILE_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/SignalFile.txt")
-    DATA_FOLDER_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/DataFiles")
-    CONFIG_FILE_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/config.txt")
-    RSVP_STREAM_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/TTSStreamFile.txt")
-    SENTENCE_INDEX_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/SentenceIndexFile.txt")
-
-    configurations = utils.read_config_file(CONFIG_FILE_PATH)
-    print("Extracted settings: " + str(configurations))
-    #########################################################################
-
-    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
-
-    vehicles_list = []
-    client = carla.Client('127.0.0.1', 2000)
-    client.set_timeout(10.0)
-    synchronous_master = False
-
-    try:
-        client = carla.Client('127.0.0.1', 2000)
-        client.set_timeout(10.0)
-        world = client.get_world()
-        world.set_weather(carla.WeatherParameters.MidRainyNoon)
-
-        traffic_manager = client.get_trafficmanager()
-        traffic_manager.set_global_distance_to_leading_vehicle(2)
-        settings = world.get_settings()
-        traffic_manager.set_synchronous_mode(True)
-        if not settings.synchronous_mode:   
-            settings.synchronous_mode = True
-            settings.fixed_delta_seconds = 1.0/80
-        world.tick()
-
-        blueprints = get_actor_blueprints(world, 'vehicle.*', 'All')
-        blueprints = [bp for bp in blueprints if "dreyevr" not in bp.id and int(bp.get_attribute('number_of_wheels')) != 2]
-        blueprints = sorted(blueprints, key=lambda bp: bp.id)
-
-        #####:EDIT:#####
-        number_of_vehicles = 40
-        #####:EDIT:#####
-        
         spawn_points = world.get_map().get_spawn_points()
         number_of_spawn_points = len(spawn_points)
 
@@ -116,7 +60,7 @@ def run(CONTENT_FOLDER_PATH):
         for n, transform in enumerate(spawn_points):
             if n >= number_of_vehicles:
                 break
-            blueprint = random.choice(blueprints)
+            blueprint = random.choice(run.blueprints)
             if blueprint.has_attribute('color'):
                 color = random.choice(blueprint.get_attribute('color').recommended_values)
                 blueprint.set_attribute('color', color)
@@ -126,130 +70,36 @@ def run(CONTENT_FOLDER_PATH):
 
             # spawn the cars and set their autopilot and light state all together
             batch.append(SpawnActor(blueprint, transform)
-                         .then(SetAutopilot(FutureActor, True, 8000)))
+                         .then(SetAutopilot(FutureActor, True, run.tm_port)))
 
-        for response in client.apply_batch_sync(batch, synchronous_master):
+        vehicle_ids = []
+        for response in run.client.apply_batch_sync(batch, False):
             if response.error:
                 logging.error(response.error)
             else:
-                vehicles_list.append(response.actor_id)
+                vehicle_ids.append(response.actor_id)
+        run.vehicles_list.extend(vehicle_ids)
 
         # Set automatic vehicle lights
-        all_vehicle_actors = world.get_actors(vehicles_list)
+        all_vehicle_actors = world.get_actors(vehicle_ids)
         for actor in all_vehicle_actors:
-            traffic_manager.update_vehicle_lights(actor, True)
-
-        # Increase the speed of the spawned and ego vehicle (in autopilot mode)
-        traffic_manager.global_percentage_speed_difference(-500.0)
-
-        # Enable autonomous mode for the ego-vehicle while doing the reading task.
-        DReyeVR_vehicle = utils.find_ego_vehicle(world)
-        traffic_manager.auto_lane_change(DReyeVR_vehicle, False)
-        DReyeVR_vehicle.set_autopilot(True, traffic_manager.get_port())
-        TOR_waypoint = world.get_map().get_waypoint(DReyeVR_vehicle.get_location()).next(1300)[0]
-        print("Successfully set autopilot on ego vehicle.")
-
-        # Give a signal to start reading comprehension task
-        utils.write_signal_file(SIGNAL_FILE_PATH, 0)
-        print("Starting reading comprehension task.")
-
-       # Once the reading task starts, run the TTS process if TTS is enabled.
-        try:
-            string = utils.extract_text(CONTENT_FOLDER_PATH + "/ConfigFiles/" + configurations["TEXTFILE"] + ".txt")
-            volume = 1.0 if int(configurations["TTS"]) == 1 else 0
-            process = multiprocessing.Process(target=TTS.speak, args=(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, string, int(configurations["WPM"]), 25, volume))
-            process.start()
-        except Exception as e:
-            print("Unable to start TTS process:", str(e))
-
-        # Disable autopilot and issue the TOR when the vehicle is close to the TOR waypoint
-        while DReyeVR_vehicle.get_location().distance(TOR_waypoint.transform.location) > 100:
-            world.tick()
-        # Pause the TTS process if it was executed
-        try:
-            process_ps = psutil.Process(process.pid)
-            if int(configurations["RSVP"]) == 1:
-                process_ps.terminate()
-                utils.reset_stream_file(RSVP_STREAM_FILE)
-            else:
-                process_ps.suspend()
-        except:
-            print("Unable to pause process")
-        print("TOR is issued.")
-
-        # Execute TOR scenerio
-        # Disable autopilot once TOR is issued
-        utils.write_signal_file(SIGNAL_FILE_PATH, 1)
-        DReyeVR_vehicle.set_autopilot(False, traffic_manager.get_port())
-        print("Autopilot disabled")
-        world.tick()
+            run.traffic_manager.update_vehicle_lights(actor, True)
 
+    def on_tor(self, run, frame):
         # Generate Extreme weather conditions
-        old_weather = generate_fog(world)
+        self.old_weather = generate_fog(run.world, run.driver)
         print("Extreme weather set")
-        world.tick()
-
-        # Measure handover performance
-        collision_data = []
-        lane_offset_data = []
-        # Start detecting collisions
-        utils.collision_performance(carla, world, DReyeVR_vehicle, collision_data)
-
-        target_time = time.time() + 10
-        last_logged_at = -1
-        while time.time() < target_time:
-            lane_offset, logged_at = utils.get_lane_offset(world, DReyeVR_vehicle, last_logged_at)
-            if lane_offset is not None and logged_at is not None:
-                lane_offset_data.append(lane_offset)
-                last_logged_at = logged_at
 
-            world.tick()
-
-        # Write the TOR performance data to the CSV files
-        utils.write_performance_data(DATA_FOLDER_PATH, configurations, lane_offset_data, collision_data, "EW")
-        
+    def recover(self, run):
         # Revert back original conditions i.e., normal weather
-        set_to_weather(world, old_weather)
-        DReyeVR_vehicle.set_autopilot(True, traffic_manager.get_port())
-        world.tick()
-
-        # After n seconds, send signal "2" to continue with the NDRT Task
-        utils.write_signal_file(SIGNAL_FILE_PATH, 2)
-        utils.wait(world, 3)
-        # Resume the TTS process if it was executed
-        try:
-            if int(configurations["RSVP"]) == 1:
-                file = open(SENTENCE_INDEX_FILE, "r")
-                sentence_index = int(file.read())
-                new_string = string[sentence_index:]
-                process = multiprocessing.Process(target=TTS.speak, args=(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, new_string, int(configurations["WPM"]), 25, volume))
-                process.start()
-            else:
-                process_ps.resume()
-        except:
-            print("Unable to resume the process")
-
-        # Wait for the NDRT to complete
-        utils.wait_for_NDRT(SIGNAL_FILE_PATH, world)
-        utils.wait(world, 5)
-
-        # Exit the program and disconnect the CARLA client connection
-    finally:
-        settings = world.get_settings()
-        settings.synchronous_mode = False
-        settings.no_rendering_mode = False
-        settings.fixed_delta_seconds = None
-        world.apply_settings(settings)
+        set_to_weather(run.world, self.old_weather)
 
-        print('\ndestroying %d non-ego vehicles' % len(vehicles_list))
-        client.apply_batch([carla.command.DestroyActor(x) for x in vehicles_list])
 
-        DReyeVR_vehicle.set_autopilot(False, traffic_manager.get_port())
-        DReyeVR_vehicle.enable_constant_velocity(carla.Vector3D(0, 0, 0))
-        DReyeVR_vehicle.apply_control(carla.VehicleControl(throttle=0, brake=1, manual_gear_shift=False, gear=0))
-        print("Successfully set manual control on ego vehicle")
+def run(CONTENT_FOLDER_PATH, config_overrides=None):
+    return run_scenario(ExtremeWeather(), CONTENT_FOLDER_PATH, config_overrides)
 
-def generate_fog(world):
+def generate_fog(world, driver):
+  # The fog thickens over 4.5 s of simulation time, ticked by the run's driver so the samplers see every tick
   old_weather = world.get_weather()
   for i in range(20, 61, 5):
     new_weather = carla.WeatherParameters(
@@ -268,7 +118,7 @@ def generate_fog(world):
       rayleigh_scattering_scale=old_weather.rayleigh_scattering_scale
     )
     world.set_weather(new_weather)
-    utils.wait(world, 0.5)
+    driver.run_for(0.5)
   return old_weather
 
 def set_to_weather(world, weather):
@@ -1,38 +1,62 @@
-import pyttsx3
+import multiprocessing
+import queue
 import time
 
-LOCAL_RSVP_STREAM_FILE = None
-LOCAL_STRING = None
-LOCAL_LAST_SENTENCE_FILE = None
+from rsvp_stream import END_OF_STREAM, open_stream_writer
+from text_corpus import PreparedText
+
+# Interval (s) at which the TTS service pumps the engine while it is speaking.
+POLL_INTERVAL = 0.01
+# Time (s) a client waits for the TTS service to acknowledge a pause.
+PAUSE_TIMEOUT = 1.0
+
+LOCAL_STREAM = None
+LOCAL_TEXT = None
+LOCAL_BASE = 0
+LOCAL_WORD = 0
+LOCAL_SPEAKING = False
 
 # engine = pyttsx3.init()
 def onWord(name, location, length):
-    global LOCAL_STRING_ARRAY
-    global LOCAL_LAST_SENTENCE_INDEX
-    word = LOCAL_STRING[int(location) : int(location + length + 1)].rstrip()
-    
-    if word.endswith('.'):
-        save_to_index_file(location + length + 2)
-    save_to_stream_file(word)
+    global LOCAL_WORD
+    if not LOCAL_SPEAKING:
+        return  # late event from an utterance that was paused
+    # Offsets reported by the engine are relative to the utterance, which starts at LOCAL_BASE
+    word = LOCAL_TEXT.word_at(LOCAL_BASE + int(location))
+    if word >= LOCAL_TEXT.word_count:
+        return
+
+    LOCAL_WORD = word
+    sentence = int(LOCAL_TEXT.word_sentence[word])
+    LOCAL_STREAM.write(LOCAL_TEXT.words[word], int(LOCAL_TEXT.word_starts[word]), sentence,
+                       LOCAL_TEXT.sentence_start(sentence))
+    if LOCAL_TEXT.ends_sentence(word):
+        LOCAL_STREAM.end_sentence(sentence + 1, LOCAL_TEXT.sentence_start(sentence + 1))
 
 def onEnd(name, completed):
-   save_to_stream_file("TTSOver")
+    global LOCAL_SPEAKING
+    if completed:
+        LOCAL_SPEAKING = False
+        sentence = LOCAL_TEXT.sentence_count
+        LOCAL_STREAM.write(END_OF_STREAM, len(LOCAL_TEXT.text), sentence, LOCAL_TEXT.sentence_start(sentence))
 
-def speak(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, string, WPM, adjustment, volume):
-    # Setting the local stream file variable
-    global LOCAL_RSVP_STREAM_FILE
-    global LOCAL_STRING
-    global LOCAL_LAST_SENTENCE_FILE
+def prepare(text):
+    return text if isinstance(text, PreparedText) else PreparedText.from_text(text)
 
-    LOCAL_LAST_SENTENCE_FILE = SENTENCE_INDEX_FILE
-    LOCAL_RSVP_STREAM_FILE = RSVP_STREAM_FILE
-    LOCAL_STRING = string
+def resume_offset(from_sentence):
+    if from_sentence:
+        return LOCAL_TEXT.sentence_start(int(LOCAL_TEXT.word_sentence[LOCAL_WORD]))
+    return int(LOCAL_TEXT.word_starts[LOCAL_WORD])
+
+def init_engine(rate, volume):
+    # pyttsx3 is only imported by the TTS process, so headless runs don't need it installed
+    import pyttsx3
 
     # Initializing the Text-To-Speech Engine
     engine = pyttsx3.init()
 
     # Twaeking the TTS properties
-    engine.setProperty("rate", WPM - adjustment)
+    engine.setProperty("rate", rate)
     engine.setProperty("volume", volume)
 
     voices = engine.getProperty("voices")
@@ -41,26 +65,151 @@ def speak(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, string, WPM, adjustment, volume
     # Listening for events
     engine.connect('started-word', onWord)
     engine.connect('finished-utterance', onEnd)
+    return engine
+
+def start_utterance(engine, start):
+    global LOCAL_BASE
+    global LOCAL_SPEAKING
+    LOCAL_BASE = start
+    LOCAL_SPEAKING = True
+    engine.say(LOCAL_TEXT.text[start:], "TTS_prompt")
+
+def speak(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, text, WPM, adjustment, volume, RING_STREAM_FILE=None):
+    # Setting the local stream writer; the ring buffer is only used if a file is given for it
+    global LOCAL_STREAM
+    global LOCAL_TEXT
+    global LOCAL_WORD
+
+    LOCAL_STREAM = open_stream_writer(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, RING_STREAM_FILE)
+    LOCAL_TEXT = prepare(text)
+    LOCAL_WORD = 0
+
+    engine = init_engine(WPM - adjustment, volume)
 
     # Loading and playing the text to engine
-    engine.say(string, "TTS_prompt")
+    start_utterance(engine, 0)
     engine.runAndWait()
+    LOCAL_STREAM.close()
 
-def save_to_stream_file(word):
-    try:
-        file = open(LOCAL_RSVP_STREAM_FILE, "w")
-        file.write(word)
-        file.close()
-    except Exception as e:
-        print("Error writing the stream file\n", str(e))
+def serve(commands, replies, RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, WPM, adjustment, volume, RING_STREAM_FILE=None):
+    """
+    Main loop of the TTS service process.
 
-def save_to_index_file(index):
+    The engine is initialised once and driven with an external event loop, so
+    commands from the scenario are handled between engine iterations:
+        ("speak", text)          read `text` (a string or PreparedText) from the beginning
+        ("pause", request)       stop reading and reply ("paused", request, offset), with the
+                                 character offset of the start of the current sentence
+        ("resume", from_sentence) continue from the start of the current sentence, or the current word
+        ("stop",)                stop reading
+        ("rate", WPM)            change the reading rate
+        ("volume", volume)       change the volume
+        ("exit",)                shut the service down
+    """
+    global LOCAL_STREAM
+    global LOCAL_TEXT
+    global LOCAL_WORD
+    global LOCAL_SPEAKING
+
+    LOCAL_STREAM = open_stream_writer(RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, RING_STREAM_FILE)
+    engine = init_engine(WPM - adjustment, volume)
+    engine.startLoop(False)
     try:
-        file = open(LOCAL_LAST_SENTENCE_FILE, "w")
-        file.write(str(index))
-        file.close()
-    except Exception as e:
-        print("Error writing the index file\n", str(e))
+        while True:
+            try:
+                # Block while idle, poll while the engine needs pumping
+                command = commands.get(timeout=POLL_INTERVAL) if LOCAL_SPEAKING else commands.get()
+            except queue.Empty:
+                engine.iterate()
+                continue
+
+            if command[0] == "speak":
+                engine.stop()
+                LOCAL_TEXT = prepare(command[1])
+                LOCAL_WORD = 0
+                start_utterance(engine, 0)
+            elif command[0] == "pause":
+                LOCAL_SPEAKING = False
+                engine.stop()
+                replies.put(("paused", command[1], resume_offset(True) if LOCAL_TEXT is not None else None))
+            elif command[0] == "resume":
+                if LOCAL_TEXT is not None and not LOCAL_SPEAKING:
+                    start_utterance(engine, resume_offset(command[1]))
+            elif command[0] == "stop":
+                LOCAL_SPEAKING = False
+                engine.stop()
+            elif command[0] == "rate":
+                engine.setProperty("rate", command[1] - adjustment)
+            elif command[0] == "volume":
+                engine.setProperty("volume", command[1])
+            elif command[0] == "exit":
+                break
+            engine.iterate()
+    finally:
+        engine.endLoop()
+        LOCAL_STREAM.close()
+
+
+class TTSService:
+    """
+    Long-lived TTS process controlled through a command queue.
+
+    The engine is initialised once when the service starts, so pausing for a TOR
+    and resuming afterwards costs a queue round trip instead of spawning a new
+    process and initialising a new engine.
+    """
+
+    def __init__(self, RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, WPM, adjustment, volume, RING_STREAM_FILE=None):
+        self.commands = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=serve,
+            args=(self.commands, self.replies, RSVP_STREAM_FILE, SENTENCE_INDEX_FILE, WPM, adjustment, volume,
+                  RING_STREAM_FILE),
+            daemon=True)
+        # Number of pauses requested, used to match every pause with its own reply
+        self.pause_requests = 0
+        self.process.start()
+
+    def speak(self, text):
+        self.commands.put(("speak", text))
+
+    def pause(self):
+        """
+        Pause reading; returns the character offset in the text of the sentence
+        to resume from, or None on timeout. The reply to an earlier pause that
+        timed out may still arrive, so replies of other requests are dropped.
+        """
+        self.pause_requests += 1
+        request = self.pause_requests
+        self.commands.put(("pause", request))
+        deadline = time.monotonic() + PAUSE_TIMEOUT
+        while True:
+            try:
+                _, reply_request, offset = self.replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                print("TTS service did not acknowledge the pause")
+                return None
+            if reply_request == request:
+                return offset
+
+    def resume(self, from_sentence=True):
+        self.commands.put(("resume", from_sentence))
+
+    def stop(self):
+        self.commands.put(("stop",))
+
+    def set_rate(self, WPM):
+        self.commands.put(("rate", WPM))
+
+    def set_volume(self, volume):
+        self.commands.put(("volume", volume))
+
+    def close(self):
+        self.commands.put(("exit",))
+        self.process.join(timeout=PAUSE_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
 
 if __name__ == "__main__":
-    speak("test.txt", "This is a, sample text. Hello, Worls. A. B. C", 200, 0, 1)
\ No newline at end of file
+    speak("test.txt", "index.txt", "This is a, sample text. Hello, Worls. A. B. C", 200, 0, 1)
@@ -0,0 +1,94 @@
+import math
+
+import carla
+from scheduler import EPSILON
+
+# Simulation time (s) between the TOR and the agent taking over, standing in for the driver's reaction.
+REACTION_TIME = 1.0
+# Distance (m) to the point on the lane centre the agent steers towards.
+LOOKAHEAD = 8.0
+# Speed (m/s) the agent drives at once it has taken over.
+TARGET_SPEED = 20.0
+# Deceleration (m/s^2) the agent plans its braking with and the margin (m) it keeps to obstacles.
+DECELERATION = 6.0
+STOPPING_MARGIN = 8.0
+# Half the width (m) of the corridor in front of the ego in which actors count as obstacles.
+LANE_HALF_WIDTH = 1.75
+# Wheelbase (m) and maximum steering angle (rad) of the ego used by the pure pursuit steering.
+WHEELBASE = 2.9
+MAX_STEER_ANGLE = math.radians(70)
+
+class ScriptedDriver:
+    """
+    Stand-in for the participant in headless runs.
+
+    After REACTION_TIME seconds of simulation time the agent follows the lane
+    centre with pure pursuit steering at TARGET_SPEED and brakes for every
+    actor spawned by the scenario that is in its lane within stopping
+    distance. The obstacles are read from the tick driver's frame, so the
+    agent adds no round trips to the tick.
+    """
+
+    def __init__(self, reaction_time: float = REACTION_TIME, lookahead: float = LOOKAHEAD,
+                 target_speed: float = TARGET_SPEED):
+        self.reaction_time = reaction_time
+        self.lookahead = lookahead
+        self.target_speed = target_speed
+        self.takeover_time = None
+
+    def start(self, run, frame) -> None:
+        """Called when the TOR is issued."""
+        self.takeover_time = frame.timestamp.elapsed_seconds + self.reaction_time
+        self.carla_map = run.lane_sampler.index.carla_map
+        run.driver.track(*run.vehicles_list)
+
+    def obstacle_distance(self, run, frame, transform) -> float:
+        """Distance to the closest actor in the corridor ahead of the ego, or inf."""
+        location = transform.location
+        forward = transform.get_forward_vector()
+        closest = math.inf
+        for actor_id, state in frame.actors.items():
+            if actor_id == run.DReyeVR_vehicle.id:
+                continue
+            dx = state.transform.location.x - location.x
+            dy = state.transform.location.y - location.y
+            ahead = dx * forward.x + dy * forward.y
+            # Right vector of the UE4 (left-handed) frame is (-forward.y, forward.x)
+            lateral = -dx * forward.y + dy * forward.x
+            if 0 < ahead < closest and abs(lateral) < LANE_HALF_WIDTH:
+                closest = ahead
+        return closest
+
+    def steer(self, transform) -> float:
+        location = transform.location
+        target = self.carla_map.get_waypoint(location).next(self.lookahead)
+        if not target:
+            return 0.0
+        target = target[0].transform.location
+        yaw = math.radians(transform.rotation.yaw)
+        dx = target.x - location.x
+        dy = target.y - location.y
+        local_x = dx * math.cos(yaw) + dy * math.sin(yaw)
+        local_y = -dx * math.sin(yaw) + dy * math.cos(yaw)
+        alpha = math.atan2(local_y, local_x)
+        angle = math.atan2(2.0 * WHEELBASE * math.sin(alpha), self.lookahead)
+        return max(-1.0, min(1.0, angle / MAX_STEER_ANGLE))
+
+    def control(self, run, frame) -> carla.VehicleControl:
+        if self.takeover_time is None or frame.timestamp.elapsed_seconds + EPSILON < self.takeover_time:
+            # Not reacted yet, the vehicle coasts
+            return carla.VehicleControl(throttle=0, brake=0, steer=0)
+
+        transform = frame.transform(run.DReyeVR_vehicle)
+        velocity = frame.velocity(run.DReyeVR_vehicle)
+        speed = math.sqrt(velocity.x ** 2 + velocity.y ** 2)
+        steer = self.steer(transform)
+
+        stopping_distance = speed ** 2 / (2 * DECELERATION) + STOPPING_MARGIN
+        if self.obstacle_distance(run, frame, transform) < stopping_distance:
+            return carla.VehicleControl(throttle=0, brake=1, steer=steer)
+        if speed < self.target_speed:
+            throttle = min(1.0, 0.5 * (self.target_speed - speed))
+            return carla.VehicleControl(throttle=throttle, brake=0, steer=steer)
+        brake = min(1.0, 0.2 * (speed - self.target_speed))
+        return carla.VehicleControl(throttle=0, brake=brake, steer=steer)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+
+try:
+    sys.path.append(glob.glob('..\\carla\\dist\\carla-0.9.13-py*%d.%d-%s.egg' % (
+        sys.version_info.major,
+        sys.version_info.minor,
+        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+import argparse
+import itertools
+import logging
+import random
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+import carla
+import utils
+from agent import ScriptedDriver
+from blueprint_catalogue import BLUEPRINT_CATALOGUE_FILE, BlueprintCatalogue
+from config import load_config, with_overrides
+from data_sink import format_csv_row
+from scenario import ScenarioRun, TM_PORT
+from scheduler import EPSILON
+
+import ExtremeWeather
+import LVAD
+import CSA
+import ACR
+
+SCENARIOS = {
+    "EW": ExtremeWeather.ExtremeWeather,
+    "LVAD": LVAD.LeadVehicleDeceleration,
+    "CSA": CSA.ConstructionSite,
+    "ACR": ACR.AnimalCrossing,
+}
+# Simulation time (s) after which a handover window is closed even if the agent has not passed the hazard.
+HANDOVER_TIMEOUT = 60.0
+# Ticks run after the world is reset, so the ego has settled when a trial starts.
+WARMUP_TICKS = 10
+# Vehicle spawned as ego when the world has no DReyeVR ego vehicle, e.g. on a stock CARLA server.
+STAND_IN_EGO = "vehicle.lincoln.mkz_2020"
+# Summary of every trial of a batch, in the data folder.
+BATCH_RESULTS_FILE = "BatchResults.csv"
+RESULT_COLUMNS = ["scenario", "rsvp", "tts", "seed", "trial_no", "status", "wall_seconds", "sim_seconds",
+                  "collisions", "sdlp", "lane_offset_max", "handover_tick_p99_ms"]
+
+class Trial(NamedTuple):
+    scenario: str
+    rsvp: int
+    tts: int
+    seed: int
+
+
+class NullTTS:
+    """TTS service of headless runs: nobody listens, so nothing is spoken."""
+
+    def speak(self, text):
+        pass
+
+    def pause(self):
+        return None
+
+    def resume(self, from_sentence=True):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class HeadlessRun(ScenarioRun):
+    """
+    A scenario run without participant, HUD or speech. The ego is driven by a
+    ScriptedDriver from the TOR to the recovery, the NDRT phase is skipped, and
+    the teardown only removes the trial's actors so the next trial can reuse
+    the synchronous world.
+    """
+
+    def __init__(self, *args, spawn_point: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spawn_point = spawn_point
+        self.agent = ScriptedDriver()
+        self.stand_in = False
+        self.handover_deadline = None
+        self.timed_out = False
+        self.started_at = None
+
+    def start_tts(self) -> None:
+        self.tts = NullTTS()
+
+    def find_ego(self):
+        ego = utils.find_ego_vehicle(self.world)
+        if ego is None:
+            blueprint = self.catalogue.find(STAND_IN_EGO)
+            transform = self.world.get_map().get_spawn_points()[self.spawn_point]
+            ego = self.world.spawn_actor(blueprint, transform)
+            self.stand_in = True
+            self.driver.tick()
+            print("Spawned a stand-in ego vehicle: " + ego.type_id)
+        return ego
+
+    def setup(self) -> None:
+        super().setup()
+        self.started_at = self.driver.current().timestamp.elapsed_seconds
+
+    def handover_over(self, frame, end_time) -> bool:
+        if self.handover_deadline is None:
+            self.handover_deadline = frame.timestamp.elapsed_seconds + HANDOVER_TIMEOUT
+        if frame.timestamp.elapsed_seconds + EPSILON >= self.handover_deadline:
+            self.timed_out = True
+            return True
+        return super().handover_over(frame, end_time)
+
+    def ndrt(self) -> None:
+        # Nobody reads in a headless run, so there is no NDRT to wait for
+        pass
+
+    def release_actors(self) -> None:
+        super().release_actors()
+        if self.stand_in:
+            self.DReyeVR_vehicle.destroy()
+            self.DReyeVR_vehicle = None
+
+    def teardown(self) -> None:
+        if self.world is not None:
+            self.stop_telemetry()
+            self.release_actors()
+
+    @property
+    def sim_seconds(self) -> float:
+        if self.started_at is None or self.driver.frame is None:
+            return 0.0
+        return self.driver.frame.timestamp.elapsed_seconds - self.started_at
+
+
+def trial_matrix(scenarios: List[str], seeds: List[int]) -> List[Trial]:
+    """Every scenario x RSVP/STP x TTS x seed combination."""
+    return [Trial(scenario, rsvp, tts, seed)
+            for scenario, rsvp, tts, seed in itertools.product(scenarios, (0, 1), (0, 1), seeds)]
+
+
+def failed_result(trial: Trial, trial_no: int) -> list:
+    return [trial.scenario, trial.rsvp, trial.tts, trial.seed, trial_no, "error"] + [""] * 6
+
+def write_result(DATA_FOLDER_PATH: str, row: list) -> None:
+    path = os.path.join(DATA_FOLDER_PATH, BATCH_RESULTS_FILE)
+    new_file = not os.path.exists(path)
+    with open(path, "a", encoding="utf8") as file:
+        if new_file:
+            file.write(", ".join(RESULT_COLUMNS))
+        file.write(format_csv_row(row))
+
+def print_progress(done: int, total: int, row: list, elapsed: float) -> None:
+    print("[{}/{}] {} rsvp={} tts={} seed={}: {} in {} s ({:.1f} trials/hour)".format(
+        done, total, row[0], row[1], row[2], row[3], row[5], row[6], done * 3600.0 / elapsed))
+
+
+class BatchRunner:
+    """
+    Runs scenario trials back to back over one client and traffic manager.
+
+    Before every trial the world is either reloaded, or reset by putting the
+    ego back where the batch started (the trial's teardown destroys its
+    actors), see reset_world(). Every trial writes its data files as a
+    participant run would, and one row to BatchResults.csv in the data folder.
+
+    Trials of the same scenario, seed and RSVP/TTS condition on the same map
+    are reproducible: their telemetry records match apart from `frame` and
+    `elapsed_seconds`, which continue from the previous trial, and their
+    result rows match apart from `trial_no`, `wall_seconds` and
+    `handover_tick_p99_ms`, which are wall clock measurements.
+    """
+
+    def __init__(self, CONTENT_FOLDER_PATH: str, host: str = '127.0.0.1', port: int = 2000, tm_port: int = TM_PORT,
+                 reload_world: bool = False, no_rendering: bool = False, spawn_point: int = 0,
+                 config_overrides: Optional[List[str]] = None, client_factory=None, save_catalogue: bool = True):
+        self.CONTENT_FOLDER_PATH = CONTENT_FOLDER_PATH
+        self.DATA_FOLDER_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/DataFiles")
+        CONFIG_FILE_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/config.txt")
+        self.configurations = load_config(CONFIG_FILE_PATH, config_overrides)
+        self.tm_port = tm_port
+        self.reload_world = reload_world
+        self.spawn_point = spawn_point
+
+        # The client class can be swapped, e.g. for a fake server in tests
+        self.client = (client_factory or carla.Client)(host, port)
+        self.client.set_timeout(10.0)
+        world = self.client.get_world()
+        if no_rendering:
+            settings = world.get_settings()
+            settings.no_rendering_mode = True
+            world.apply_settings(settings)
+        # One snapshot of the blueprint library for every trial of the batch; the workers of a
+        # TrialPool only read the saved index, which the pool's parent process writes
+        self.catalogue = BlueprintCatalogue.snapshot(self.client, world,
+                                                     os.path.join(self.DATA_FOLDER_PATH, BLUEPRINT_CATALOGUE_FILE),
+                                                     save=save_catalogue)
+        ego = utils.find_ego_vehicle(world)
+        self.ego_start = ego.get_transform() if ego is not None else None
+
+    def reset_world(self, seed: int) -> None:
+        """
+        Put the world in the same state for every trial of `seed`: the ego at the
+        start of the batch, at rest and without input, the traffic manager seeded
+        with `seed`, and WARMUP_TICKS ticks to settle.
+        """
+        if self.reload_world:
+            self.client.reload_world(False)
+        else:
+            ego = utils.find_ego_vehicle(self.client.get_world())
+            if ego is not None and self.ego_start is not None:
+                # The teardown pins the ego with a constant velocity of zero, which autopilot can't override,
+                # and leaves the brake on
+                ego.disable_constant_velocity()
+                ego.apply_control(carla.VehicleControl())
+                ego.set_transform(self.ego_start)
+                ego.set_target_velocity(carla.Vector3D(0, 0, 0))
+        self.client.get_trafficmanager(self.tm_port).set_random_device_seed(seed)
+        world = self.client.get_world()
+        for _ in range(WARMUP_TICKS):
+            world.tick()
+
+    def run_trial(self, trial: Trial, trial_no: int) -> list:
+        self.reset_world(trial.seed)
+        random.seed(trial.seed)
+        np.random.seed(trial.seed)
+        configurations = with_overrides(self.configurations, [
+            "RSVP={}".format(trial.rsvp), "TTS={}".format(trial.tts), "TRIAL_NO={}".format(trial_no)])
+
+        run = HeadlessRun(SCENARIOS[trial.scenario](), self.CONTENT_FOLDER_PATH, configurations,
+                          client=self.client, tm_port=self.tm_port, catalogue=self.catalogue,
+                          spawn_point=self.spawn_point)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            run.run()
+            if run.timed_out:
+                status = "timeout"
+        except Exception as e:
+            logging.error("Trial %d (%s) failed: %s", trial_no, trial.scenario, e)
+            status = "error"
+        wall_seconds = time.perf_counter() - started
+
+        lane_offsets = run.lane_offset_stats
+        handover_ticks = run.profiler.histograms.get("handover", {}).get("total")
+        return [trial.scenario, trial.rsvp, trial.tts, trial.seed, trial_no, status, round(wall_seconds, 3),
+                round(run.sim_seconds, 3), len(run.collision_data),
+                round(lane_offsets.std, 4) if lane_offsets.count > 1 else "",
+                round(max(abs(lane_offsets.min), abs(lane_offsets.max)), 4) if lane_offsets.count else "",
+                round(handover_ticks.percentile(99) * 1e3, 3) if handover_ticks is not None else ""]
+
+    def run(self, trials: List[Trial]) -> List[list]:
+        results = []
+        started = time.perf_counter()
+        for i, trial in enumerate(trials):
+            row = self.run_trial(trial, self.configurations.trial_no + i)
+            write_result(self.DATA_FOLDER_PATH, row)
+            results.append(row)
+            print_progress(i + 1, len(trials), row, time.perf_counter() - started)
+        return results
+
+    def close(self) -> None:
+        world = self.client.get_world()
+        settings = world.get_settings()
+        settings.synchronous_mode = False
+        settings.no_rendering_mode = False
+        settings.fixed_delta_seconds = None
+        world.apply_settings(settings)
+
+
+def add_batch_arguments(argparser: argparse.ArgumentParser) -> None:
+    """Arguments shared by the batch runner and the trial pool."""
+    argparser.add_argument('--content', required=True, help='Content folder with the ConfigFiles and DataFiles folders')
+    argparser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    argparser.add_argument('--seeds', type=int, default=1, help='number of seeds per condition (default: 1)')
+    argparser.add_argument('--first-seed', type=int, default=0)
+    argparser.add_argument('--host', default='127.0.0.1')
+    argparser.add_argument('--spawn-point', type=int, default=0,
+                           help='spawn point of the stand-in ego when the world has no DReyeVR ego')
+    argparser.add_argument('--reload', action='store_true', help='reload the world between trials instead of resetting it')
+    argparser.add_argument('--no-rendering', action='store_true', help='run the server in no rendering mode')
+    argparser.add_argument(
+        '--set', metavar='KEY=VALUE', action='append', default=[], dest='config_overrides',
+        help='override a setting of config.txt for the batch, e.g. --set PARTICIPANT_ID=batch (repeatable)')
+
+def trials_from_arguments(args) -> List[Trial]:
+    return trial_matrix(args.scenarios, list(range(args.first_seed, args.first_seed + args.seeds)))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description="Run scenario trials back to back with a scripted driver")
+    add_batch_arguments(argparser)
+    argparser.add_argument('--port', type=int, default=2000)
+    argparser.add_argument('--tm-port', type=int, default=TM_PORT)
+    args = argparser.parse_args()
+
+    trials = trials_from_arguments(args)
+    runner = BatchRunner(args.content, args.host, args.port, args.tm_port, args.reload, args.no_rendering,
+                         args.spawn_point, args.config_overrides)
+    started = time.perf_counter()
+    try:
+        results = runner.run(trials)
+    except KeyboardInterrupt:
+        print("Execution terminated!")
+        results = []
+    finally:
+        runner.close()
+    elapsed = time.perf_counter() - started
+    if results:
+        print("{} trials in {:.1f} s: {:.1f} trials/hour".format(len(results), elapsed, len(results) * 3600.0 / elapsed))
@@ -0,0 +1,135 @@
+import fnmatch
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+# Index of the blueprints of every server version seen, in the data folder.
+BLUEPRINT_CATALOGUE_FILE = "BlueprintCatalogue.json"
+# Integer attributes indexed per blueprint; blueprints without one (props, sensors) index None.
+INDEXED_ATTRIBUTES = ("number_of_wheels", "generation")
+
+def describe(blueprint) -> dict:
+    """Tags and indexed attributes of a blueprint, as saved in the catalogue file."""
+    entry = {"tags": list(blueprint.tags)}
+    for name in INDEXED_ATTRIBUTES:
+        entry[name] = blueprint.get_attribute(name).as_int() if blueprint.has_attribute(name) else None
+    return entry
+
+def load_index(path: str, version: str) -> Optional[Dict[str, dict]]:
+    """Saved index of a server version, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf8") as file:
+            return json.load(file).get(version)
+    except (OSError, ValueError) as e:
+        logging.warning("Could not read the blueprint catalogue %s: %s", path, e)
+        return None
+
+def save_index(path: str, version: str, index: Dict[str, dict]) -> None:
+    """
+    Adds the index of a server version to the catalogue file. The file is
+    written aside and renamed into place, so a reader never sees it half
+    written; concurrent writers would still lose each other's versions, so
+    only one process of a run saves it (the parent of a TrialPool).
+    """
+    catalogue = {}
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf8") as file:
+                catalogue = json.load(file)
+        except (OSError, ValueError):
+            pass
+    catalogue[version] = index
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary_path, "w", encoding="utf8") as file:
+        json.dump(catalogue, file, indent=1, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+class BlueprintCatalogue:
+    """
+    Snapshot of the server's blueprint library, indexed by id, tag, wheel count and generation.
+
+    The library is fetched once per client session and blueprints are then
+    looked up in dictionaries, instead of a get_blueprint_library() round trip
+    per lookup and a get_attribute() scan of every vehicle to filter them.
+    Lookups return blueprints in id order. The index (tags and attributes, not
+    the blueprints, which only the server can hand out) is saved per server
+    version, so later sessions skip the attribute scan; it is rebuilt when the
+    library's ids don't match it.
+    """
+
+    def __init__(self, library, index: Optional[Dict[str, dict]] = None):
+        # The library is kept so the blueprints handed out stay valid
+        self.library = library
+        self.blueprints = {blueprint.id: blueprint for blueprint in library}
+        self.scanned = index is None or set(index) != set(self.blueprints)
+        if self.scanned:
+            index = {id: describe(blueprint) for id, blueprint in self.blueprints.items()}
+        self.index = index
+        self.ids = sorted(self.blueprints)
+        self.by_tag: Dict[str, List[str]] = {}
+        self.by_wheels: Dict[int, List[str]] = {}
+        self.by_generation: Dict[int, List[str]] = {}
+        for id in self.ids:
+            entry = index[id]
+            for tag in entry["tags"]:
+                self.by_tag.setdefault(tag, []).append(id)
+            if entry["number_of_wheels"] is not None:
+                self.by_wheels.setdefault(entry["number_of_wheels"], []).append(id)
+            if entry["generation"] is not None:
+                self.by_generation.setdefault(entry["generation"], []).append(id)
+        # Ids matched by each filter pattern so far
+        self.filters: Dict[str, List[str]] = {}
+
+    @classmethod
+    def snapshot(cls, client, world, path: Optional[str] = None, save: bool = True) -> "BlueprintCatalogue":
+        """
+        Catalogue of the library of `world`, with the index read from `path` for the
+        client's server version, and saved there if it had to be rebuilt and `save` is set.
+        """
+        version = client.get_server_version()
+        index = load_index(path, version) if path is not None else None
+        catalogue = cls(world.get_blueprint_library(), index)
+        if path is not None and save and catalogue.scanned:
+            save_index(path, version, catalogue.index)
+        return catalogue
+
+    def __len__(self) -> int:
+        return len(self.blueprints)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.blueprints
+
+    def find(self, id: str):
+        try:
+            return self.blueprints[id]
+        except KeyError:
+            raise IndexError("Blueprint not found: " + id)
+
+    def filter(self, pattern: str) -> list:
+        """Blueprints whose id or one of whose tags matches the wildcard `pattern`, like BlueprintLibrary.filter()."""
+        ids = self.filters.get(pattern)
+        if ids is None:
+            ids = [id for id in self.ids if fnmatch.fnmatchcase(id, pattern)
+                   or any(fnmatch.fnmatchcase(tag, pattern) for tag in self.index[id]["tags"])]
+            self.filters[pattern] = ids
+        return [self.blueprints[id] for id in ids]
+
+    def with_tag(self, tag: str) -> list:
+        return [self.blueprints[id] for id in self.by_tag.get(tag, [])]
+
+    def with_wheels(self, wheels: int) -> list:
+        return [self.blueprints[id] for id in self.by_wheels.get(wheels, [])]
+
+    def of_generation(self, generation: int) -> list:
+        return [self.blueprints[id] for id in self.by_generation.get(generation, [])]
+
+    def wheels(self, id: str) -> Optional[int]:
+        return self.index[id]["number_of_wheels"]
+
+    def generation(self, id: str) -> Optional[int]:
+        return self.index[id]["generation"]
@@ -0,0 +1,98 @@
+import logging
+import math
+import threading
+from typing import Dict
+
+import numpy as np
+
+import carla
+
+# Time (s) without an event from an actor after which its next event opens a new contact.
+CONTACT_GAP = 0.5
+# Contacts a monitor has room for; events that would open more are counted but not recorded.
+MAX_CONTACTS = 256
+# One row per contact with another actor: when it started and ended, the largest
+# normal impulse (N*s) and the number of sensor events it collapses.
+CONTACT_DTYPE = np.dtype([
+    ("actor_id", np.int64),
+    ("actor_type", "U64"),
+    ("first", np.float64),
+    ("last", np.float64),
+    ("peak_impulse", np.float64),
+    ("events", np.int64),
+])
+
+def no_contacts() -> np.ndarray:
+    return np.zeros(0, dtype=CONTACT_DTYPE)
+
+
+class CollisionMonitor:
+    """
+    Collision sensor on the ego that collapses its events into contact intervals.
+
+    The sensor fires once per physics contact, so scraping along a barrier
+    produces hundreds of events with the same actor. Events from an actor
+    less than `gap` seconds after its previous one extend the open contact
+    (last time, peak impulse, event count), anything else opens a new row
+    of a preallocated record array. The callback does a dictionary lookup
+    and a few assignments, and memory does not depend on how long a contact
+    lasts. The monitor spawns its sensor in start() and destroys it in stop().
+    """
+
+    def __init__(self, world, vehicle, catalogue, gap: float = CONTACT_GAP, capacity: int = MAX_CONTACTS):
+        self.world = world
+        self.vehicle = vehicle
+        self.catalogue = catalogue
+        self.gap = gap
+        self.contacts = np.zeros(capacity, dtype=CONTACT_DTYPE)
+        self.count = 0
+        self.dropped = 0
+        # Row of the latest contact with each actor
+        self.open: Dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.sensor = None
+
+    def start(self) -> "CollisionMonitor":
+        blueprint = self.catalogue.find('sensor.other.collision')
+        self.sensor = self.world.spawn_actor(blueprint, carla.Transform(), attach_to=self.vehicle)
+        self.sensor.listen(self.on_collision)
+        return self
+
+    def stop(self) -> None:
+        if self.sensor is None:
+            return
+        self.sensor.stop()
+        self.sensor.destroy()
+        self.sensor = None
+        if self.dropped:
+            logging.warning("%d collision events exceeded the %d contacts of the monitor",
+                            self.dropped, len(self.contacts))
+
+    def on_collision(self, event) -> None:
+        timestamp = event.timestamp
+        other = event.other_actor
+        impulse = event.normal_impulse
+        magnitude = math.sqrt(impulse.x * impulse.x + impulse.y * impulse.y + impulse.z * impulse.z)
+        with self.lock:
+            row = self.open.get(other.id)
+            if row is not None and timestamp - self.contacts[row]["last"] <= self.gap:
+                contact = self.contacts[row]
+                contact["last"] = timestamp
+                contact["events"] += 1
+                if magnitude > contact["peak_impulse"]:
+                    contact["peak_impulse"] = magnitude
+                return
+            if self.count == len(self.contacts):
+                self.dropped += 1
+                return
+            self.contacts[self.count] = (other.id, other.type_id, timestamp, timestamp, magnitude, 1)
+            self.open[other.id] = self.count
+            self.count += 1
+
+    def records(self) -> np.ndarray:
+        """Copy of the contacts recorded so far, in the order they started."""
+        with self.lock:
+            return self.contacts[:self.count].copy()
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,57 @@
+import logging
+
+import carla
+
+# @todo cannot import these directly.
+ApplyTransform = carla.command.ApplyTransform
+ApplyTargetVelocity = carla.command.ApplyTargetVelocity
+ApplyVehicleControl = carla.command.ApplyVehicleControl
+SetAutopilot = carla.command.SetAutopilot
+DestroyActor = carla.command.DestroyActor
+SpawnActor = carla.command.SpawnActor
+FutureActor = carla.command.FutureActor
+
+class CommandBatch:
+    """
+    Collects the actor mutations of one tick and submits them in a single
+    apply_batch_sync call instead of one RPC per actor and attribute.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def add(self, command) -> None:
+        self.commands.append(command)
+
+    def apply_transform(self, actor, transform) -> None:
+        self.commands.append(ApplyTransform(actor, transform))
+
+    def set_location(self, actor, location, rotation) -> None:
+        self.commands.append(ApplyTransform(actor, carla.Transform(location, rotation)))
+
+    def set_autopilot(self, actor, enabled: bool, tm_port: int) -> None:
+        self.commands.append(SetAutopilot(actor, enabled, tm_port))
+
+    def apply_control(self, actor, control) -> None:
+        self.commands.append(ApplyVehicleControl(actor, control))
+
+    def apply_target_velocity(self, actor, velocity) -> None:
+        self.commands.append(ApplyTargetVelocity(actor, velocity))
+
+    def destroy(self, actor) -> None:
+        self.commands.append(DestroyActor(actor))
+
+    def flush(self):
+        """Submit the pending commands and return the server responses."""
+        if not self.commands:
+            return []
+        commands, self.commands = self.commands, []
+        responses = self.client.apply_batch_sync(commands, False)
+        for response in responses:
+            if response.error:
+                logging.error(response.error)
+        return responses
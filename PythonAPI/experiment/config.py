@@ -0,0 +1,126 @@
+import os
+from dataclasses import MISSING, dataclass, fields, replace
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+# Prefix of the environment variables that override config.txt, e.g. NDRRI_TRIAL_NO=10.
+ENVIRONMENT_PREFIX = "NDRRI_"
+
+@dataclass(frozen=True)
+class ExperimentConfig:
+    """Settings of one trial, as read from ConfigFiles/config.txt."""
+    participant_id: str
+    trial_no: int
+    ignore: bool
+    rsvp: bool
+    wpm: int
+    tts: bool
+    textfile: str
+    # Keep every lane offset sample in a binary file next to the summary (RAW_LANE_OFFSETS: 1)
+    raw_lane_offsets: bool = False
+    # Also publish the RSVP stream to the ring buffer ConfigFiles/RSVPStream.ring (RSVP_RING: 1)
+    rsvp_ring: bool = False
+    # Channel of the task signals: "file" (SignalFile.txt, read by the HUD) or "shm" (shared memory
+    # block, for readers that open SharedMemorySignalBus) (SIGNAL_BUS: file)
+    signal_bus: str = "file"
+
+    def first_rows(self) -> list:
+        """Key columns written at the start of every row of the data files."""
+        return [self.participant_id, int(self.rsvp), int(self.tts), self.trial_no]
+
+
+def parse_flag(key: str, value: str) -> bool:
+    if value not in ("0", "1"):
+        raise ValueError("{} must be 0 or 1, got '{}'".format(key, value))
+    return value == "1"
+
+def parse_int(key: str, value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("{} must be an integer, got '{}'".format(key, value))
+
+def parse_choice(*choices):
+    def parse(key: str, value: str) -> str:
+        if value not in choices:
+            raise ValueError("{} must be one of {}, got '{}'".format(key, ", ".join(choices), value))
+        return value
+    return parse
+
+PARSERS = {
+    "participant_id": lambda key, value: value,
+    "trial_no": parse_int,
+    "ignore": parse_flag,
+    "rsvp": parse_flag,
+    "wpm": parse_int,
+    "tts": parse_flag,
+    "textfile": lambda key, value: value,
+    "raw_lane_offsets": parse_flag,
+    "rsvp_ring": parse_flag,
+    "signal_bus": parse_choice("file", "shm"),
+}
+
+def parse_settings(lines: Sequence[str]) -> Dict[str, str]:
+    """KEY: value pairs of config.txt; comments and separator lines are skipped."""
+    settings = {}
+    for line in lines:
+        key, separator, value = line.partition(":")
+        key = key.strip()
+        if not separator or not key or key.startswith(("/*", "-")):
+            continue
+        settings[key.lower()] = value.strip()
+    return settings
+
+def build_config(settings: Mapping[str, str]) -> ExperimentConfig:
+    missing = [field.name.upper() for field in fields(ExperimentConfig)
+               if field.name not in settings and field.default is MISSING]
+    if missing:
+        raise ValueError("Missing settings in the config file: " + ", ".join(missing))
+    return ExperimentConfig(**{name: parse(name.upper(), settings[name])
+                               for name, parse in PARSERS.items() if name in settings})
+
+def parse_overrides(overrides: Sequence[str]) -> Dict[str, str]:
+    """KEY=VALUE pairs, e.g. from the command line."""
+    settings = {}
+    for override in overrides:
+        key, separator, value = override.partition("=")
+        if not separator:
+            raise ValueError("Overrides must be KEY=VALUE, got '{}'".format(override))
+        key = key.strip().lower()
+        if key not in PARSERS:
+            raise ValueError("Unknown setting '{}'".format(key.upper()))
+        settings[key] = value.strip()
+    return settings
+
+def environment_overrides(environ: Mapping[str, str]) -> Dict[str, str]:
+    return {key[len(ENVIRONMENT_PREFIX):].lower(): value.strip()
+            for key, value in environ.items() if key.startswith(ENVIRONMENT_PREFIX)}
+
+CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, str]]] = {}
+
+def read_settings(CONFIG_FILE_PATH: str) -> Dict[str, str]:
+    """Settings of the config file, parsed again only when its mtime or size changes."""
+    stat = os.stat(CONFIG_FILE_PATH)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = CACHE.get(CONFIG_FILE_PATH)
+    if cached is None or cached[0] != key:
+        with open(CONFIG_FILE_PATH, "r", encoding="utf8") as f:
+            cached = (key, parse_settings(f.read().splitlines()))
+        CACHE[CONFIG_FILE_PATH] = cached
+    return cached[1]
+
+def load_config(CONFIG_FILE_PATH: str, overrides: Optional[Sequence[str]] = None,
+                environ: Optional[Mapping[str, str]] = None) -> ExperimentConfig:
+    """
+    Typed config of a trial. Settings are taken from config.txt, then from
+    NDRRI_<KEY> environment variables, then from KEY=VALUE `overrides`, so
+    batch runs can vary trials without rewriting the shared file.
+    """
+    settings = dict(read_settings(CONFIG_FILE_PATH))
+    settings.update(environment_overrides(os.environ if environ is None else environ))
+    settings.update(parse_overrides(overrides or []))
+    return build_config(settings)
+
+def with_overrides(config: ExperimentConfig, overrides: Sequence[str]) -> ExperimentConfig:
+    """Copy of `config` with KEY=VALUE overrides applied."""
+    settings = parse_overrides(overrides)
+    return replace(config, **{name: PARSERS[name](name.upper(), value) for name, value in settings.items()})
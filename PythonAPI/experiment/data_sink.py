@@ -0,0 +1,73 @@
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Sub-folder of the data folder that receives one columnar file per trial.
+TRIALS_FOLDER = "Trials"
+
+def format_csv_row(values: Sequence) -> str:
+    # The CSV files are written without a trailing newline, so each row starts with one
+    return "\n" + ", ".join("{}".format(value) for value in values)
+
+
+class TrialDataSink:
+    """
+    In-memory buffer for the performance data of a single trial.
+
+    CSV rows are grouped per file and typed columns are kept as NumPy arrays, and
+    flush() writes everything in one pass: one open per CSV file and a single
+    columnar file for the trial (Parquet when pyarrow is installed, .npz otherwise).
+    """
+
+    def __init__(self, data_folder: str, trial_name: str):
+        self.data_folder = data_folder
+        self.trial_name = trial_name
+        self.rows: Dict[str, List[str]] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+
+    def add_row(self, file_name: str, values: Sequence) -> None:
+        self.rows.setdefault(file_name, []).append(format_csv_row(values))
+
+    def add_column(self, name: str, values: Sequence, dtype=None) -> None:
+        self.columns[name] = np.asarray(values, dtype=dtype)
+
+    def columnar_path(self) -> str:
+        extension = ".parquet" if pa is not None else ".npz"
+        return os.path.join(self.data_folder, TRIALS_FOLDER, self.trial_name + extension)
+
+    def write_csv(self) -> None:
+        for file_name, rows in self.rows.items():
+            with open(os.path.join(self.data_folder, file_name), "a") as file:
+                file.write("".join(rows))
+        self.rows = {}
+
+    def write_columnar(self) -> str:
+        path = self.columnar_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if pa is not None:
+            # Columns have different lengths, so the trial is stored as a single row of list columns
+            table = pa.table({name: [column.tolist()] for name, column in self.columns.items()})
+            pq.write_table(table, path)
+        else:
+            np.savez(path, **self.columns)
+        self.columns = {}
+        return path
+
+    def write_array(self, folder: str, values: Sequence, dtype=None) -> str:
+        """Write `values` as a .npy file of the trial in a sub-folder of the data folder."""
+        path = os.path.join(self.data_folder, folder, self.trial_name + ".npy")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, np.asarray(values, dtype=dtype))
+        return path
+
+    def flush(self, columnar: bool = True) -> None:
+        self.write_csv()
+        if columnar and self.columns:
+            self.write_columnar()
@@ -0,0 +1,1068 @@
+#!/usr/bin/env python
+
+"""
+In-process stand-in for the subset of the carla API the experiment scripts use.
+
+The fake server holds one straight highway (ROAD_LENGTH meters along +x with
+LANE_COUNT lanes) and moves its actors with simple kinematics on every tick:
+autopilot vehicles follow their lane at the traffic manager speed and keep a
+gap to the vehicle ahead, other vehicles integrate their control with a
+bicycle model, and props only move when they are teleported. Sensor callbacks
+run inside World.tick(), so a run is fully deterministic.
+
+Install it before the experiment modules are imported:
+
+    import fake_carla
+    fake_carla.install()
+    import ACR
+
+or pass fake_carla.Client as the client_factory of a BatchRunner/TrialPool.
+"""
+
+import argparse
+import fnmatch
+import math
+import sys
+import time
+import types
+from typing import Callable, Dict, List, Optional
+
+# Length (m) of the highway, number of lanes and lane width (m).
+ROAD_LENGTH = 4000.0
+LANE_COUNT = 3
+LANE_WIDTH = 3.5
+# Speed limit (m/s) of the highway and top speed (m/s) of every fake vehicle.
+SPEED_LIMIT = 25.0
+MAX_SPEED = 40.0
+# Acceleration and braking (m/s^2) at full throttle/brake, and rolling drag (1/s).
+MAX_ACCELERATION = 4.0
+MAX_DECELERATION = 8.0
+DRAG = 0.02
+# Wheelbase (m) and maximum steering angle (rad) of the bicycle model.
+WHEELBASE = 2.9
+MAX_STEER_ANGLE = math.radians(70)
+# Half length, half width and half height (m) of the bounding box of vehicles and props.
+VEHICLE_EXTENT = (2.4, 1.0, 0.8)
+PROP_EXTENT = (1.0, 1.0, 1.0)
+# Time step (s) of a tick when the world has no fixed delta.
+DEFAULT_DELTA_SECONDS = 0.05
+# Position (m along the road) and lane of the ego vehicle of a new world.
+EGO_START = 100.0
+EGO_LANE = -2
+SERVER_VERSION = "0.9.13"
+
+# ==============================================================================
+# Geometry
+# ==============================================================================
+
+class Vector3D:
+    def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __add__(self, other):
+        return type(self)(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return type(self)(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, scalar: float):
+        return type(self)(self.x * scalar, self.y * scalar, self.z * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar: float):
+        return type(self)(self.x / scalar, self.y / scalar, self.z / scalar)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector3D) and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __repr__(self):
+        return "{}(x={:.6f}, y={:.6f}, z={:.6f})".format(type(self).__name__, self.x, self.y, self.z)
+
+    def length(self) -> float:
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def squared_length(self) -> float:
+        return self.x * self.x + self.y * self.y + self.z * self.z
+
+    def make_unit_vector(self) -> "Vector3D":
+        length = self.length()
+        return Vector3D(self.x / length, self.y / length, self.z / length) if length else Vector3D()
+
+    def distance(self, other) -> float:
+        return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2 + (self.z - other.z) ** 2)
+
+    def dot(self, other) -> float:
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+
+class Vector2D:
+    def __init__(self, x: float = 0.0, y: float = 0.0):
+        self.x = x
+        self.y = y
+
+
+class Location(Vector3D):
+    pass
+
+
+class Rotation:
+    def __init__(self, pitch: float = 0.0, yaw: float = 0.0, roll: float = 0.0):
+        self.pitch = pitch
+        self.yaw = yaw
+        self.roll = roll
+
+    def __repr__(self):
+        return "Rotation(pitch={:.6f}, yaw={:.6f}, roll={:.6f})".format(self.pitch, self.yaw, self.roll)
+
+    def get_forward_vector(self) -> Vector3D:
+        pitch = math.radians(self.pitch)
+        yaw = math.radians(self.yaw)
+        return Vector3D(math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch))
+
+    def get_right_vector(self) -> Vector3D:
+        # UE4 is left-handed: with z up, the right of (x, y) is (-y, x)
+        yaw = math.radians(self.yaw)
+        return Vector3D(-math.sin(yaw), math.cos(yaw), 0.0)
+
+    def get_up_vector(self) -> Vector3D:
+        return Vector3D(0.0, 0.0, 1.0)
+
+
+class Transform:
+    def __init__(self, location: Optional[Location] = None, rotation: Optional[Rotation] = None):
+        self.location = location if location is not None else Location()
+        self.rotation = rotation if rotation is not None else Rotation()
+
+    def __repr__(self):
+        return "Transform({}, {})".format(self.location, self.rotation)
+
+    def copy(self) -> "Transform":
+        return Transform(Location(self.location.x, self.location.y, self.location.z),
+                         Rotation(self.rotation.pitch, self.rotation.yaw, self.rotation.roll))
+
+    def get_forward_vector(self) -> Vector3D:
+        return self.rotation.get_forward_vector()
+
+    def get_right_vector(self) -> Vector3D:
+        return self.rotation.get_right_vector()
+
+    def get_up_vector(self) -> Vector3D:
+        return self.rotation.get_up_vector()
+
+
+class BoundingBox:
+    def __init__(self, location: Location, extent: Vector3D):
+        self.location = location
+        self.extent = extent
+        self.rotation = Rotation()
+
+
+class VehicleControl:
+    def __init__(self, throttle: float = 0.0, steer: float = 0.0, brake: float = 0.0, hand_brake: bool = False,
+                 reverse: bool = False, manual_gear_shift: bool = False, gear: int = 0):
+        self.throttle = throttle
+        self.steer = steer
+        self.brake = brake
+        self.hand_brake = hand_brake
+        self.reverse = reverse
+        self.manual_gear_shift = manual_gear_shift
+        self.gear = gear
+
+
+class WeatherParameters:
+    FIELDS = ("cloudiness", "precipitation", "precipitation_deposits", "wind_intensity", "sun_azimuth_angle",
+              "sun_altitude_angle", "fog_density", "fog_distance", "wetness", "fog_falloff", "scattering_intensity",
+              "mie_scattering_scale", "rayleigh_scattering_scale")
+
+    def __init__(self, **kwargs):
+        for field in self.FIELDS:
+            setattr(self, field, float(kwargs.pop(field, 0.0)))
+        if kwargs:
+            raise TypeError("Unknown weather parameters: " + ", ".join(kwargs))
+
+    def __eq__(self, other):
+        return all(getattr(self, field) == getattr(other, field) for field in self.FIELDS)
+
+    def copy(self) -> "WeatherParameters":
+        return WeatherParameters(**{field: getattr(self, field) for field in self.FIELDS})
+
+
+WeatherParameters.ClearNoon = WeatherParameters(cloudiness=5, sun_altitude_angle=45, fog_falloff=0.2)
+WeatherParameters.CloudyNoon = WeatherParameters(cloudiness=60, sun_altitude_angle=45, fog_falloff=0.2)
+WeatherParameters.WetNoon = WeatherParameters(cloudiness=5, precipitation_deposits=50, sun_altitude_angle=45,
+                                              wetness=50, fog_falloff=0.2)
+WeatherParameters.MidRainyNoon = WeatherParameters(cloudiness=60, precipitation=60, precipitation_deposits=60,
+                                                   wind_intensity=60, sun_altitude_angle=45, wetness=60,
+                                                   fog_falloff=0.2)
+WeatherParameters.HardRainNoon = WeatherParameters(cloudiness=100, precipitation=100, precipitation_deposits=90,
+                                                   wind_intensity=100, sun_altitude_angle=45, wetness=100,
+                                                   fog_falloff=0.2)
+WeatherParameters.Default = WeatherParameters.ClearNoon
+
+
+class LaneChange:
+    NONE = 0
+    Right = 1
+    Left = 2
+    Both = 3
+
+
+class LaneType:
+    Driving = 2
+
+# ==============================================================================
+# Map
+# ==============================================================================
+
+def lane_centre(lane_id: int) -> float:
+    # Lane -1 is the leftmost; with x forward, left is -y
+    return (-lane_id - 1 - (LANE_COUNT - 1) / 2.0) * LANE_WIDTH
+
+def lane_at(y: float) -> int:
+    index = int(round(y / LANE_WIDTH + (LANE_COUNT - 1) / 2.0))
+    return -(min(max(index, 0), LANE_COUNT - 1) + 1)
+
+
+class Waypoint:
+    """Point on the centre of a lane of the highway, `s` meters from its start."""
+
+    road_id = 0
+    section_id = 0
+    junction_id = -1
+    is_junction = False
+    lane_type = LaneType.Driving
+    lane_width = LANE_WIDTH
+
+    def __init__(self, carla_map: "Map", lane_id: int, s: float):
+        self.carla_map = carla_map
+        self.lane_id = lane_id
+        self.s = s
+        self.id = hash((lane_id, round(s, 3)))
+
+    @property
+    def transform(self) -> Transform:
+        return Transform(Location(self.s, lane_centre(self.lane_id), 0.0), Rotation())
+
+    @property
+    def lane_change(self) -> int:
+        if LANE_COUNT == 1:
+            return LaneChange.NONE
+        if self.lane_id == -1:
+            return LaneChange.Right
+        if self.lane_id == -LANE_COUNT:
+            return LaneChange.Left
+        return LaneChange.Both
+
+    def next(self, distance: float) -> List["Waypoint"]:
+        s = self.s + distance
+        return [Waypoint(self.carla_map, self.lane_id, s)] if s <= ROAD_LENGTH else []
+
+    def previous(self, distance: float) -> List["Waypoint"]:
+        s = self.s - distance
+        return [Waypoint(self.carla_map, self.lane_id, s)] if s >= 0 else []
+
+    def get_left_lane(self) -> Optional["Waypoint"]:
+        return Waypoint(self.carla_map, self.lane_id + 1, self.s) if self.lane_id < -1 else None
+
+    def get_right_lane(self) -> Optional["Waypoint"]:
+        return Waypoint(self.carla_map, self.lane_id - 1, self.s) if self.lane_id > -LANE_COUNT else None
+
+
+class Map:
+    name = "FakeHighway"
+
+    def get_waypoint(self, location: Location, project_to_road: bool = True, lane_type=LaneType.Driving):
+        if not project_to_road and abs(location.y) > LANE_COUNT * LANE_WIDTH / 2.0:
+            return None
+        return Waypoint(self, lane_at(location.y), min(max(location.x, 0.0), ROAD_LENGTH))
+
+    def generate_waypoints(self, distance: float) -> List[Waypoint]:
+        count = int(ROAD_LENGTH // distance) + 1
+        return [Waypoint(self, -(lane + 1), i * distance) for lane in range(LANE_COUNT) for i in range(count)]
+
+    def get_spawn_points(self) -> List[Transform]:
+        # One spawn point every 50 m of every lane, leaving the start of the road to the ego
+        return [Transform(Location(s, lane_centre(-(lane + 1)), 0.5), Rotation())
+                for s in range(int(EGO_START) + 50, int(ROAD_LENGTH), 50) for lane in range(LANE_COUNT)]
+
+    def get_topology(self):
+        return [(Waypoint(self, -(lane + 1), 0.0), Waypoint(self, -(lane + 1), ROAD_LENGTH))
+                for lane in range(LANE_COUNT)]
+
+# ==============================================================================
+# Blueprints
+# ==============================================================================
+
+class ActorAttribute:
+    def __init__(self, id: str, value: str, recommended_values=(), is_modifiable: bool = True):
+        self.id = id
+        self.value = str(value)
+        self.recommended_values = list(recommended_values)
+        self.is_modifiable = is_modifiable
+
+    def __str__(self):
+        return self.value
+
+    def __int__(self):
+        return int(self.value)
+
+    def __float__(self):
+        return float(self.value)
+
+    def __eq__(self, other):
+        return self.value == str(other)
+
+    def as_int(self) -> int:
+        return int(self.value)
+
+    def as_float(self) -> float:
+        return float(self.value)
+
+    def as_str(self) -> str:
+        return self.value
+
+    def as_bool(self) -> bool:
+        return self.value.lower() == "true"
+
+
+class ActorBlueprint:
+    def __init__(self, id: str, tags=(), **attributes):
+        self.id = id
+        self.tags = list(tags)
+        self.attributes = {key: value if isinstance(value, ActorAttribute) else ActorAttribute(key, value)
+                           for key, value in attributes.items()}
+
+    def __repr__(self):
+        return "ActorBlueprint(id={})".format(self.id)
+
+    def __iter__(self):
+        return iter(self.attributes.values())
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self.tags
+
+    def match_tags(self, pattern: str) -> bool:
+        return any(fnmatch.fnmatchcase(tag, pattern) for tag in self.tags)
+
+    def has_attribute(self, id: str) -> bool:
+        return id in self.attributes
+
+    def get_attribute(self, id: str) -> ActorAttribute:
+        if id not in self.attributes:
+            raise IndexError("No such attribute: " + id)
+        return self.attributes[id]
+
+    def set_attribute(self, id: str, value: str) -> None:
+        attribute = self.get_attribute(id)
+        self.attributes[id] = ActorAttribute(id, value, attribute.recommended_values, attribute.is_modifiable)
+
+    def copy(self) -> "ActorBlueprint":
+        blueprint = ActorBlueprint(self.id, self.tags)
+        blueprint.attributes = dict(self.attributes)
+        return blueprint
+
+
+def vehicle_blueprint(id: str, wheels: int = 4, generation: int = 2) -> ActorBlueprint:
+    make, model = id.split(".")[1:3]
+    return ActorBlueprint(id, ["vehicle", make, model], number_of_wheels=wheels, generation=generation,
+                          color=ActorAttribute("color", "255,255,255", ["255,255,255", "0,0,0", "200,20,20"]),
+                          role_name=ActorAttribute("role_name", "autopilot", ["autopilot", "hero"]))
+
+
+class BlueprintLibrary:
+    def __init__(self, blueprints: List[ActorBlueprint]):
+        self.blueprints = blueprints
+
+    def __iter__(self):
+        return iter(self.blueprints)
+
+    def __len__(self):
+        return len(self.blueprints)
+
+    def __getitem__(self, index):
+        return self.blueprints[index]
+
+    def filter(self, wildcard_pattern: str) -> "BlueprintLibrary":
+        return BlueprintLibrary([bp for bp in self.blueprints
+                                 if fnmatch.fnmatchcase(bp.id, wildcard_pattern) or bp.match_tags(wildcard_pattern)])
+
+    def find(self, id: str) -> ActorBlueprint:
+        for blueprint in self.blueprints:
+            if blueprint.id == id:
+                return blueprint
+        raise IndexError("Blueprint not found: " + id)
+
+
+def default_blueprints() -> List[ActorBlueprint]:
+    return [
+        vehicle_blueprint("vehicle.dreyevr.egovehicle"),
+        vehicle_blueprint("vehicle.audi.a2", generation=1),
+        vehicle_blueprint("vehicle.audi.tt", generation=1),
+        vehicle_blueprint("vehicle.bmw.grandtourer", generation=1),
+        vehicle_blueprint("vehicle.chevrolet.impala", generation=1),
+        vehicle_blueprint("vehicle.ford.mustang"),
+        vehicle_blueprint("vehicle.lincoln.mkz_2020"),
+        vehicle_blueprint("vehicle.mercedes.coupe_2020"),
+        vehicle_blueprint("vehicle.tesla.model3", generation=1),
+        vehicle_blueprint("vehicle.toyota.prius", generation=1),
+        vehicle_blueprint("vehicle.diamondback.century", wheels=2, generation=1),
+        vehicle_blueprint("vehicle.yamaha.yzf", wheels=2, generation=1),
+        ActorBlueprint("static.prop.buffalo", ["static", "prop", "buffalo"], size="medium"),
+        ActorBlueprint("static.prop.laneblock", ["static", "prop", "laneblock"], size="small"),
+        ActorBlueprint("static.prop.jcb", ["static", "prop", "jcb"], size="big"),
+        ActorBlueprint("sensor.other.collision", ["sensor", "other", "collision"], role_name="front"),
+    ]
+
+# ==============================================================================
+# Actors
+# ==============================================================================
+
+class Actor:
+    def __init__(self, world: "World", id: int, blueprint: ActorBlueprint, transform: Transform, parent=None):
+        self.world = world
+        self.id = id
+        self.type_id = blueprint.id
+        self.attributes = {key: str(value) for key, value in blueprint.attributes.items()}
+        self.semantic_tags = []
+        self.parent = parent
+        self.transform = transform.copy()
+        self.velocity = Vector3D()
+        self.is_alive = True
+
+    def __repr__(self):
+        return "Actor(id={}, type={})".format(self.id, self.type_id)
+
+    @property
+    def bounding_box(self) -> BoundingBox:
+        return BoundingBox(Location(), Vector3D(*PROP_EXTENT))
+
+    def overlaps(self, other: "Actor") -> bool:
+        # The road runs along x, so the boxes are compared axis aligned
+        extent = self.bounding_box.extent
+        other_extent = other.bounding_box.extent
+        location = self.transform.location
+        other_location = other.transform.location
+        return (abs(location.x - other_location.x) < extent.x + other_extent.x
+                and abs(location.y - other_location.y) < extent.y + other_extent.y)
+
+    def get_transform(self) -> Transform:
+        if self.parent is not None:
+            return self.parent.get_transform()
+        return self.transform.copy()
+
+    def get_location(self) -> Location:
+        return self.get_transform().location
+
+    def get_velocity(self) -> Vector3D:
+        return Vector3D(self.velocity.x, self.velocity.y, self.velocity.z)
+
+    def get_angular_velocity(self) -> Vector3D:
+        return Vector3D()
+
+    def get_acceleration(self) -> Vector3D:
+        return Vector3D()
+
+    def set_transform(self, transform: Transform) -> None:
+        self.transform = transform.copy()
+
+    def set_location(self, location: Location) -> None:
+        self.transform.location = Location(location.x, location.y, location.z)
+
+    def set_target_velocity(self, velocity: Vector3D) -> None:
+        self.velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def set_simulate_physics(self, enabled: bool = True) -> None:
+        pass
+
+    def destroy(self) -> bool:
+        return self.world.destroy_actor(self.id)
+
+    def step(self, dt: float) -> None:
+        self.transform.location += self.velocity * dt
+
+
+class Vehicle(Actor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.control = VehicleControl()
+        self.autopilot_port = None
+        self.constant_velocity = None
+        self.light_state = 0
+
+    @property
+    def bounding_box(self) -> BoundingBox:
+        return BoundingBox(Location(), Vector3D(*VEHICLE_EXTENT))
+
+    @property
+    def speed(self) -> float:
+        return math.hypot(self.velocity.x, self.velocity.y)
+
+    def apply_control(self, control: VehicleControl) -> None:
+        self.control = control
+
+    def get_control(self) -> VehicleControl:
+        return self.control
+
+    def set_autopilot(self, enabled: bool = True, tm_port: int = 8000) -> None:
+        # Like carla, this starts a traffic manager on tm_port if none is running there
+        traffic_manager = self.world.server.traffic_manager(tm_port)
+        self.autopilot_port = tm_port if enabled else None
+        if enabled:
+            traffic_manager.register(self)
+
+    def enable_constant_velocity(self, velocity: Vector3D) -> None:
+        self.constant_velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def disable_constant_velocity(self) -> None:
+        self.constant_velocity = None
+
+    def set_light_state(self, light_state) -> None:
+        self.light_state = light_state
+
+    def set_velocity(self, speed: float) -> None:
+        forward = self.transform.get_forward_vector()
+        self.velocity = Vector3D(forward.x * speed, forward.y * speed, 0.0)
+
+    def drive(self, dt: float) -> None:
+        """Bicycle model driven by the last applied control."""
+        speed = self.speed
+        control = self.control
+        acceleration = control.throttle * MAX_ACCELERATION - control.brake * MAX_DECELERATION - DRAG * speed
+        speed = min(max(speed + acceleration * dt, 0.0), MAX_SPEED)
+        yaw_rate = speed * math.tan(control.steer * MAX_STEER_ANGLE) / WHEELBASE
+        self.transform.rotation.yaw += math.degrees(yaw_rate * dt)
+        self.set_velocity(speed)
+
+    def follow_lane(self, dt: float, target_speed: float) -> None:
+        """Autopilot: accelerate towards `target_speed` and settle onto the centre of the current lane."""
+        speed = self.speed
+        if speed < target_speed:
+            speed = min(speed + MAX_ACCELERATION * dt, target_speed)
+        else:
+            speed = max(speed - MAX_DECELERATION * dt, target_speed)
+        location = self.transform.location
+        self.transform.location.y += (lane_centre(lane_at(location.y)) - location.y) * min(1.0, dt)
+        self.transform.rotation.yaw = 0.0
+        self.set_velocity(speed)
+
+    def step(self, dt: float) -> None:
+        if self.constant_velocity is not None:
+            # The constant velocity is given in the vehicle's frame
+            forward = self.transform.get_forward_vector()
+            right = self.transform.get_right_vector()
+            self.velocity = forward * self.constant_velocity.x + right * self.constant_velocity.y
+        elif self.autopilot_port is None:
+            self.drive(dt)
+        super().step(dt)
+
+
+class CollisionEvent:
+    def __init__(self, frame: int, timestamp: float, actor: Actor, other_actor: Actor, normal_impulse: Vector3D):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.transform = actor.get_transform()
+        self.actor = actor
+        self.other_actor = other_actor
+        self.normal_impulse = normal_impulse
+
+
+class Sensor(Actor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback: Optional[Callable] = None
+
+    @property
+    def is_listening(self) -> bool:
+        return self.callback is not None
+
+    def listen(self, callback: Callable) -> None:
+        self.callback = callback
+
+    def stop(self) -> None:
+        self.callback = None
+
+    def step(self, dt: float) -> None:
+        pass
+
+    def sense(self, world: "World") -> None:
+        if self.callback is None or self.parent is None or not self.parent.is_alive:
+            return
+        for other in list(world.actors.values()):
+            if other is self.parent or isinstance(other, Sensor) or not other.is_alive:
+                continue
+            if self.parent.overlaps(other):
+                relative = self.parent.velocity - other.velocity
+                # Impulse of a 1500 kg vehicle stopped by the contact within a tick
+                impulse = relative * (-1500.0)
+                self.callback(CollisionEvent(world.frame, world.elapsed_seconds, self.parent, other, impulse))
+
+# ==============================================================================
+# World
+# ==============================================================================
+
+class Timestamp:
+    def __init__(self, frame: int, elapsed_seconds: float, delta_seconds: float, platform_timestamp: float):
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = platform_timestamp
+
+
+class ActorSnapshot:
+    def __init__(self, id: int, transform: Transform, velocity: Vector3D):
+        self.id = id
+        self.transform = transform
+        self.velocity = velocity
+
+    def get_transform(self) -> Transform:
+        return self.transform
+
+    def get_velocity(self) -> Vector3D:
+        return self.velocity
+
+    def get_angular_velocity(self) -> Vector3D:
+        return Vector3D()
+
+    def get_acceleration(self) -> Vector3D:
+        return Vector3D()
+
+
+class WorldSnapshot:
+    def __init__(self, world: "World"):
+        self.id = world.episode_id
+        self.frame = world.frame
+        self.timestamp = Timestamp(world.frame, world.elapsed_seconds, world.delta_seconds, time.time())
+        self.actors = {actor.id: ActorSnapshot(actor.id, actor.get_transform(), actor.get_velocity())
+                       for actor in world.actors.values()}
+
+    def __len__(self):
+        return len(self.actors)
+
+    def __iter__(self):
+        return iter(self.actors.values())
+
+    def has_actor(self, actor_id: int) -> bool:
+        return actor_id in self.actors
+
+    def find(self, actor_id: int) -> Optional[ActorSnapshot]:
+        return self.actors.get(actor_id)
+
+
+class ActorList:
+    def __init__(self, actors: List[Actor]):
+        self.actors = actors
+
+    def __iter__(self):
+        return iter(self.actors)
+
+    def __len__(self):
+        return len(self.actors)
+
+    def __getitem__(self, index):
+        return self.actors[index]
+
+    def filter(self, wildcard_pattern: str) -> "ActorList":
+        return ActorList([actor for actor in self.actors if fnmatch.fnmatchcase(actor.type_id, wildcard_pattern)])
+
+    def find(self, actor_id: int) -> Optional[Actor]:
+        for actor in self.actors:
+            if actor.id == actor_id:
+                return actor
+        return None
+
+
+class WorldSettings:
+    def __init__(self, synchronous_mode: bool = False, no_rendering_mode: bool = False,
+                 fixed_delta_seconds: Optional[float] = None):
+        self.synchronous_mode = synchronous_mode
+        self.no_rendering_mode = no_rendering_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+
+    def copy(self) -> "WorldSettings":
+        return WorldSettings(self.synchronous_mode, self.no_rendering_mode, self.fixed_delta_seconds)
+
+
+class World:
+    def __init__(self, server: "Server", ego: bool = True):
+        self.server = server
+        self.id = 1
+        self.episode_id = 1
+        self.frame = 0
+        self.elapsed_seconds = 0.0
+        self.delta_seconds = DEFAULT_DELTA_SECONDS
+        self.settings = WorldSettings()
+        self.weather = WeatherParameters.Default.copy()
+        self.map = Map()
+        self.blueprint_library = BlueprintLibrary(default_blueprints())
+        self.actors: Dict[int, Actor] = {}
+        self.next_actor_id = 1
+        if ego:
+            transform = Transform(Location(EGO_START, lane_centre(EGO_LANE), 0.5), Rotation())
+            self.spawn_actor(self.blueprint_library.find("vehicle.dreyevr.egovehicle"), transform)
+
+    # Settings and weather
+
+    def get_settings(self) -> WorldSettings:
+        return self.settings.copy()
+
+    def apply_settings(self, settings: WorldSettings) -> int:
+        self.settings = settings.copy()
+        return self.frame
+
+    def get_weather(self) -> WeatherParameters:
+        return self.weather.copy()
+
+    def set_weather(self, weather: WeatherParameters) -> None:
+        self.weather = weather.copy()
+
+    def get_map(self) -> Map:
+        return self.map
+
+    def get_blueprint_library(self) -> BlueprintLibrary:
+        return self.blueprint_library
+
+    # Actors
+
+    def spawn_actor(self, blueprint: ActorBlueprint, transform: Transform, attach_to: Optional[Actor] = None,
+                    attachment_type=None) -> Actor:
+        actor = self.try_spawn_actor(blueprint, transform, attach_to)
+        if actor is None:
+            raise RuntimeError("Spawn failed because of collision at spawn position")
+        return actor
+
+    def try_spawn_actor(self, blueprint: ActorBlueprint, transform: Transform, attach_to: Optional[Actor] = None,
+                        attachment_type=None) -> Optional[Actor]:
+        if blueprint.id.startswith("sensor."):
+            actor_class = Sensor
+        elif blueprint.id.startswith("vehicle."):
+            actor_class = Vehicle
+        else:
+            actor_class = Actor
+        actor = actor_class(self, self.next_actor_id, blueprint, transform, attach_to)
+        if actor_class is Vehicle and any(isinstance(other, Vehicle) and actor.overlaps(other)
+                                          for other in self.actors.values()):
+            return None
+        self.actors[actor.id] = actor
+        self.next_actor_id += 1
+        return actor
+
+    def destroy_actor(self, actor_id: int) -> bool:
+        actor = self.actors.pop(actor_id, None)
+        if actor is None:
+            return False
+        actor.is_alive = False
+        for port_manager in self.server.traffic_managers.values():
+            port_manager.vehicles.pop(actor_id, None)
+        return True
+
+    def get_actor(self, actor_id: int) -> Optional[Actor]:
+        return self.actors.get(actor_id)
+
+    def get_actors(self, actor_ids: Optional[List[int]] = None) -> ActorList:
+        if actor_ids is None:
+            return ActorList(list(self.actors.values()))
+        return ActorList([self.actors[i] for i in actor_ids if i in self.actors])
+
+    def get_spectator(self) -> Actor:
+        return Actor(self, 0, ActorBlueprint("spectator"), Transform())
+
+    # Simulation
+
+    def tick(self, seconds: float = 10.0) -> int:
+        dt = self.settings.fixed_delta_seconds or DEFAULT_DELTA_SECONDS
+        for traffic_manager in self.server.traffic_managers.values():
+            traffic_manager.step(dt)
+        for actor in list(self.actors.values()):
+            actor.step(dt)
+        self.frame += 1
+        self.delta_seconds = dt
+        self.elapsed_seconds += dt
+        for actor in list(self.actors.values()):
+            if isinstance(actor, Sensor):
+                actor.sense(self)
+        return self.frame
+
+    def wait_for_tick(self, seconds: float = 10.0) -> WorldSnapshot:
+        self.tick()
+        return self.get_snapshot()
+
+    def get_snapshot(self) -> WorldSnapshot:
+        return WorldSnapshot(self)
+
+# ==============================================================================
+# Traffic manager, commands and client
+# ==============================================================================
+
+class TrafficManager:
+    """Drives the vehicles on autopilot: lane following at the speed limit scaled by the speed difference."""
+
+    def __init__(self, world: World, port: int):
+        self.world = world
+        self.port = port
+        self.vehicles: Dict[int, Vehicle] = {}
+        self.speed_difference = 30.0
+        self.vehicle_speed_difference: Dict[int, float] = {}
+        self.distance_to_leading_vehicle = 2.0
+        self.synchronous_mode = False
+        self.seed = 0
+
+    def get_port(self) -> int:
+        return self.port
+
+    def register(self, vehicle: Vehicle) -> None:
+        self.vehicles[vehicle.id] = vehicle
+
+    def set_synchronous_mode(self, mode: bool = True) -> None:
+        self.synchronous_mode = mode
+
+    def set_global_distance_to_leading_vehicle(self, distance: float) -> None:
+        self.distance_to_leading_vehicle = distance
+
+    def global_percentage_speed_difference(self, percentage: float) -> None:
+        self.speed_difference = percentage
+
+    def vehicle_percentage_speed_difference(self, vehicle: Vehicle, percentage: float) -> None:
+        self.vehicle_speed_difference[vehicle.id] = percentage
+
+    def auto_lane_change(self, vehicle: Vehicle, enable: bool) -> None:
+        pass
+
+    def update_vehicle_lights(self, vehicle: Vehicle, do_update: bool) -> None:
+        pass
+
+    def set_random_device_seed(self, seed: int) -> None:
+        self.seed = seed
+
+    def target_speed(self, vehicle: Vehicle) -> float:
+        difference = self.vehicle_speed_difference.get(vehicle.id, self.speed_difference)
+        return min(SPEED_LIMIT * (1 - difference / 100.0), MAX_SPEED)
+
+    def step(self, dt: float) -> None:
+        # Every vehicle can be a leader, but only the ones on this traffic manager are driven
+        lanes: Dict[int, List[Vehicle]] = {}
+        for vehicle in self.world.actors.values():
+            if isinstance(vehicle, Vehicle):
+                lanes.setdefault(lane_at(vehicle.transform.location.y), []).append(vehicle)
+        for vehicles in lanes.values():
+            vehicles.sort(key=lambda vehicle: vehicle.transform.location.x, reverse=True)
+            leader = None
+            for vehicle in vehicles:
+                if vehicle.autopilot_port == self.port and vehicle.constant_velocity is None:
+                    target_speed = self.target_speed(vehicle)
+                    if leader is not None:
+                        # Keep the gap: no faster than what closes it within a second
+                        gap = (leader.transform.location.x - vehicle.transform.location.x
+                               - 2 * VEHICLE_EXTENT[0] - self.distance_to_leading_vehicle)
+                        target_speed = min(target_speed, max(leader.speed + gap, 0.0))
+                    vehicle.follow_lane(dt, target_speed)
+                leader = vehicle
+
+
+class FutureActor:
+    """Placeholder for the id of the actor spawned by the parent command of a batch."""
+
+
+class Command:
+    def __init__(self, *args):
+        self.args = args
+        self.then_commands: List["Command"] = []
+
+    def then(self, command: "Command") -> "Command":
+        self.then_commands.append(command)
+        return self
+
+    def actor_id(self, actor) -> int:
+        return getattr(actor, "id", actor)
+
+
+class SpawnActor(Command):
+    def execute(self, world: World, future_id: Optional[int]) -> int:
+        blueprint, transform = self.args[:2]
+        parent = world.get_actor(self.actor_id(self.args[2])) if len(self.args) > 2 else None
+        return world.spawn_actor(blueprint, transform, parent).id
+
+
+class DestroyActor(Command):
+    def execute(self, world: World, future_id: Optional[int]) -> int:
+        actor_id = self.actor_id(self.args[0])
+        if not world.destroy_actor(actor_id):
+            raise RuntimeError("Actor {} not found".format(actor_id))
+        return actor_id
+
+
+class ActorCommand(Command):
+    def actor(self, world: World, future_id: Optional[int]) -> Actor:
+        actor_id = future_id if self.args[0] is FutureActor else self.actor_id(self.args[0])
+        actor = world.get_actor(actor_id)
+        if actor is None:
+            raise RuntimeError("Actor {} not found".format(actor_id))
+        return actor
+
+
+class ApplyTransform(ActorCommand):
+    def execute(self, world, future_id):
+        actor = self.actor(world, future_id)
+        actor.set_transform(self.args[1])
+        return actor.id
+
+
+class ApplyTargetVelocity(ActorCommand):
+    def execute(self, world, future_id):
+        actor = self.actor(world, future_id)
+        actor.set_target_velocity(self.args[1])
+        return actor.id
+
+
+class ApplyVehicleControl(ActorCommand):
+    def execute(self, world, future_id):
+        actor = self.actor(world, future_id)
+        actor.apply_control(self.args[1])
+        return actor.id
+
+
+class SetAutopilot(ActorCommand):
+    def execute(self, world, future_id):
+        actor = self.actor(world, future_id)
+        actor.set_autopilot(*self.args[1:])
+        return actor.id
+
+
+class Response:
+    def __init__(self, actor_id: int = 0, error: str = ""):
+        self.actor_id = actor_id
+        self.error = error
+
+    def has_error(self) -> bool:
+        return bool(self.error)
+
+
+command = types.SimpleNamespace(
+    SpawnActor=SpawnActor, DestroyActor=DestroyActor, ApplyTransform=ApplyTransform,
+    ApplyTargetVelocity=ApplyTargetVelocity, ApplyVehicleControl=ApplyVehicleControl,
+    SetAutopilot=SetAutopilot, FutureActor=FutureActor, Response=Response)
+
+
+class Server:
+    """State of one fake simulator: its world and traffic managers."""
+
+    def __init__(self, ego: bool = True):
+        self.ego = ego
+        self.world = World(self, ego)
+        self.traffic_managers: Dict[int, TrafficManager] = {}
+
+    def traffic_manager(self, port: int) -> TrafficManager:
+        if port not in self.traffic_managers:
+            self.traffic_managers[port] = TrafficManager(self.world, port)
+        return self.traffic_managers[port]
+
+    def reload(self, reset_settings: bool) -> World:
+        settings = self.world.settings
+        frame, elapsed_seconds, episode_id = self.world.frame, self.world.elapsed_seconds, self.world.episode_id
+        self.world = World(self, self.ego)
+        self.world.frame, self.world.elapsed_seconds = frame, elapsed_seconds
+        self.world.episode_id = episode_id + 1
+        if not reset_settings:
+            self.world.settings = settings
+        self.traffic_managers = {}
+        return self.world
+
+
+# Fake servers by (host, port), so clients of the same address share a world
+SERVERS: Dict[tuple, Server] = {}
+
+def reset_servers() -> None:
+    SERVERS.clear()
+
+
+class Client:
+    def __init__(self, host: str = '127.0.0.1', port: int = 2000, worker_threads: int = 0):
+        self.address = (host, port)
+        if self.address not in SERVERS:
+            SERVERS[self.address] = Server()
+        self.server = SERVERS[self.address]
+        self.timeout = 10.0
+
+    def set_timeout(self, seconds: float) -> None:
+        self.timeout = seconds
+
+    def get_client_version(self) -> str:
+        return SERVER_VERSION
+
+    def get_server_version(self) -> str:
+        return SERVER_VERSION
+
+    def get_world(self) -> World:
+        return self.server.world
+
+    def get_available_maps(self) -> List[str]:
+        return ["/Game/Carla/Maps/" + Map.name]
+
+    def load_world(self, map_name: str = Map.name, reset_settings: bool = True) -> World:
+        return self.server.reload(reset_settings)
+
+    def reload_world(self, reset_settings: bool = True) -> World:
+        return self.server.reload(reset_settings)
+
+    def get_trafficmanager(self, client_connection: int = 8000) -> TrafficManager:
+        return self.server.traffic_manager(client_connection)
+
+    def execute(self, command: Command, future_id: Optional[int] = None) -> Response:
+        try:
+            actor_id = command.execute(self.server.world, future_id)
+        except RuntimeError as e:
+            return Response(error=str(e))
+        for then_command in command.then_commands:
+            response = self.execute(then_command, actor_id)
+            if response.error:
+                return Response(actor_id, response.error)
+        return Response(actor_id)
+
+    def apply_batch(self, commands: List[Command]) -> None:
+        for command in commands:
+            self.execute(command)
+
+    def apply_batch_sync(self, commands: List[Command], do_tick: bool = False) -> List[Response]:
+        responses = [self.execute(command) for command in commands]
+        if do_tick:
+            self.server.world.tick()
+        return responses
+
+
+# Types the experiment scripts reach through carla.libcarla, e.g. in annotations
+libcarla = types.SimpleNamespace(
+    World=World, Vehicle=Vehicle, Sensor=Sensor, Actor=Actor, Vector3D=Vector3D, Vector2D=Vector2D,
+    Location=Location, Rotation=Rotation, Transform=Transform)
+
+def install() -> None:
+    """Make `import carla` load this module."""
+    sys.modules["carla"] = sys.modules[__name__]
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Measure the tick rate of the fake server")
+    argparser.add_argument("--vehicles", type=int, default=40, help="traffic vehicles on autopilot")
+    argparser.add_argument("--ticks", type=int, default=8000)
+    args = argparser.parse_args()
+
+    install()
+    from tick_driver import TickDriver
+
+    client = Client("fake", 0)
+    world = client.get_world()
+    world.apply_settings(WorldSettings(synchronous_mode=True, fixed_delta_seconds=1.0 / 80))
+    blueprints = world.get_blueprint_library().filter("vehicle.audi.*")
+    batch = [SpawnActor(blueprints[i % len(blueprints)], transform).then(SetAutopilot(FutureActor, True, 8000))
+             for i, transform in enumerate(world.get_map().get_spawn_points()[:args.vehicles])]
+    client.apply_batch_sync(batch)
+
+    driver = TickDriver(world)
+    driver.track(*world.get_actors())
+    started = time.perf_counter()
+    for i in range(args.ticks):
+        driver.tick()
+    elapsed = time.perf_counter() - started
+    print("{} ticks with {} vehicles in {:.2f} s: {:.0f} ticks/s".format(
+        args.ticks, args.vehicles, elapsed, args.ticks / elapsed))
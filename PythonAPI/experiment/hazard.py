@@ -0,0 +1,170 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+from scheduler import EPSILON
+
+# Distance (m) between the boxes beyond which a hazard is not measured; well beyond the
+# farthest TOR distance of the scenarios, so the whole takeover is covered.
+HAZARD_RANGE = 200.0
+
+Point = Tuple[float, float]
+
+def box_corners(transform, bounding_box) -> List[Point]:
+    """Corners (x, y) of an actor's bounding box at `transform`, in world coordinates."""
+    yaw = math.radians(transform.rotation.yaw)
+    cos, sin = math.cos(yaw), math.sin(yaw)
+    # The box location is relative to the actor; local y points right (left-handed UE4 frame)
+    offset = bounding_box.location
+    cx = transform.location.x + offset.x * cos - offset.y * sin
+    cy = transform.location.y + offset.x * sin + offset.y * cos
+    ex, ey = bounding_box.extent.x, bounding_box.extent.y
+    return [(cx + x * cos - y * sin, cy + x * sin + y * cos) for x, y in ((ex, ey), (-ex, ey), (-ex, -ey), (ex, -ey))]
+
+def separated(a: Sequence[Point], b: Sequence[Point]) -> bool:
+    """Whether two convex polygons don't overlap, by the separating axis test on the edge normals of both."""
+    for polygon in (a, b):
+        for i in range(len(polygon)):
+            x0, y0 = polygon[i]
+            x1, y1 = polygon[(i + 1) % len(polygon)]
+            nx, ny = y0 - y1, x1 - x0
+            projections_a = [x * nx + y * ny for x, y in a]
+            projections_b = [x * nx + y * ny for x, y in b]
+            if max(projections_a) < min(projections_b) or max(projections_b) < min(projections_a):
+                return True
+    return False
+
+def closest_on_segment(point: Point, start: Point, end: Point) -> Point:
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else min(max(((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length, 0.0), 1.0)
+    return (start[0] + t * dx, start[1] + t * dy)
+
+def box_gap(a: Sequence[Point], b: Sequence[Point]) -> Tuple[float, Point]:
+    """
+    Distance (m) between two boxes given by their corners, and the unit vector
+    from the closest point of `a` towards `b` (centre to centre when they overlap).
+    """
+    if not separated(a, b):
+        dx = sum(x for x, _ in b) / len(b) - sum(x for x, _ in a) / len(a)
+        dy = sum(y for _, y in b) / len(b) - sum(y for _, y in a) / len(a)
+        norm = math.hypot(dx, dy) or 1.0
+        return 0.0, (dx / norm, dy / norm)
+    # Two separated convex polygons are closest at a corner of one and an edge of the other
+    best = (math.inf, 0.0, 0.0)
+    for corners, edges, sign in ((a, b, 1.0), (b, a, -1.0)):
+        for point in corners:
+            for i in range(len(edges)):
+                closest = closest_on_segment(point, edges[i], edges[(i + 1) % len(edges)])
+                dx, dy = (closest[0] - point[0]) * sign, (closest[1] - point[1]) * sign
+                distance = math.hypot(dx, dy)
+                if distance < best[0]:
+                    best = (distance, dx, dy)
+    distance, dx, dy = best
+    return distance, (dx / distance, dy / distance)
+
+
+def time_to_contact(a: Sequence[Point], b: Sequence[Point], vx: float, vy: float) -> float:
+    """
+    Time (s) until box `b`, moving at (vx, vy) relative to box `a`, first
+    touches it: 0 if they overlap, inf if they don't meet. Swept separating
+    axis test: the boxes touch while their projections overlap on every axis.
+    """
+    enter, leave = -math.inf, math.inf
+    for polygon in (a, b):
+        for i in range(len(polygon)):
+            x0, y0 = polygon[i]
+            x1, y1 = polygon[(i + 1) % len(polygon)]
+            nx, ny = y0 - y1, x1 - x0
+            a_min = min(x * nx + y * ny for x, y in a)
+            a_max = max(x * nx + y * ny for x, y in a)
+            b_min = min(x * nx + y * ny for x, y in b)
+            b_max = max(x * nx + y * ny for x, y in b)
+            speed = vx * nx + vy * ny
+            if speed == 0:
+                if b_max < a_min or a_max < b_min:
+                    return math.inf
+                continue
+            t0, t1 = (a_min - b_max) / speed, (a_max - b_min) / speed
+            enter = max(enter, min(t0, t1))
+            leave = min(leave, max(t0, t1))
+            if enter > leave or leave < 0:
+                return math.inf
+    return max(enter, 0.0)
+
+
+def box_radius(bounding_box) -> float:
+    """Distance (m) from an actor's location to the farthest point of its box in the ground plane."""
+    return math.hypot(bounding_box.location.x, bounding_box.location.y) + \
+        math.hypot(bounding_box.extent.x, bounding_box.extent.y)
+
+
+class HazardProximity:
+    """
+    Gap between the ego's bounding box and the closest hazard actor's box, the
+    speed (m/s) at which it closes and the time (s) to contact with any hazard
+    if nothing changes course, from the tracked actors of a tick frame.
+
+    The time to contact sweeps the boxes along their relative velocity, so a
+    hazard the ego only passes beside has none (inf). The boxes are read once
+    from the actors; hazards must be tracked by the run's tick driver. Hazards
+    farther than `hazard_range` are skipped before the box tests; without
+    hazards in range (or once they are gone) all three are NaN.
+
+    Props report no velocity, also when a scenario moves them every tick (the
+    crossing animals), so a hazard without one gets the velocity of its
+    displacement since the previous measurement instead; a prop seen for the
+    first time counts as static.
+    """
+
+    def __init__(self, ego, hazards, hazard_range: float = HAZARD_RANGE):
+        self.ego_id = ego.id
+        self.ego_box = ego.bounding_box
+        self.boxes = {hazard.id: hazard.bounding_box for hazard in hazards}
+        # Centre distance beyond which a hazard's box is farther than the range from the ego's
+        ego_radius = box_radius(self.ego_box)
+        self.ranges = {hazard_id: hazard_range + ego_radius + box_radius(box)
+                       for hazard_id, box in self.boxes.items()}
+        # (elapsed seconds, x, y) of every hazard in range at the previous measurement
+        self.previous: Dict[int, Tuple[float, float, float]] = {}
+
+    def velocity(self, hazard_id: int, state, elapsed: float) -> Tuple[float, float]:
+        location = state.transform.location
+        previous = self.previous.get(hazard_id)
+        self.previous[hazard_id] = (elapsed, location.x, location.y)
+        if state.velocity.x != 0 or state.velocity.y != 0 or previous is None:
+            return state.velocity.x, state.velocity.y
+        dt = elapsed - previous[0]
+        if dt < EPSILON:
+            return 0.0, 0.0
+        return (location.x - previous[1]) / dt, (location.y - previous[2]) / dt
+
+    def measure(self, frame) -> Tuple[float, float, float]:
+        ego = frame.state(self.ego_id)
+        if ego is None or not self.boxes:
+            return math.nan, math.nan, math.nan
+        ego_location = ego.transform.location
+        ego_corners = None
+        gap, closing_speed, contact = math.inf, math.nan, math.inf
+        for hazard_id, box in self.boxes.items():
+            state = frame.state(hazard_id)
+            if state is None:
+                self.previous.pop(hazard_id, None)
+                continue
+            location = state.transform.location
+            if (location.x - ego_location.x) ** 2 + (location.y - ego_location.y) ** 2 > self.ranges[hazard_id] ** 2:
+                self.previous.pop(hazard_id, None)
+                continue
+            if ego_corners is None:
+                ego_corners = box_corners(ego.transform, self.ego_box)
+            corners = box_corners(state.transform, box)
+            hazard_vx, hazard_vy = self.velocity(hazard_id, state, frame.timestamp.elapsed_seconds)
+            vx, vy = ego.velocity.x - hazard_vx, ego.velocity.y - hazard_vy
+            distance, (nx, ny) = box_gap(ego_corners, corners)
+            if distance < gap:
+                gap = distance
+                # Velocity of the ego relative to the hazard along the shortest line between the boxes
+                closing_speed = vx * nx + vy * ny
+            contact = min(contact, time_to_contact(corners, ego_corners, vx, vy))
+        if gap == math.inf:
+            return math.nan, math.nan, math.nan
+        return gap, closing_speed, contact
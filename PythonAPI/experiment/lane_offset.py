@@ -0,0 +1,92 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+# Spacing (m) of the precomputed lane-centre waypoints and size (m) of a grid cell.
+WAYPOINT_RESOLUTION = 1.0
+GRID_CELL_SIZE = 10.0
+# Period (s of simulation time) at which the scenarios sample the lane offset.
+SAMPLING_PERIOD = 0.2
+
+# Lane indices built so far in this process, by map name, resolution and cell size
+INDEX_CACHE: Dict[Tuple[str, float, float], "LaneIndex"] = {}
+
+class LaneIndex:
+    """
+    Uniform grid over the lane centrelines of a map.
+
+    Every driving-lane waypoint (sampled every `resolution` meters) is stored as
+    (x, y, forward_x, forward_y) in the grid cell that contains it, so the
+    closest centreline point to a location is found by scanning the 3x3 cells
+    around it instead of asking the map to project the location again.
+    """
+
+    def __init__(self, carla_map, resolution: float = WAYPOINT_RESOLUTION, cell_size: float = GRID_CELL_SIZE):
+        self.carla_map = carla_map
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Tuple[float, float, float, float]]] = {}
+        for waypoint in carla_map.generate_waypoints(resolution):
+            location = waypoint.transform.location
+            forward = waypoint.transform.get_forward_vector()
+            norm = math.hypot(forward.x, forward.y) or 1.0
+            self.cells.setdefault(self.cell(location.x, location.y), []).append(
+                (location.x, location.y, forward.x / norm, forward.y / norm))
+
+    @classmethod
+    def for_map(cls, carla_map, resolution: float = WAYPOINT_RESOLUTION,
+                cell_size: float = GRID_CELL_SIZE) -> "LaneIndex":
+        """
+        Index of `carla_map`, built on the first request for the map and shared
+        by the episodes that follow, so a batch of trials on one map scans it once.
+        """
+        key = (carla_map.name, resolution, cell_size)
+        index = INDEX_CACHE.get(key)
+        if index is None:
+            index = INDEX_CACHE[key] = cls(carla_map, resolution, cell_size)
+        return index
+
+    def cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+
+    def nearest(self, x: float, y: float) -> Optional[Tuple[float, float, float, float]]:
+        cx, cy = self.cell(x, y)
+        best = None
+        best_distance = math.inf
+        for i in range(cx - 1, cx + 2):
+            for j in range(cy - 1, cy + 2):
+                for point in self.cells.get((i, j), ()):
+                    distance = (point[0] - x) ** 2 + (point[1] - y) ** 2
+                    if distance < best_distance:
+                        best = point
+                        best_distance = distance
+        return best
+
+    def signed_offset(self, location) -> float:
+        """Lateral offset (m) of `location` from the closest lane centre, positive to the right."""
+        point = self.nearest(location.x, location.y)
+        if point is None:
+            # Outside the indexed area (e.g. off-road): let the map project the location.
+            waypoint = self.carla_map.get_waypoint(location)
+            forward = waypoint.transform.get_forward_vector()
+            norm = math.hypot(forward.x, forward.y) or 1.0
+            centre = waypoint.transform.location
+            point = (centre.x, centre.y, forward.x / norm, forward.y / norm)
+        x, y, fx, fy = point
+        # Right vector of the lane is the forward vector rotated by +90 degrees (left-handed UE4 frame).
+        return (location.x - x) * -fy + (location.y - y) * fx
+
+
+class LaneOffsetSampler:
+    """
+    Lane offset sampler for a single episode.
+
+    The map is fetched on construction and indexed on the first episode on
+    it (see LaneIndex.for_map), after which every query is answered locally
+    without a server round trip.
+    """
+
+    def __init__(self, world):
+        self.index = LaneIndex.for_map(world.get_map())
+
+    def signed_sample(self, frame, actor) -> float:
+        """Lateral offset of a tracked actor in a tick frame, positive to the right of the lane centre."""
+        return self.index.signed_offset(frame.location(actor))
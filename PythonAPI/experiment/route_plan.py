@@ -0,0 +1,113 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+import carla
+
+# Spacing (m) of the waypoints walked along the ego's lane.
+ROUTE_RESOLUTION = 1.0
+# Points (each side of the last match) searched when projecting a location on the route.
+SEARCH_WINDOW = 50
+
+class RoutePlan:
+    """
+    The ego's lane, walked once from the ego's position when the scenario starts.
+
+    The walk is stored as a polyline parameterised by arc length `s` (m along
+    the lane from the start, negative for the `behind` meters walked backwards):
+    consecutive waypoints lie `resolution` apart in s, since Waypoint.next()
+    and previous() step along the lane. Distances along the road and the
+    waypoint at s + delta are then answered from local arrays, without walking
+    the map again. Projections start from the previous match, so following a
+    moving vehicle only looks at a small window of the polyline.
+    """
+
+    def __init__(self, start_waypoint, length: float, resolution: float = ROUTE_RESOLUTION, behind: float = 0.0):
+        self.resolution = resolution
+        backward = self.walk(start_waypoint, behind, lambda waypoint: waypoint.previous(resolution))
+        forward = self.walk(start_waypoint, length, lambda waypoint: waypoint.next(resolution))
+        self.waypoints = backward[::-1] + [start_waypoint] + forward
+
+        locations = [waypoint.transform.location for waypoint in self.waypoints]
+        self.x = np.array([location.x for location in locations])
+        self.y = np.array([location.y for location in locations])
+        self.z = np.array([location.z for location in locations])
+        self.s = (np.arange(len(self.waypoints)) - len(backward)) * resolution
+        self.cursor = len(backward)
+
+    def walk(self, waypoint, distance: float, step) -> list:
+        waypoints = []
+        for _ in range(int(math.ceil(distance / self.resolution))):
+            next_waypoints = step(waypoint)
+            if not next_waypoints:
+                print("Route ends after {:.0f} m of the requested {:.0f} m".format(
+                    len(waypoints) * self.resolution, distance))
+                break
+            # Keep the first branch at junctions, as the scenarios always did
+            waypoint = next_waypoints[0]
+            waypoints.append(waypoint)
+        return waypoints
+
+    @classmethod
+    def from_location(cls, carla_map, location, length: float, resolution: float = ROUTE_RESOLUTION,
+                      behind: float = 0.0) -> "RoutePlan":
+        return cls(carla_map.get_waypoint(location), length, resolution, behind)
+
+    @property
+    def length(self) -> float:
+        """Distance (m) walked ahead of the start."""
+        return float(self.s[-1])
+
+    def index_at(self, s: float) -> int:
+        return min(max(int(round((s - self.s[0]) / self.resolution)), 0), len(self.waypoints) - 1)
+
+    def waypoint_at(self, s: float):
+        """Walked waypoint closest to `s` meters along the route."""
+        return self.waypoints[self.index_at(s)]
+
+    def location_at(self, s: float) -> carla.Location:
+        s = min(max(s, self.s[0]), self.s[-1])
+        return carla.Location(float(np.interp(s, self.s, self.x)), float(np.interp(s, self.s, self.y)),
+                              float(np.interp(s, self.s, self.z)))
+
+    def nearest_index(self, x: float, y: float) -> int:
+        lo = max(self.cursor - SEARCH_WINDOW, 0)
+        hi = min(self.cursor + SEARCH_WINDOW + 1, len(self.waypoints))
+        i = lo + int(np.argmin((self.x[lo:hi] - x) ** 2 + (self.y[lo:hi] - y) ** 2))
+        if (i == lo and lo > 0) or (i == hi - 1 and hi < len(self.waypoints)):
+            # The location left the window (e.g. a new vehicle or a jump), search the whole route
+            i = int(np.argmin((self.x - x) ** 2 + (self.y - y) ** 2))
+        return i
+
+    def locate(self, location) -> Tuple[float, float]:
+        """
+        Arc length (m) of the point of the route closest to `location`, and the
+        offset (m) of `location` from the route there, positive to the right.
+        """
+        i = self.nearest_index(location.x, location.y)
+        self.cursor = i
+        if len(self.waypoints) == 1:
+            return 0.0, 0.0
+        # Project on the segment after the closest point, or the one before it if the location is behind
+        for j in (i, i - 1):
+            if 0 <= j < len(self.waypoints) - 1:
+                dx = self.x[j + 1] - self.x[j]
+                dy = self.y[j + 1] - self.y[j]
+                squared_length = dx * dx + dy * dy
+                if squared_length == 0:
+                    continue
+                t = ((location.x - self.x[j]) * dx + (location.y - self.y[j]) * dy) / squared_length
+                if 0.0 <= t <= 1.0 or j == i - 1:
+                    # Right vector of the UE4 (left-handed) frame is (-forward.y, forward.x)
+                    lateral = ((location.x - self.x[j]) * -dy + (location.y - self.y[j]) * dx) / math.sqrt(squared_length)
+                    return float(self.s[j] + min(max(t, 0.0), 1.0) * self.resolution), float(lateral)
+        return float(self.s[i]), 0.0
+
+    def project(self, location) -> float:
+        """Arc length (m) of the point of the route closest to `location`."""
+        return self.locate(location)[0]
+
+    def distance_remaining(self, location, s: float) -> float:
+        """Distance (m) along the route from `location` to the point `s` meters along it."""
+        return s - self.project(location)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+# Number of word records the ring buffer holds before the oldest is overwritten.
+RING_CAPACITY = 256
+# Maximum encoded length (bytes) of a word in a ring record; longer words are truncated.
+MAX_WORD_BYTES = 64
+# Word written to the stream once the text has been read out.
+END_OF_STREAM = "TTSOver"
+# Interval (s) at which a reader polls the ring buffer for new records.
+POLL_INTERVAL = 0.01
+
+class StreamRecord(NamedTuple):
+    sequence: int
+    offset: int
+    sentence: int
+    sentence_start: int
+    word: str
+
+
+class FileStreamWriter:
+    """
+    Writes the RSVP stream with the original file protocol read by the HUD:
+    the current word in TTSStreamFile.txt and the character index of the next
+    sentence in SentenceIndexFile.txt.
+    """
+
+    def __init__(self, stream_file: str, sentence_index_file: str):
+        self.stream_file = stream_file
+        self.sentence_index_file = sentence_index_file
+
+    def write(self, word: str, offset: int, sentence: int, sentence_start: int) -> None:
+        try:
+            with open(self.stream_file, "w") as file:
+                file.write(word)
+        except Exception as e:
+            print("Error writing the stream file\n", str(e))
+
+    def end_sentence(self, sentence: int, next_sentence_start: int) -> None:
+        try:
+            with open(self.sentence_index_file, "w") as file:
+                file.write(str(next_sentence_start))
+        except Exception as e:
+            print("Error writing the index file\n", str(e))
+
+    def close(self) -> None:
+        pass
+
+
+class RingStream:
+    """
+    Memory-mapped ring buffer of RSVP word records.
+
+    The file starts with a header (magic, capacity, generation, last sequence,
+    sentence index of the next sentence) followed by `capacity` fixed-size
+    records. The writer fills a record before publishing its sequence number in
+    the header, and every record carries its own sequence number, so a reader
+    can detect both torn reads and records it missed because the writer lapped
+    it. A new writer resets the file in place and bumps the generation, so
+    readers that keep the ring mapped notice the reset and start over.
+    """
+
+    MAGIC = b"RSVP"
+    HEADER = struct.Struct("<4sIIQII")
+    RECORD = struct.Struct("<QIIIH%ds" % MAX_WORD_BYTES)
+
+    def __init__(self, path: str, capacity: int = RING_CAPACITY, create: bool = False):
+        if create:
+            self.file = self.reset(path, capacity)
+        else:
+            self.file = open(path, "r+b")
+        self.buffer = mmap.mmap(self.file.fileno(), 0)
+        magic, self.capacity = self.HEADER.unpack_from(self.buffer, 0)[:2]
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError("{} is not an RSVP stream".format(path))
+
+    @classmethod
+    def reset(cls, path: str, capacity: int):
+        """
+        Clears the ring in place for a new stream. The file is not replaced,
+        since it cannot be renamed over or truncated while a reader on Windows
+        has it mapped, and only ever grows, so a mapped reader never reads past
+        its end.
+        """
+        try:
+            file = open(path, "r+b")
+        except FileNotFoundError:
+            file = open(path, "w+b")
+        size = cls.HEADER.size + capacity * cls.RECORD.size
+        header = file.read(cls.HEADER.size)
+        generation = 0
+        if len(header) == cls.HEADER.size:
+            magic, _, generation = cls.HEADER.unpack(header)[:3]
+            if magic != cls.MAGIC:
+                generation = 0
+        file.seek(0, os.SEEK_END)
+        if file.tell() < size:
+            file.truncate(size)
+        # Readers only read records up to the published sequence, so the new
+        # header can go first and the old records be cleared after it
+        file.seek(0)
+        file.write(cls.HEADER.pack(cls.MAGIC, capacity, (generation + 1) & 0xFFFFFFFF, 0, 0, 0))
+        file.write(b"\0" * (capacity * cls.RECORD.size))
+        file.flush()
+        return file
+
+    def header(self) -> Tuple[int, int, int]:
+        """(last sequence, current sentence, start of the next sentence)."""
+        return self.HEADER.unpack_from(self.buffer, 0)[3:]
+
+    def generation(self) -> int:
+        return self.HEADER.unpack_from(self.buffer, 0)[2]
+
+    def record_position(self, sequence: int) -> int:
+        return self.HEADER.size + (sequence % self.capacity) * self.RECORD.size
+
+    def publish(self, sequence: int, sentence: int, next_sentence_start: int) -> None:
+        self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.capacity, self.generation(),
+                              sequence, sentence, next_sentence_start)
+
+    # Writer side
+
+    def write(self, word: str, offset: int, sentence: int, sentence_start: int) -> None:
+        sequence, _, next_sentence_start = self.header()
+        sequence += 1
+        data = word.encode("utf8")[:MAX_WORD_BYTES]
+        self.RECORD.pack_into(self.buffer, self.record_position(sequence),
+                              sequence, offset, sentence, sentence_start, len(data), data)
+        self.publish(sequence, sentence, next_sentence_start)
+
+    def end_sentence(self, sentence: int, next_sentence_start: int) -> None:
+        self.publish(self.header()[0], sentence, next_sentence_start)
+
+    # Reader side
+
+    def read(self, sequence: int) -> StreamRecord:
+        fields = self.RECORD.unpack_from(self.buffer, self.record_position(sequence))
+        return StreamRecord(fields[0], fields[1], fields[2], fields[3], fields[5][:fields[4]].decode("utf8", "ignore"))
+
+    def read_sequence(self, sequence: int) -> int:
+        return struct.unpack_from("<Q", self.buffer, self.record_position(sequence))[0]
+
+    def latest(self) -> StreamRecord:
+        return self.read(self.header()[0])
+
+    def read_since(self, last_sequence: int) -> Tuple[List[StreamRecord], int]:
+        """Records newer than `last_sequence` and the number of records that were dropped."""
+        sequence = self.header()[0]
+        first = max(last_sequence + 1, sequence - self.capacity + 1)
+        records = []
+        for i in range(first, sequence + 1):
+            record = self.read(i)
+            # A record whose sequence changed under us was overwritten while reading
+            if record.sequence == i and self.read_sequence(i) == i:
+                records.append(record)
+        dropped = max(sequence - last_sequence - len(records), 0)
+        return records, dropped
+
+    def close(self) -> None:
+        self.buffer.close()
+        self.file.close()
+
+
+class RingStreamReader:
+    """
+    Follows a RingStream written by another process. Every poll() returns the
+    records written since the previous one, in order; `dropped` counts the
+    records the writer overwrote before they were read. The ring file may not
+    exist yet, and is followed from the start again when a new writer (a new
+    TTS service) resets it, which the reader sees from the generation in the
+    header.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stream = None
+        self.generation = None
+        self.last_sequence = 0
+        self.dropped = 0
+
+    def poll(self) -> List[StreamRecord]:
+        if self.stream is not None and self.stream.generation() != self.generation:
+            # Mapped again, since the new writer may have grown the ring
+            self.close()
+        if self.stream is None:
+            try:
+                self.stream = RingStream(self.path)
+            except (OSError, ValueError):
+                # Not created yet, or still being set up by the writer
+                return []
+            self.generation = self.stream.generation()
+            self.last_sequence = 0
+        records, dropped = self.stream.read_since(self.last_sequence)
+        self.dropped += dropped
+        if records:
+            self.last_sequence = records[-1].sequence
+        return records
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class StreamWriters:
+    """Fans the RSVP stream out to several writers, e.g. the ring buffer and the file fallback."""
+
+    def __init__(self, *writers):
+        self.writers = writers
+
+    def write(self, word: str, offset: int, sentence: int, sentence_start: int) -> None:
+        for writer in self.writers:
+            writer.write(word, offset, sentence, sentence_start)
+
+    def end_sentence(self, sentence: int, next_sentence_start: int) -> None:
+        for writer in self.writers:
+            writer.end_sentence(sentence, next_sentence_start)
+
+    def close(self) -> None:
+        for writer in self.writers:
+            writer.close()
+
+
+def open_stream_writer(stream_file: str, sentence_index_file: str, ring_file: Optional[str] = None,
+                       file_fallback: bool = True):
+    """
+    Writer for the RSVP stream: the ring buffer when `ring_file` is given and/or
+    the file protocol, which stays on by default since the HUD reads the files.
+    """
+    writers = []
+    if ring_file is not None:
+        writers.append(RingStream(ring_file, create=True))
+    if file_fallback or not writers:
+        writers.append(FileStreamWriter(stream_file, sentence_index_file))
+    return writers[0] if len(writers) == 1 else StreamWriters(*writers)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Print the words of an RSVP ring stream as they are read out")
+    argparser.add_argument("ring_file", help="ring buffer written by the TTS service, e.g. ConfigFiles/RSVPStream.ring")
+    args = argparser.parse_args()
+
+    reader = RingStreamReader(args.ring_file)
+    try:
+        while True:
+            for record in reader.poll():
+                if record.word == END_OF_STREAM:
+                    raise SystemExit
+                print("{:6d} {:4d} {}".format(record.sequence, record.sentence, record.word))
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if reader.dropped:
+            print("{} words were overwritten before they were read".format(reader.dropped))
+        reader.close()
@@ -0,0 +1,71 @@
+import math
+from typing import List
+
+# Range (m) of the values the percentile histogram resolves; values outside count in the end bins.
+HISTOGRAM_LOW = -5.0
+HISTOGRAM_HIGH = 5.0
+# Width (m) of a histogram bin, and so the resolution of the percentiles.
+HISTOGRAM_RESOLUTION = 0.01
+# Percentiles in the summary of a trial.
+PERCENTILES = (5, 50, 95)
+SUMMARY_COLUMNS = ["samples", "mean", "sdlp", "min", "max"] + ["p{}".format(p) for p in PERCENTILES]
+
+class RunningStats:
+    """
+    Summary statistics of a stream of samples in constant memory.
+
+    Mean and variance are updated with Welford's algorithm, min and max
+    directly, and percentiles come from a fixed-bin histogram over
+    [low, high), so a trial's lane offsets are summarised without keeping
+    the samples.
+    """
+
+    def __init__(self, low: float = HISTOGRAM_LOW, high: float = HISTOGRAM_HIGH,
+                 resolution: float = HISTOGRAM_RESOLUTION):
+        self.low = low
+        self.resolution = resolution
+        self.bins = [0] * int(math.ceil((high - low) / resolution))
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        index = int((value - self.low) / self.resolution)
+        self.bins[min(max(index, 0), len(self.bins) - 1)] += 1
+
+    @property
+    def variance(self) -> float:
+        """Sample variance, NaN with fewer than two samples."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def percentile(self, percentile: float) -> float:
+        """Centre of the histogram bin that holds the `percentile` percentile, clamped to [min, max]."""
+        if self.count == 0:
+            return math.nan
+        rank = max(1, int(math.ceil(percentile / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.bins):
+            seen += count
+            if seen >= rank:
+                return min(max(self.low + (index + 0.5) * self.resolution, self.min), self.max)
+        return self.max
+
+    def summary(self) -> List[float]:
+        """Values of SUMMARY_COLUMNS; the standard deviation of the lane offset is the SDLP."""
+        if self.count == 0:
+            return [0] + [math.nan] * (len(SUMMARY_COLUMNS) - 1)
+        return [self.count, self.mean, self.std, self.min, self.max] + [self.percentile(p) for p in PERCENTILES]
@@ -0,0 +1,384 @@
+import logging
+import math
+from typing import Callable, List, Optional
+
+import carla
+import utils
+import TTS
+from blueprint_catalogue import BLUEPRINT_CATALOGUE_FILE, BlueprintCatalogue
+from collisions import CollisionMonitor, no_contacts
+from commands import CommandBatch, DestroyActor
+from config import ExperimentConfig, load_config
+from hazard import HazardProximity
+from lane_offset import LaneOffsetSampler, SAMPLING_PERIOD
+from route_plan import RoutePlan
+from running_stats import RunningStats
+from scheduler import EPSILON
+from signals import open_signal_bus
+from telemetry import TELEMETRY_DURATION, TelemetryRecorder, telemetry_path
+from text_corpus import load_text
+from tick_driver import Frame, TickDriver
+from tick_profiler import TickProfiler
+
+# Port of the traffic manager that drives the ego and the traffic vehicles.
+TM_PORT = 8000
+# Fixed simulation step (s) of the synchronous mode.
+FIXED_DELTA_SECONDS = 1.0/80
+# Words per minute the TTS engine rate is set below the configured reading rate.
+TTS_RATE_ADJUSTMENT = 25
+# Distance (m) the ego has to drive past the hazard to close a distance based handover window.
+PASSING_DISTANCE = 20
+# Length (m) of the route walked beyond the hazard, covering the passing distance and the scenario props.
+ROUTE_MARGIN = 100
+# Length (m) of the route walked behind the ego, where traffic is spawned next to it.
+ROUTE_BEHIND = 60
+# Simulation time (s) between giving control back and resuming the reading task.
+RESUME_DELAY = 3
+# Simulation time (s) the run keeps ticking after the NDRT is over.
+END_DELAY = 5
+
+# Phases of every scenario, in the order the engine walks them.
+PHASES = ("setup", "approach", "tor", "handover", "recovery", "ndrt")
+
+class Scenario:
+    """
+    A TOR scenario, described by hooks on the shared phase graph:
+
+        setup -> approach -> tor -> handover -> recovery -> ndrt
+
+    The engine connects to the server, runs the tick loop and the samplers,
+    writes the data and tears everything down; a scenario only spawns its
+    traffic and hazard and reacts to the phases it cares about.
+    """
+
+    # Label of the scenario in the data files
+    name = ""
+    weather = carla.WeatherParameters.MidRainyNoon
+    distance_to_leading_vehicle = 2.0
+    # Speed of the traffic manager vehicles relative to the speed limit (negative is faster)
+    speed_difference = -400.0
+    # Distance (m) along the ego's lane from its start position to the hazard
+    hazard_distance = 1300.0
+    # Distance (m) along the road to the hazard at which the TOR is issued
+    tor_distance = 100.0
+    # Length (s of simulation time) of the handover window, or None to keep it open
+    # until the ego has driven PASSING_DISTANCE meters past the hazard
+    handover_duration: Optional[float] = None
+
+    def setup(self, run: "ScenarioRun") -> None:
+        """
+        Spawn the traffic and the hazard, which is `hazard_distance` meters along
+        `run.route`. Actors the ego can run into at the hazard go in `run.hazards`.
+        """
+        raise NotImplementedError
+
+    def approach_tick(self, run: "ScenarioRun", frame: Frame) -> None:
+        pass
+
+    def on_tor(self, run: "ScenarioRun", frame: Frame) -> None:
+        pass
+
+    def handover_tick(self, run: "ScenarioRun", frame: Frame) -> None:
+        pass
+
+    def recover(self, run: "ScenarioRun") -> None:
+        pass
+
+
+class ScenarioRun:
+    """One execution of a scenario: the connection, the tick loop and the measured data."""
+
+    def __init__(self, scenario: Scenario, CONTENT_FOLDER_PATH: str, configurations: ExperimentConfig,
+                 client=None, tm_port: int = TM_PORT, catalogue: Optional[BlueprintCatalogue] = None):
+        self.scenario = scenario
+        self.configurations = configurations
+        self.CONTENT_FOLDER_PATH = CONTENT_FOLDER_PATH
+        self.DATA_FOLDER_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/DataFiles")
+        self.RSVP_STREAM_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/TTSStreamFile.txt")
+        self.SENTENCE_INDEX_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/SentenceIndexFile.txt")
+        self.RING_STREAM_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/RSVPStream.ring")
+        self.SIGNAL_FILE = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/SignalFile.txt")
+        # Opened for the run, see the SIGNAL_BUS setting
+        self.signal_bus = None
+
+        self.client = client
+        self.tm_port = tm_port
+        # Indexed snapshot of the blueprint library, shared by the runs of a client session
+        self.catalogue = catalogue
+        self.world = None
+        self.traffic_manager = None
+        self.DReyeVR_vehicle = None
+        self.tts = None
+        # Drives the ego from the TOR to the recovery instead of a participant, see agent.py
+        self.agent = None
+        self.collision_monitor = None
+        # Actors destroyed at the end of the run
+        self.vehicles_list = []
+        # The ego's lane from its start position, see route_plan.py
+        self.route = None
+        self.hazard_location = None
+        # Actors of the hazard, e.g. the animals or the barriers, and the ego's proximity to them
+        self.hazards = []
+        self.hazard_proximity = None
+        self.samplers = []
+        # Contact intervals of the ego during the handover window, see collisions.py
+        self.collision_data = no_contacts()
+        # Summary of the signed lane offsets of the handover window; every sample is only
+        # kept in lane_offset_data with RAW_LANE_OFFSETS set in the config
+        self.lane_offset_stats = RunningStats()
+        self.lane_offset_data = []
+        # Frame times of the tick loop per phase, written with the trial data
+        self.profiler = TickProfiler()
+        self.phase = None
+        # Ego pose, velocity and control of every tick, see telemetry.py
+        self.telemetry = None
+
+    def connect(self) -> None:
+        if self.client is None:
+            self.client = carla.Client('127.0.0.1', 2000)
+            self.client.set_timeout(10.0)
+        self.world = self.client.get_world()
+        self.world.set_weather(self.scenario.weather)
+
+        self.traffic_manager = self.client.get_trafficmanager(self.tm_port)
+        self.traffic_manager.set_global_distance_to_leading_vehicle(self.scenario.distance_to_leading_vehicle)
+        self.traffic_manager.set_synchronous_mode(True)
+        settings = self.world.get_settings()
+        if not settings.synchronous_mode:
+            settings.synchronous_mode = True
+            settings.fixed_delta_seconds = FIXED_DELTA_SECONDS
+            self.world.apply_settings(settings)
+
+        # Read the tracked actors from one snapshot per tick instead of querying each actor
+        # and submit the per-tick actor commands in one batch. Every tick of the run goes
+        # through this driver, so the telemetry and the profiler see all of them.
+        self.batch = CommandBatch(self.client)
+        self.driver = TickDriver(self.world, batch=self.batch, profiler=self.profiler)
+        self.driver.tick()
+
+        # Index the lane centrelines once so lane offsets are sampled without map fetches
+        self.lane_sampler = LaneOffsetSampler(self.world)
+        if self.catalogue is None:
+            self.catalogue = BlueprintCatalogue.snapshot(
+                self.client, self.world, "{}/{}".format(self.DATA_FOLDER_PATH, BLUEPRINT_CATALOGUE_FILE))
+        self.blueprints = utils.vehicle_blueprints(self.catalogue)
+
+    # Tick loop
+
+    def tick_until(self, done: Callable[[Frame], bool], hook: Callable[["ScenarioRun", Frame], None]) -> Frame:
+        """Tick until `done(frame)`, calling `hook(run, frame)` after every tick."""
+        frame = self.driver.current()
+        while not done(frame):
+            frame = self.driver.tick()
+            hook(self, frame)
+        return frame
+
+    def add_sampler(self, period: float, callback: Callable[[Frame], None]) -> None:
+        """Call `callback(frame)` every `period` seconds of simulation time during the handover window."""
+        self.samplers.append(self.driver.scheduler.register(period, callback))
+
+    def start_tts(self) -> None:
+        # Start the TTS service now so the engine is initialised by the time the reading task starts
+        volume = 1.0 if self.configurations.tts else 0
+        # The HUD reads the stream files; the ring buffer is written next to them for readers that want every word
+        ring_file = self.RING_STREAM_FILE if self.configurations.rsvp_ring else None
+        self.tts = TTS.TTSService(self.RSVP_STREAM_FILE, self.SENTENCE_INDEX_FILE, self.configurations.wpm,
+                                  TTS_RATE_ADJUSTMENT, volume, ring_file)
+
+    def find_ego(self):
+        return utils.find_ego_vehicle(self.world)
+
+    def start_telemetry(self) -> None:
+        if self.configurations.ignore:
+            return
+        trial_name = "_".join(str(value) for value in self.configurations.first_rows() + [self.scenario.name])
+        delta_seconds = self.world.get_settings().fixed_delta_seconds or FIXED_DELTA_SECONDS
+        self.telemetry = TelemetryRecorder(telemetry_path(self.DATA_FOLDER_PATH, trial_name),
+                                           int(TELEMETRY_DURATION / delta_seconds), PHASES)
+        self.driver.listen(self.record_telemetry)
+
+    def record_telemetry(self, frame: Frame) -> None:
+        transform = frame.transform(self.DReyeVR_vehicle)
+        s, route_offset = self.route.locate(transform.location)
+        hazard_gap, closing_speed, time_to_contact = ((math.nan,) * 3 if self.hazard_proximity is None
+                                                      else self.hazard_proximity.measure(frame))
+        # The control is read from the episode's latest snapshot on the client, it is not a round trip
+        self.telemetry.record(frame.frame, frame.timestamp.elapsed_seconds, transform,
+                              frame.velocity(self.DReyeVR_vehicle), self.DReyeVR_vehicle.get_control(),
+                              self.lane_sampler.index.signed_offset(transform.location),
+                              self.scenario.hazard_distance - s, route_offset, hazard_gap, closing_speed,
+                              time_to_contact, PHASES.index(self.phase))
+
+    def stop_telemetry(self) -> None:
+        if self.telemetry is not None:
+            self.driver.unlisten(self.record_telemetry)
+            self.telemetry.close()
+
+    def drive_agent(self, frame: Frame) -> None:
+        # Sent with the next tick, like the participant's input
+        self.batch.apply_control(self.DReyeVR_vehicle, self.agent.control(self, frame))
+
+    def sample_lane_offset(self, frame: Frame) -> None:
+        offset = self.lane_sampler.signed_sample(frame, self.DReyeVR_vehicle)
+        self.lane_offset_stats.add(offset)
+        if self.configurations.raw_lane_offsets:
+            self.lane_offset_data.append(offset)
+
+    def hazard_ahead(self, frame: Frame) -> float:
+        """Distance (m) along the road from the ego to the hazard, negative once it is passed."""
+        return self.route.distance_remaining(frame.location(self.DReyeVR_vehicle), self.scenario.hazard_distance)
+
+    def handover_over(self, frame: Frame, end_time: Optional[float]) -> bool:
+        if end_time is not None:
+            return frame.timestamp.elapsed_seconds + EPSILON >= end_time
+        return -self.hazard_ahead(frame) > PASSING_DISTANCE
+
+    # Phases
+
+    def setup(self) -> None:
+        self.connect()
+
+        # Increase the speed of the spawned and ego vehicle (in autopilot mode)
+        self.traffic_manager.global_percentage_speed_difference(self.scenario.speed_difference)
+
+        # Enable autonomous mode for the ego-vehicle while doing the reading task.
+        self.DReyeVR_vehicle = self.find_ego()
+        self.traffic_manager.auto_lane_change(self.DReyeVR_vehicle, False)
+        self.DReyeVR_vehicle.set_autopilot(True, self.tm_port)
+        self.driver.track(self.DReyeVR_vehicle)
+        print("Successfully set autopilot on ego vehicle.")
+
+        # Walk the ego's lane once; the hazard and the TOR trigger are placed along it
+        self.route = RoutePlan.from_location(self.lane_sampler.index.carla_map,
+                                             self.driver.current().location(self.DReyeVR_vehicle),
+                                             self.scenario.hazard_distance + ROUTE_MARGIN, behind=ROUTE_BEHIND)
+        self.hazard_location = self.route.location_at(self.scenario.hazard_distance)
+        self.start_telemetry()
+        self.scenario.setup(self)
+        self.driver.track(*self.hazards)
+        self.hazard_proximity = HazardProximity(self.DReyeVR_vehicle, self.hazards)
+
+        # Give a signal to start reading comprehension task
+        self.signal_bus.write(0)
+        print("Starting reading comprehension task.")
+
+        # Once the reading task starts, read the text out with the TTS service
+        self.tts.speak(load_text(self.CONTENT_FOLDER_PATH + "/ConfigFiles/" + self.configurations.textfile + ".txt"))
+
+    def approach(self) -> None:
+        # Drive on autopilot until the vehicle is close to the hazard
+        self.tick_until(lambda frame: self.hazard_ahead(frame) <= self.scenario.tor_distance,
+                        self.scenario.approach_tick)
+
+    def tor(self) -> None:
+        # Pause the TTS, RSVP resumes from the start of the interrupted sentence
+        self.tts.pause()
+        if self.configurations.rsvp:
+            utils.reset_stream_file(self.RSVP_STREAM_FILE)
+
+        # Issue TOR and write to signal file, then disable autopilot for the ego-vehicle
+        self.signal_bus.write(1)
+        self.DReyeVR_vehicle.set_autopilot(False, self.tm_port)
+        frame = self.driver.tick()
+        print("TOR is issued")
+
+        # The driver has the controls from the TOR on, also while the scenario reacts to it
+        if self.agent is not None:
+            self.agent.start(self, frame)
+            self.driver.listen(self.drive_agent)
+        self.scenario.on_tor(self, frame)
+
+    def handover(self) -> None:
+        # Start detecting collisions
+        self.collision_monitor = CollisionMonitor(self.world, self.DReyeVR_vehicle, self.catalogue).start()
+        # Sample the lane offset at a fixed period of simulation time
+        self.add_sampler(SAMPLING_PERIOD, self.sample_lane_offset)
+
+        frame = self.driver.current()
+        end_time = None
+        if self.scenario.handover_duration is not None:
+            end_time = frame.timestamp.elapsed_seconds + self.scenario.handover_duration
+        self.tick_until(lambda frame: self.handover_over(frame, end_time), self.scenario.handover_tick)
+
+        for sampler in self.samplers:
+            self.driver.scheduler.unregister(sampler)
+        self.samplers = []
+        self.collision_monitor.stop()
+        self.collision_data = self.collision_monitor.records()
+
+        # Write the TOR performance data to the CSV files
+        utils.write_performance_data(self.DATA_FOLDER_PATH, self.configurations, self.lane_offset_stats,
+                                     self.lane_offset_data, self.collision_data, self.scenario.name)
+
+    def recovery(self) -> None:
+        self.scenario.recover(self)
+        if self.agent is not None:
+            self.driver.unlisten(self.drive_agent)
+
+        # Turn on autopilot again once TOR is fulfilled and continue with the NDRT
+        self.DReyeVR_vehicle.set_autopilot(True, self.tm_port)
+        self.driver.tick()
+        self.signal_bus.write(2)
+        self.driver.run_for(RESUME_DELAY)
+
+        # Resume the TTS
+        self.tts.resume(from_sentence=self.configurations.rsvp)
+
+    def ndrt(self) -> None:
+        # Wait for the NDRT to complete
+        while self.signal_bus.read() != 3:
+            self.driver.tick()
+        self.driver.run_for(END_DELAY)
+
+    def release_actors(self) -> None:
+        """Destroy the actors spawned by the run and hand the ego back to manual control."""
+        if self.collision_monitor is not None:
+            self.collision_monitor.stop()
+
+        print('\ndestroying %d non-ego actors' % len(self.vehicles_list))
+        self.client.apply_batch([DestroyActor(x) for x in self.vehicles_list])
+        self.vehicles_list = []
+
+        if self.DReyeVR_vehicle is not None:
+            self.DReyeVR_vehicle.set_autopilot(False, self.tm_port)
+            self.DReyeVR_vehicle.enable_constant_velocity(carla.Vector3D(0, 0, 0))
+            self.DReyeVR_vehicle.apply_control(carla.VehicleControl(throttle=0, brake=1, manual_gear_shift=False, gear=0))
+            print("Successfully set manual control on ego vehicle")
+
+    def teardown(self) -> None:
+        if self.tts is not None:
+            self.tts.close()
+        if self.world is None:
+            return
+        self.stop_telemetry()
+
+        settings = self.world.get_settings()
+        settings.synchronous_mode = False
+        settings.no_rendering_mode = False
+        settings.fixed_delta_seconds = None
+        self.world.apply_settings(settings)
+        self.release_actors()
+
+    def run(self) -> "ScenarioRun":
+        self.start_tts()
+        try:
+            self.signal_bus = open_signal_bus(self.configurations.signal_bus, self.SIGNAL_FILE)
+            for phase in PHASES:
+                self.phase = phase
+                self.profiler.set_phase(phase)
+                getattr(self, phase)()
+            utils.write_tick_profile(self.DATA_FOLDER_PATH, self.configurations, self.profiler, self.scenario.name)
+        finally:
+            self.teardown()
+            if self.signal_bus is not None:
+                self.signal_bus.close()
+        return self
+
+
+def run_scenario(scenario: Scenario, CONTENT_FOLDER_PATH: str, config_overrides: Optional[List[str]] = None) -> ScenarioRun:
+    CONFIG_FILE_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/ConfigFiles/config.txt")
+    configurations = load_config(CONFIG_FILE_PATH, config_overrides)
+    print("Extracted settings: " + str(configurations))
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    return ScenarioRun(scenario, CONTENT_FOLDER_PATH, configurations).run()
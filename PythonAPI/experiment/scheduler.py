@@ -0,0 +1,55 @@
+from typing import TYPE_CHECKING, Callable, List
+
+if TYPE_CHECKING:
+    # tick_driver imports this module, so Frame is only imported for the annotations
+    from tick_driver import Frame
+
+# Tolerance (s) when comparing accumulated simulation time against a due time.
+EPSILON = 1e-6
+
+class Sampler:
+    def __init__(self, period: float, callback: Callable[["Frame"], None]):
+        self.period = period
+        self.callback = callback
+        self.next_due = None
+
+
+class SimTimeScheduler:
+    """
+    Fires registered samplers at fixed periods of simulation time.
+
+    The clock is the tick frame's snapshot timestamp (elapsed_seconds), not the
+    wall clock, so in synchronous mode with a fixed delta the number of samples in a
+    window is the same whether the server renders at 20 or 120 FPS.
+    """
+
+    def __init__(self):
+        self.samplers: List[Sampler] = []
+        self.frame = None
+        self.elapsed_seconds = None
+
+    def register(self, period: float, callback: Callable[["Frame"], None]) -> Sampler:
+        """
+        Call `callback(frame)` with the tick_driver.Frame every `period` seconds of
+        simulation time, starting on the next update.
+        """
+        sampler = Sampler(period, callback)
+        self.samplers.append(sampler)
+        return sampler
+
+    def unregister(self, sampler: Sampler) -> None:
+        self.samplers.remove(sampler)
+
+    def update(self, frame: "Frame") -> None:
+        if frame.frame == self.frame:
+            return
+        self.frame = frame.frame
+        self.elapsed_seconds = frame.timestamp.elapsed_seconds
+        for sampler in self.samplers:
+            if sampler.next_due is None:
+                sampler.next_due = self.elapsed_seconds
+            if self.elapsed_seconds + EPSILON >= sampler.next_due:
+                sampler.callback(frame)
+                # Skip missed periods instead of firing a burst to catch up
+                while sampler.next_due <= self.elapsed_seconds + EPSILON:
+                    sampler.next_due += sampler.period
@@ -0,0 +1,123 @@
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+# Number of attempts for a read/write before giving up (the HUD may hold the file).
+RETRIES = 10
+# Maximum age (s) of a cached signal before the file is re-read even if its stat is unchanged,
+# in case two writes land within the file system's timestamp granularity.
+MAX_CACHE_AGE = 0.5
+# Name of the shared memory block used by SharedMemorySignalBus.
+SHARED_MEMORY_NAME = "NDRRI_signal"
+
+class FileSignalBus:
+    """
+    Signal channel over SignalFile.txt, the protocol the Unreal HUD reads.
+
+    Reads are skipped while the file's stat (mtime, size, inode) is unchanged,
+    so polling the signal every tick costs one stat call instead of an
+    open/read/close.
+
+    Signals:
+        0 -> Start text comprehension task.
+        1 -> Start TOR maneouver.
+        2 -> TOR is issued.
+        3 -> Experiment is over.
+        4 -> Append more text to reading task.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.signal: Optional[int] = None
+        self.stat_key = None
+        self.read_at = 0.0
+
+    def stat(self):
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def read(self) -> Optional[int]:
+        stat_key = self.stat()
+        if stat_key is not None and stat_key == self.stat_key and time.monotonic() - self.read_at < MAX_CACHE_AGE:
+            return self.signal
+        for i in range(0, RETRIES):
+            try:
+                with open(self.file_path, "r", encoding="utf8") as f:
+                    self.signal = int(f.read())
+                self.stat_key = stat_key
+                self.read_at = time.monotonic()
+                return self.signal
+            except (OSError, ValueError):
+                # The file may be held or half written by the HUD, try again
+                pass
+        print("Error occured while opening/reading the signal file")
+        return None
+
+    def write(self, signal: int) -> bool:
+        for i in range(0, RETRIES):
+            try:
+                with open(self.file_path, "w", encoding="utf8") as f:
+                    f.write(str(signal))
+                self.signal = signal
+                self.stat_key = self.stat()
+                self.read_at = time.monotonic()
+                return True
+            except OSError:
+                pass
+        print("Error occured while opening/writing to the signal file")
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+class SharedMemorySignalBus:
+    """
+    Signal channel over a named shared memory block holding (signal, sequence).
+
+    Reading or writing a signal is a memory access with no file system round
+    trip. The sequence number is incremented on every write, so readers can tell
+    a repeated signal from a stale one. Both sides must open the same `name`;
+    exactly one of them creates it.
+    """
+
+    LAYOUT = struct.Struct("<iI")
+
+    def __init__(self, name: str = SHARED_MEMORY_NAME, create: bool = False):
+        self.created = create
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=create, size=self.LAYOUT.size)
+        except FileExistsError:
+            # Left behind by a run that did not close it; it is taken over and reset
+            self.memory = shared_memory.SharedMemory(name=name)
+        if create:
+            self.LAYOUT.pack_into(self.memory.buf, 0, -1, 0)
+
+    @property
+    def sequence(self) -> int:
+        return self.LAYOUT.unpack_from(self.memory.buf, 0)[1]
+
+    def read(self) -> Optional[int]:
+        signal, sequence = self.LAYOUT.unpack_from(self.memory.buf, 0)
+        return None if sequence == 0 else signal
+
+    def write(self, signal: int) -> bool:
+        self.LAYOUT.pack_into(self.memory.buf, 0, signal, self.sequence + 1)
+        return True
+
+    def close(self) -> None:
+        self.memory.close()
+        if self.created:
+            self.memory.unlink()
+
+
+def open_signal_bus(kind: str, file_path: str):
+    """Signal bus of the SIGNAL_BUS setting; the experiment creates the shared memory block, readers open it."""
+    if kind == "shm":
+        return SharedMemorySignalBus(create=True)
+    return FileSignalBus(file_path)
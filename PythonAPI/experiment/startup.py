@@ -31,23 +31,28 @@ CONTENT_FOLDER_PATH = "D:/carla/Build/UE4Carla/bc7167d-dirty/WindowsNoEditor/Car
 # CONTENT_FOLDER_PATH = "D:/carla/Unreal/CarlaUE4/Content"
 #######################################################################################
 
-def main(arg):
+def main(arg, config_overrides=None):
     if arg == 1:
-        ExtremeWeather.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH)
+        ExtremeWeather.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH, config_overrides=config_overrides)
     elif arg == 2:
-        LVAD.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH)
+        LVAD.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH, config_overrides=config_overrides)
     elif arg == 3:
-        CSA.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH)
+        CSA.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH, config_overrides=config_overrides)
     else:
-        ACR.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH)
+        ACR.run(CONTENT_FOLDER_PATH=CONTENT_FOLDER_PATH, config_overrides=config_overrides)
 
 if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        'scenario', nargs='?', type=int, default=4,
+        help='1: ExtremeWeather, 2: LVAD, 3: CSA, 4: ACR (default: 4)')
+    argparser.add_argument(
+        '--set', metavar='KEY=VALUE', action='append', default=[], dest='config_overrides',
+        help='override a setting of config.txt for this run, e.g. --set TRIAL_NO=10 (repeatable)')
+    args = argparser.parse_args()
 
     try:
-        if len(sys.argv) == 1:
-            main(4) # Run extreme weather scenario by default
-        else:
-            main(int(sys.argv[1]))
+        main(args.scenario, args.config_overrides)
     except KeyboardInterrupt:
         print("Execution terminated!")
         pass
@@ -0,0 +1,115 @@
+import logging
+import os
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Sub-folder of the data folder with one telemetry log per trial.
+TELEMETRY_FOLDER = "Telemetry"
+# Simulation time (s) a log has room for when it is created; 30 minutes at 80 Hz is about 20 MB.
+TELEMETRY_DURATION = 30 * 60
+# Identifies the file format; bump the version when TELEMETRY_DTYPE changes.
+TELEMETRY_MAGIC = b"EGOTLM03"
+# Fixed-width record of one tick: the ego's pose and velocity, the control applied to it, its
+# lane offset (m, positive to the right), the distance (m) along the road to the hazard and its
+# offset (m) from the route the hazard is on, the gap (m) between the bounding boxes of the ego
+# and the closest hazard actor, the speed (m/s) at which it closes and the time (s) to contact
+# with a hazard actor on the current course (inf if there is none; all three are NaN without
+# hazard actors, see hazard.py), and the index of the scenario phase in the phase names of the header.
+TELEMETRY_DTYPE = np.dtype([
+    ("frame", np.int64),
+    ("elapsed_seconds", np.float64),
+    ("x", np.float64), ("y", np.float64), ("z", np.float64),
+    ("pitch", np.float32), ("yaw", np.float32), ("roll", np.float32),
+    ("vx", np.float32), ("vy", np.float32), ("vz", np.float32),
+    ("steer", np.float32), ("throttle", np.float32), ("brake", np.float32),
+    ("lane_offset", np.float32),
+    ("hazard_distance", np.float32),
+    ("route_offset", np.float32),
+    ("hazard_gap", np.float32),
+    ("closing_speed", np.float32),
+    ("time_to_contact", np.float32),
+    ("phase", np.int8),
+])
+# File header: magic, number of records written, number of records the file has room for
+# and the comma separated names of the phases.
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("count", "<u8"), ("capacity", "<u8"), ("phases", "S104")])
+HEADER_SIZE = 128
+
+class TelemetryRecorder:
+    """
+    Per-tick ego telemetry, appended to a preallocated memory-mapped file.
+
+    The file is sized for `capacity` records up front, so recording a tick is
+    a copy into mapped memory: no allocation of arrays and no write calls.
+    The record count in the header is updated with every record, so a log
+    cut short by a crash is still readable up to its last tick. Frames are
+    expected to be recorded without gaps; a tick that bypassed the recorder
+    is counted and reported on close(), which also truncates the file to the
+    records written.
+    """
+
+    def __init__(self, path: str, capacity: int, phases: Sequence[str]):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.mmap = np.memmap(path, dtype=np.uint8, mode="w+", shape=(HEADER_SIZE + capacity * TELEMETRY_DTYPE.itemsize,))
+        self.header = self.mmap[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        self.records = self.mmap[HEADER_SIZE:].view(TELEMETRY_DTYPE)
+        self.header[0] = (TELEMETRY_MAGIC, 0, capacity, ",".join(phases).encode())
+        self.count = 0
+        self.dropped = 0
+        self.gaps = 0
+        self.last_frame = None
+
+    def record(self, frame, elapsed_seconds, transform, velocity, control, lane_offset, hazard_distance,
+               route_offset, hazard_gap, closing_speed, time_to_contact, phase) -> None:
+        if self.last_frame is not None and frame != self.last_frame + 1:
+            self.gaps += 1
+        self.last_frame = frame
+        if self.count == len(self.records):
+            self.dropped += 1
+            return
+        location = transform.location
+        rotation = transform.rotation
+        self.records[self.count] = (frame, elapsed_seconds, location.x, location.y, location.z,
+                                    rotation.pitch, rotation.yaw, rotation.roll, velocity.x, velocity.y, velocity.z,
+                                    control.steer, control.throttle, control.brake, lane_offset, hazard_distance,
+                                    route_offset, hazard_gap, closing_speed, time_to_contact, phase)
+        self.count += 1
+        self.header["count"] = self.count
+
+    def close(self) -> None:
+        if self.mmap is None:
+            return
+        if self.dropped:
+            logging.warning("Telemetry log %s is full, %d ticks were not recorded", self.path, self.dropped)
+        if self.gaps:
+            logging.warning("Telemetry log %s skips frames in %d places", self.path, self.gaps)
+        self.mmap.flush()
+        self.mmap = self.header = self.records = None
+        # Give back the space that was reserved but not used
+        with open(self.path, "r+b") as file:
+            file.seek(8)
+            file.write(np.array([self.count, self.count], dtype="<u8").tobytes())
+            file.truncate(HEADER_SIZE + self.count * TELEMETRY_DTYPE.itemsize)
+
+
+def telemetry_path(DATA_FOLDER_PATH: str, trial_name: str) -> str:
+    return os.path.join(DATA_FOLDER_PATH, TELEMETRY_FOLDER, trial_name + ".tlm")
+
+def read_header(path: str) -> np.void:
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header[0]["magic"] != TELEMETRY_MAGIC:
+        raise ValueError("{} is not a telemetry log".format(path))
+    return header[0]
+
+def read_telemetry(path: str) -> np.ndarray:
+    """The records of a telemetry log as a read-only structured array mapped from the file."""
+    count = int(read_header(path)["count"])
+    if count == 0:
+        return np.zeros(0, dtype=TELEMETRY_DTYPE)
+    return np.memmap(path, dtype=TELEMETRY_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+def read_phases(path: str) -> Tuple[str, ...]:
+    """Names of the phases the `phase` field of the records indexes."""
+    return tuple(read_header(path)["phases"].decode().split(","))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import os
+import re
+import zipfile
+from typing import List
+
+import numpy as np
+
+# Characters that end a sentence when they end a word.
+SENTENCE_END = (".", "!", "?")
+WORD_PATTERN = re.compile(r"\S+")
+
+class PreparedText:
+    """
+    A reading text with its word and sentence offset tables.
+
+    word_starts/word_ends hold the character span of every word, word_sentence
+    the sentence each word belongs to, sentence_starts the character offset of
+    every sentence, and word_by_char the word under (or right after) every
+    character. Looking up the word for an engine offset, the sentence of a word
+    or the resume offset of a sentence is a single array access.
+    """
+
+    def __init__(self, text: str, word_starts, word_ends, word_sentence, sentence_starts, word_by_char):
+        self.text = text
+        self.word_starts = word_starts
+        self.word_ends = word_ends
+        self.word_sentence = word_sentence
+        self.sentence_starts = sentence_starts
+        self.word_by_char = word_by_char
+        self.words: List[str] = [text[start:end] for start, end in zip(word_starts.tolist(), word_ends.tolist())]
+
+    @classmethod
+    def from_text(cls, text: str) -> "PreparedText":
+        spans = [match.span() for match in WORD_PATTERN.finditer(text)]
+        word_starts = np.array([start for start, _ in spans], dtype=np.int32)
+        word_ends = np.array([end for _, end in spans], dtype=np.int32)
+
+        word_sentence = np.zeros(len(spans), dtype=np.int32)
+        sentence_starts = [word_starts[0] if len(spans) else 0]
+        sentence = 0
+        for i, (start, end) in enumerate(spans):
+            word_sentence[i] = sentence
+            if text[start:end].endswith(SENTENCE_END) and i + 1 < len(spans):
+                sentence += 1
+                sentence_starts.append(spans[i + 1][0])
+
+        # Characters between words map to the next word, trailing whitespace past the last one
+        word_by_char = np.full(len(text) + 1, len(spans), dtype=np.int32)
+        previous_end = 0
+        for i, (start, end) in enumerate(spans):
+            word_by_char[previous_end:end] = i
+            previous_end = end
+        return cls(text, word_starts, word_ends, word_sentence, np.array(sentence_starts, dtype=np.int32),
+                   word_by_char)
+
+    @property
+    def word_count(self) -> int:
+        return len(self.words)
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_starts)
+
+    def word_at(self, offset: int) -> int:
+        return int(self.word_by_char[min(max(offset, 0), len(self.text))])
+
+    def ends_sentence(self, word: int) -> bool:
+        return word + 1 < self.word_count and self.word_sentence[word + 1] != self.word_sentence[word]
+
+    def sentence_start(self, sentence: int) -> int:
+        if sentence >= self.sentence_count:
+            return len(self.text)
+        return int(self.sentence_starts[sentence])
+
+    def estimated_duration(self, WPM: int) -> float:
+        """Seconds needed to read the text at `WPM` words per minute."""
+        return self.word_count * 60.0 / WPM
+
+
+def cache_path(text_path: str) -> str:
+    return os.path.splitext(text_path)[0] + ".tokens.npz"
+
+def load_text(text_path: str) -> PreparedText:
+    """
+    Load a text file with its offset tables, reusing the tables cached next to it
+    (<name>.tokens.npz) while the hash of the text file is unchanged.
+    """
+    with open(text_path, "r", encoding="utf8") as file:
+        text = file.read()
+    digest = hashlib.sha1(text.encode("utf8")).hexdigest()
+    try:
+        with np.load(cache_path(text_path)) as cache:
+            if str(cache["hash"]) == digest:
+                return PreparedText(text, cache["word_starts"], cache["word_ends"], cache["word_sentence"],
+                                    cache["sentence_starts"], cache["word_by_char"])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
+
+    prepared = PreparedText.from_text(text)
+    # Runs in parallel load the same texts, so the cache is written aside and renamed into place
+    temporary_path = "{}.{}.tmp".format(cache_path(text_path), os.getpid())
+    try:
+        with open(temporary_path, "wb") as file:
+            np.savez(file, hash=np.array(digest), word_starts=prepared.word_starts,
+                     word_ends=prepared.word_ends, word_sentence=prepared.word_sentence,
+                     sentence_starts=prepared.sentence_starts, word_by_char=prepared.word_by_char)
+        os.replace(temporary_path, cache_path(text_path))
+    except OSError as e:
+        print("Unable to cache the text offsets:", str(e))
+    return prepared
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Prepare reading texts and print their statistics")
+    argparser.add_argument("files", nargs="+", help="text files, e.g. ConfigFiles/Text*.txt")
+    argparser.add_argument("--wpm", type=int, default=180, help="reading rate for the duration estimate")
+    args = argparser.parse_args()
+    for path in args.files:
+        prepared = load_text(path)
+        print("{}: {} words, {} sentences, {:.1f} s at {} WPM".format(
+            os.path.basename(path), prepared.word_count, prepared.sentence_count,
+            prepared.estimated_duration(args.wpm), args.wpm))
@@ -0,0 +1,104 @@
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from scheduler import EPSILON, SimTimeScheduler
+
+class ActorState(NamedTuple):
+    transform: Any
+    velocity: Any
+
+
+class Frame(NamedTuple):
+    """Immutable view of one simulation frame: the snapshot clock plus the state of every tracked actor."""
+    frame: int
+    timestamp: Any
+    actors: Dict[int, ActorState]
+
+    def state(self, actor) -> Optional[ActorState]:
+        return self.actors.get(getattr(actor, "id", actor))
+
+    def transform(self, actor):
+        return self.actors[getattr(actor, "id", actor)].transform
+
+    def location(self, actor):
+        return self.actors[getattr(actor, "id", actor)].transform.location
+
+    def velocity(self, actor):
+        return self.actors[getattr(actor, "id", actor)].velocity
+
+
+class TickDriver:
+    """
+    Single tick dispatch for the scenario loops.
+
+    Every call to tick() advances the world once and reads the transform and
+    velocity of all tracked actors from the resulting WorldSnapshot, so a frame
+    costs one round trip however many actors the scenario looks at. Commands
+    queued on the driver's batch are submitted together right before the tick.
+    Listeners are called with every frame, after the samplers that are due.
+    With a TickProfiler the duration of every tick is recorded, see
+    tick_profiler.py.
+    """
+
+    def __init__(self, world, scheduler: Optional[SimTimeScheduler] = None, batch=None, profiler=None):
+        self.world = world
+        self.scheduler = scheduler if scheduler is not None else SimTimeScheduler()
+        self.batch = batch
+        self.profiler = profiler
+        self.tracked = set()
+        self.listeners: List[Callable[[Frame], None]] = []
+        self.frame: Optional[Frame] = None
+
+    def track(self, *actors) -> None:
+        for actor in actors:
+            self.tracked.add(getattr(actor, "id", actor))
+
+    def untrack(self, *actors) -> None:
+        for actor in actors:
+            self.tracked.discard(getattr(actor, "id", actor))
+
+    def listen(self, callback: Callable[[Frame], None]) -> None:
+        """Call `callback(frame)` after every tick, e.g. to log each frame."""
+        self.listeners.append(callback)
+
+    def unlisten(self, callback: Callable[[Frame], None]) -> None:
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def read(self, snapshot) -> Frame:
+        actors = {}
+        for actor_id in self.tracked:
+            actor_snapshot = snapshot.find(actor_id)
+            if actor_snapshot is not None:  # destroyed actors drop out of the frame
+                actors[actor_id] = ActorState(actor_snapshot.get_transform(), actor_snapshot.get_velocity())
+        return Frame(snapshot.frame, snapshot.timestamp, actors)
+
+    def current(self) -> Frame:
+        """Frame for the current snapshot, without advancing the simulation."""
+        self.frame = self.read(self.world.get_snapshot())
+        return self.frame
+
+    def tick(self) -> Frame:
+        """Advance the simulation by one frame and run the samplers that are due."""
+        started = time.perf_counter()
+        if self.batch is not None:
+            self.batch.flush()
+        self.world.tick()
+        snapshot = self.world.get_snapshot()
+        ticked = time.perf_counter()
+        self.frame = self.read(snapshot)
+        read = time.perf_counter()
+        self.scheduler.update(self.frame)
+        for listener in self.listeners:
+            listener(self.frame)
+        if self.profiler is not None:
+            self.profiler.record(self.frame.frame, started, ticked, read, time.perf_counter())
+        return self.frame
+
+    def run_for(self, duration: float) -> Frame:
+        """Tick the world for `duration` seconds of simulation time."""
+        frame = self.current()
+        target_time = frame.timestamp.elapsed_seconds + duration
+        while frame.timestamp.elapsed_seconds + EPSILON < target_time:
+            frame = self.tick()
+        return frame
@@ -0,0 +1,152 @@
+import heapq
+from typing import Dict, List, NamedTuple, Optional
+
+# Linear sub-buckets per power of two; 4 bits keeps the relative bucket error under 1/16.
+SUB_BUCKET_BITS = 4
+# Longest duration (s) a histogram resolves; longer ticks are counted in the last bucket.
+MAX_DURATION = 60.0
+# Number of slowest ticks kept per phase.
+OUTLIER_COUNT = 10
+# Percentiles reported per phase and component.
+PERCENTILES = (50, 95, 99)
+# Parts of a tick: our Python between ticks, waiting on the server, and the samplers.
+COMPONENTS = ("client", "rpc", "sampler", "total")
+
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+def bucket_index(microseconds: int) -> int:
+    if microseconds < SUB_BUCKETS:
+        return microseconds
+    shift = microseconds.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) | ((microseconds >> shift) & (SUB_BUCKETS - 1))
+
+def bucket_upper(index: int) -> int:
+    """Largest duration (us) that falls in bucket `index`."""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = (index & (SUB_BUCKETS - 1)) | SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear (HDR style) histogram of durations in microseconds.
+
+    Every power of two is split into SUB_BUCKETS linear buckets, so recording
+    is a couple of integer operations and the memory does not grow with the
+    number of ticks, while percentiles keep a bounded relative error.
+    """
+
+    def __init__(self, max_duration: float = MAX_DURATION):
+        self.max_microseconds = int(max_duration * 1e6)
+        self.counts = [0] * (bucket_index(self.max_microseconds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        microseconds = min(max(int(seconds * 1e6), 0), self.max_microseconds)
+        self.counts[bucket_index(microseconds)] += 1
+        self.count += 1
+        self.total += microseconds
+        if microseconds > self.max:
+            self.max = microseconds
+
+    def percentile(self, percentile: float) -> float:
+        """Upper bound (s) of the duration below which `percentile` percent of the records fall."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(round(percentile / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper(index), self.max) / 1e6
+        return self.max / 1e6
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+
+class TickTiming(NamedTuple):
+    total: float
+    frame: int
+    client: float
+    rpc: float
+    sampler: float
+
+
+class TickProfiler:
+    """
+    Per-phase timing of the tick loop.
+
+    The TickDriver reports the timestamps of every tick; the profiler splits
+    them into client work (our Python since the previous tick, plus reading the
+    snapshot), RPC wait (batch flush, world.tick() and get_snapshot()) and
+    sampler time, records each in the histogram of the current phase and keeps
+    the OUTLIER_COUNT slowest ticks of the phase.
+    """
+
+    def __init__(self):
+        self.phase = None
+        self.histograms: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self.outliers: Dict[str, List[TickTiming]] = {}
+        self.last_end: Optional[float] = None
+
+    def set_phase(self, phase: str) -> None:
+        self.phase = phase
+        # Work between phases (e.g. waiting for the TTS) is not part of a tick
+        self.last_end = None
+
+    def record(self, frame: int, started: float, ticked: float, read: float, ended: float) -> None:
+        client = read - ticked
+        if self.last_end is not None:
+            client += started - self.last_end
+        self.last_end = ended
+        rpc = ticked - started
+        sampler = ended - read
+        timing = TickTiming(client + rpc + sampler, frame, client, rpc, sampler)
+
+        histograms = self.histograms.get(self.phase)
+        if histograms is None:
+            histograms = self.histograms[self.phase] = {component: LatencyHistogram() for component in COMPONENTS}
+            self.outliers[self.phase] = []
+        histograms["client"].record(client)
+        histograms["rpc"].record(rpc)
+        histograms["sampler"].record(sampler)
+        histograms["total"].record(timing.total)
+
+        outliers = self.outliers[self.phase]
+        if len(outliers) < OUTLIER_COUNT:
+            heapq.heappush(outliers, timing)
+        elif timing.total > outliers[0].total:
+            heapq.heapreplace(outliers, timing)
+
+    def summary_rows(self) -> List[list]:
+        """[phase, component, ticks, mean, p50, p95, p99, max] per phase and component, in ms."""
+        rows = []
+        for phase, histograms in self.histograms.items():
+            for component in COMPONENTS:
+                histogram = histograms[component]
+                rows.append([phase, component, histogram.count, round(histogram.mean * 1e3, 3)]
+                            + [round(histogram.percentile(p) * 1e3, 3) for p in PERCENTILES]
+                            + [round(histogram.max / 1e3, 3)])
+        return rows
+
+    def outlier_rows(self) -> List[list]:
+        """[phase, frame, total, client, rpc, sampler] of the slowest ticks, in ms, slowest first."""
+        rows = []
+        for phase, outliers in self.outliers.items():
+            for timing in sorted(outliers, reverse=True):
+                rows.append([phase, timing.frame] + [round(value * 1e3, 3) for value in
+                                                     (timing.total, timing.client, timing.rpc, timing.sampler)])
+        return rows
+
+    def report(self) -> str:
+        lines = ["{:<10} {:<8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "phase", "part", "ticks", "mean ms", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+        for row in self.summary_rows():
+            lines.append("{:<10} {:<8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(*row))
+        return "\n".join(lines)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+from data_sink import format_csv_row
+from telemetry import TELEMETRY_FOLDER, read_phases, read_telemetry
+
+# Steering input (normalised to [-1, 1]) away from its value at the TOR that counts as a steering reaction.
+STEER_THRESHOLD = 0.03
+# Brake pedal input that counts as a braking reaction.
+BRAKE_THRESHOLD = 0.1
+# Smallest steering or pedal input that shows the driver has taken the controls.
+HANDS_ON_THRESHOLD = 0.005
+# Summary of every trial of a study, in the study folder.
+TOR_METRICS_FILE = "TORMetrics.csv"
+METRIC_COLUMNS = ["tor_time", "time_to_first_steer", "time_to_first_brake", "time_to_hands_on", "sdlp",
+                  "max_lateral_acceleration", "min_ttc"]
+TRIAL_COLUMNS = ["participant_id", "rsvp", "tts", "trial_no", "scenario"]
+
+def onsets(active: np.ndarray) -> np.ndarray:
+    """Where `active` switches on; an input already active at the first record (e.g. left by the autopilot) is not an onset."""
+    return active & ~np.concatenate((active[:1], active[:-1]))
+
+def first_time(times: np.ndarray, mask: np.ndarray, start: float) -> float:
+    """Time (s) from `start` to the first record where `mask` is set, or NaN."""
+    hits = np.flatnonzero(mask)
+    return float(times[hits[0]] - start) if len(hits) else math.nan
+
+def lateral_acceleration(records: np.ndarray) -> np.ndarray:
+    """Acceleration (m/s^2) of the ego along its right vector, for every record."""
+    times = records["elapsed_seconds"]
+    if len(times) < 2:
+        return np.zeros(len(times))
+    ax = np.gradient(records["vx"].astype(np.float64), times)
+    ay = np.gradient(records["vy"].astype(np.float64), times)
+    yaw = np.radians(records["yaw"].astype(np.float64))
+    # Right vector of the UE4 (left-handed) frame is (-forward.y, forward.x)
+    return -ax * np.sin(yaw) + ay * np.cos(yaw)
+
+def tor_metrics(records: np.ndarray, phases) -> Dict[str, float]:
+    """
+    TOR metrics of one trial from its telemetry records.
+
+    Reactions are looked for from the TOR to the end of the handover window,
+    while the driver (not the autopilot) controls the ego: time to the first
+    steering input of STEER_THRESHOLD, the first brake input of
+    BRAKE_THRESHOLD, and the first input of any kind ("hands on", as the
+    telemetry has no grip sensor). SDLP, the largest lateral acceleration and
+    the smallest time to collision are taken over the same window. The time to
+    collision is the time until the bounding boxes of the ego and a hazard
+    actor would touch at their current velocities, on the ticks they close on
+    each other on a collision course; it is NaN for scenarios without a hazard
+    actor (EW). Metrics that can't be computed are NaN.
+    """
+    metrics = dict.fromkeys(METRIC_COLUMNS, math.nan)
+    window = np.isin(records["phase"], [phases.index("tor"), phases.index("handover")])
+    if not window.any():
+        return metrics
+    records = records[window]
+    times = records["elapsed_seconds"]
+    tor_time = float(times[0])
+    metrics["tor_time"] = tor_time
+
+    steer = records["steer"]
+    throttle = records["throttle"]
+    brake = records["brake"]
+    metrics["time_to_first_steer"] = first_time(times, np.abs(steer - steer[0]) > STEER_THRESHOLD, tor_time)
+    metrics["time_to_first_brake"] = first_time(times, onsets(brake > BRAKE_THRESHOLD), tor_time)
+    metrics["time_to_hands_on"] = first_time(
+        times, (np.abs(steer - steer[0]) > HANDS_ON_THRESHOLD) | onsets(throttle > HANDS_ON_THRESHOLD)
+        | onsets(brake > HANDS_ON_THRESHOLD), tor_time)
+
+    if len(records) > 1:
+        metrics["sdlp"] = float(np.std(records["lane_offset"].astype(np.float64), ddof=1))
+    metrics["max_lateral_acceleration"] = float(np.abs(lateral_acceleration(records)).max())
+
+    # Only ticks on a collision course with a hazard actor have a finite time to contact
+    time_to_contact = records["time_to_contact"].astype(np.float64)
+    closing = np.isfinite(time_to_contact)
+    if closing.any():
+        metrics["min_ttc"] = float(time_to_contact[closing].min())
+    return metrics
+
+def trial_keys(path: str) -> List[str]:
+    """Participant, RSVP, TTS, trial number and scenario from the name of a telemetry log."""
+    keys = os.path.splitext(os.path.basename(path))[0].rsplit("_", 4)
+    return keys if len(keys) == 5 else [keys[0]] + [""] * 4
+
+def analyse_log(path: str) -> list:
+    records = read_telemetry(path)
+    metrics = tor_metrics(records, read_phases(path))
+    return trial_keys(path) + ["" if math.isnan(metrics[column]) else round(metrics[column], 4)
+                               for column in METRIC_COLUMNS]
+
+def find_logs(study_folder: str) -> List[str]:
+    """Telemetry logs of every data folder under `study_folder`."""
+    return sorted(glob.glob(os.path.join(study_folder, "**", TELEMETRY_FOLDER, "*.tlm"), recursive=True))
+
+def analyse_study(study_folder: str, workers: int = None) -> List[list]:
+    """TOR metrics of every trial of a study, one log per worker task; written to TORMetrics.csv."""
+    logs = find_logs(study_folder)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, future in [(path, pool.submit(analyse_log, path)) for path in logs]:
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                logging.error("Could not analyse %s: %s", path, e)
+
+    with open(os.path.join(study_folder, TOR_METRICS_FILE), "w", encoding="utf8") as file:
+        file.write(", ".join(TRIAL_COLUMNS + METRIC_COLUMNS))
+        file.write("".join(format_csv_row(row) for row in rows))
+    return rows
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description="Compute the TOR metrics of every telemetry log of a study")
+    argparser.add_argument('study', help='folder searched for DataFiles/Telemetry logs')
+    argparser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    args = argparser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    started = time.perf_counter()
+    rows = analyse_study(args.study, args.workers)
+    print("{} trials analysed in {:.1f} s, written to {}".format(
+        len(rows), time.perf_counter() - started, os.path.join(args.study, TOR_METRICS_FILE)))
@@ -0,0 +1,138 @@
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+import carla
+from commands import FutureActor, SetAutopilot, SpawnActor
+
+from numpy import random
+
+# Lanes a slot can be taken in, relative to the ego's lane.
+SIDES = ("left", "ego", "right")
+# Minimum distance (m) along the lane between two placed vehicles, so their bounding boxes never overlap.
+MIN_SPACING = 7.0
+# Height (m) above the lane at which vehicles are spawned, so they drop onto the road.
+SPAWN_HEIGHT = 1.0
+# Gap (m) between two vehicles of a row, drawn uniformly from [GAP_MIN, GAP_MAX).
+GAP_MIN = 15
+GAP_MAX = 30
+
+class Placement(NamedTuple):
+    blueprint: carla.ActorBlueprint
+    side: str
+    s: float
+    transform: carla.Transform
+    autopilot: bool
+
+
+class TrafficPlacement:
+    """
+    Spawn placement of the scenario traffic along the route.
+
+    The lanes next to the route are indexed once: every route waypoint gives
+    one slot per side (when that lane exists), so a vehicle `s` meters along
+    the route is placed without projecting anything on the map again. Slots
+    closer than MIN_SPACING to a vehicle already placed in the same lane are
+    skipped, and spawn() submits all vehicles with their autopilot in one
+    apply_batch_sync instead of spawning and ticking one vehicle at a time.
+    """
+
+    def __init__(self, route, min_spacing: float = MIN_SPACING):
+        self.route = route
+        self.min_spacing = min_spacing
+        self.slots: Dict[str, List[Optional[carla.Transform]]] = {side: [] for side in SIDES}
+        for waypoint in route.waypoints:
+            lanes = {"left": waypoint.get_left_lane(), "ego": waypoint, "right": waypoint.get_right_lane()}
+            for side, lane in lanes.items():
+                if lane is not None and lane.lane_type == carla.LaneType.Driving:
+                    self.slots[side].append(lane.transform)
+                else:
+                    self.slots[side].append(None)
+        self.placements: List[Placement] = []
+
+    def free(self, side: str, s: float) -> bool:
+        return all(abs(placement.s - s) >= self.min_spacing
+                   for placement in self.placements if placement.side == side)
+
+    def place(self, blueprint, side: str, s: float, autopilot: bool = True) -> Optional[Placement]:
+        """Reserve the first free slot at or after `s` meters along the route, within one vehicle spacing."""
+        first = self.route.index_at(s)
+        for index in range(first, min(first + int(self.min_spacing / self.route.resolution) + 1, len(self.slots[side]))):
+            slot_s = float(self.route.s[index])
+            transform = self.slots[side][index]
+            if transform is not None and self.free(side, slot_s):
+                transform = carla.Transform(carla.Location(transform.location.x, transform.location.y,
+                                                           transform.location.z + SPAWN_HEIGHT), transform.rotation)
+                placement = Placement(blueprint, side, slot_s, transform, autopilot)
+                self.placements.append(placement)
+                return placement
+        logging.warning("No free %s lane slot near %.0f m along the route", side, s)
+        return None
+
+    def place_rows(self, blueprints, count: int, first: float) -> Dict[str, List[Placement]]:
+        """
+        `count` vehicles in each adjacent lane, starting at `first` meters along
+        the route with gaps drawn from [GAP_MIN, GAP_MAX), rear vehicle first.
+        """
+        offsets = {"left": first, "right": first}
+        rows = {"left": [], "right": []}
+        for i in range(count):
+            for side in rows:
+                offsets[side] += random.randint(GAP_MIN, GAP_MAX)
+            choices = {side: random.choice(blueprints) for side in rows}
+            for side in rows:
+                placement = self.place(choices[side], side, offsets[side])
+                if placement is not None:
+                    rows[side].append(placement)
+        return rows
+
+    def spawn(self, run) -> List[Optional[carla.Actor]]:
+        """
+        Spawn every placed vehicle in one batch and hand the ones on autopilot
+        to the run's traffic manager; returns the actor of each placement, in
+        the order they were placed (None where the spawn failed).
+        """
+        batch = []
+        for placement in self.placements:
+            command = SpawnActor(placement.blueprint, placement.transform)
+            if placement.autopilot:
+                command = command.then(SetAutopilot(FutureActor, True, run.tm_port))
+            batch.append(command)
+
+        actor_ids = []
+        for response in run.client.apply_batch_sync(batch, False):
+            if response.error:
+                logging.error(response.error)
+                actor_ids.append(None)
+            else:
+                actor_ids.append(response.actor_id)
+        actors = {actor.id: actor for actor in run.world.get_actors([i for i in actor_ids if i is not None])}
+
+        spawned = []
+        for placement, actor_id in zip(self.placements, actor_ids):
+            actor = actors.get(actor_id)
+            spawned.append(actor)
+            if actor is None:
+                continue
+            run.vehicles_list.append(actor)
+            if placement.autopilot:
+                # Lane changes are a traffic manager setting, there is no batch command for them
+                run.traffic_manager.auto_lane_change(actor, False)
+        self.placements = []
+        return spawned
+
+    def spawn_rows(self, run, rows: Dict[str, List[Placement]]) -> Dict[str, List[carla.Actor]]:
+        """Spawn everything placed and return the vehicles of `rows` per side, frontmost first."""
+        placements = list(self.placements)
+        actors = dict(zip((id(placement) for placement in placements), self.spawn(run)))
+        return {side: [actors[id(placement)] for placement in reversed(row) if actors[id(placement)] is not None]
+                for side, row in rows.items()}
+
+
+def spawn_adjacent_vehicles(run, count: int, first: float) -> Dict[str, List[carla.Actor]]:
+    """
+    `count` vehicles on autopilot in each lane next to the ego's, the first one
+    a gap after `first` meters along the route; returns the actors per side,
+    frontmost first.
+    """
+    placement = TrafficPlacement(run.route)
+    return placement.spawn_rows(run, placement.place_rows(run.blueprints, count, first))
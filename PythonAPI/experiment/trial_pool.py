@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+
+try:
+    sys.path.append(glob.glob('..\\carla\\dist\\carla-0.9.13-py*%d.%d-%s.egg' % (
+        sys.version_info.major,
+        sys.version_info.minor,
+        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+import carla
+
+import argparse
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, NamedTuple, Optional, Tuple
+
+from batch_runner import (BatchRunner, Trial, add_batch_arguments, failed_result, print_progress,
+                          trials_from_arguments, write_result)
+from blueprint_catalogue import BLUEPRINT_CATALOGUE_FILE, BlueprintCatalogue
+from config import load_config
+
+# RPC port of the first server and distance between the ports of two servers; a CARLA server
+# also listens on the two ports after its RPC port (streaming and secondary).
+FIRST_PORT = 2000
+PORT_STRIDE = 3
+# Traffic manager port of the first server, the next servers use the following ports.
+FIRST_TM_PORT = 8000
+# Number of times a failed trial is run again before it is recorded as an error.
+RETRIES = 2
+
+class Server(NamedTuple):
+    host: str
+    port: int
+    tm_port: int
+
+
+def local_servers(count: int, host: str = '127.0.0.1', first_port: int = FIRST_PORT,
+                  first_tm_port: int = FIRST_TM_PORT) -> List[Server]:
+    """Addresses of `count` servers started with -carla-rpc-port=<port> on one machine."""
+    return [Server(host, first_port + i * PORT_STRIDE, first_tm_port + i) for i in range(count)]
+
+
+# Batch runner of the worker process, bound to the server the worker took from the queue
+WORKER_RUNNER: Optional[BatchRunner] = None
+
+def init_worker(servers, CONTENT_FOLDER_PATH, runner_options) -> None:
+    global WORKER_RUNNER
+    server = servers.get()
+    print("Worker {} runs trials on {}:{} (TM {})".format(os.getpid(), server.host, server.port, server.tm_port))
+    WORKER_RUNNER = BatchRunner(CONTENT_FOLDER_PATH, server.host, server.port, server.tm_port,
+                                save_catalogue=False, **runner_options)
+
+def run_trial(trial: Trial, trial_no: int) -> list:
+    return WORKER_RUNNER.run_trial(trial, trial_no)
+
+
+class TrialPool:
+    """
+    Runs a trial matrix on several simulator instances at once.
+
+    Every worker process of a ProcessPoolExecutor takes one server from a
+    queue when it starts and keeps a BatchRunner (client and traffic manager)
+    on it, so trials are handed out to whichever server is free. Trials that
+    fail are run again in a later round, with a fresh pool if a worker died,
+    up to `retries` times. Results are collected and written by the parent
+    process only, as is the blueprint catalogue, which the parent indexes
+    before the workers start.
+
+    `runner_options` are passed on to BatchRunner; with a `client_factory`
+    of a fake server the scheduling can be exercised without a simulator.
+    """
+
+    def __init__(self, CONTENT_FOLDER_PATH: str, servers: List[Server], retries: int = RETRIES, **runner_options):
+        self.CONTENT_FOLDER_PATH = CONTENT_FOLDER_PATH
+        self.DATA_FOLDER_PATH = "{}{}".format(CONTENT_FOLDER_PATH, "/DataFiles")
+        self.servers = servers
+        self.retries = retries
+        self.runner_options = runner_options
+
+    def run_round(self, pending: List[Tuple[Trial, int, int]], results: List[list], total: int,
+                  started: float) -> List[Tuple[Trial, int, int]]:
+        """Run `pending` (trial, trial_no, attempt) on a new pool; returns the trials to retry."""
+        servers = multiprocessing.Queue()
+        for server in self.servers:
+            servers.put(server)
+
+        retry = []
+        with ProcessPoolExecutor(max_workers=len(self.servers), initializer=init_worker,
+                                 initargs=(servers, self.CONTENT_FOLDER_PATH, self.runner_options)) as pool:
+            futures = {pool.submit(run_trial, trial, trial_no): (trial, trial_no, attempt)
+                       for trial, trial_no, attempt in pending}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial, trial_no, attempt = futures.pop(future)
+                    try:
+                        row = future.result()
+                    except BrokenProcessPool as e:
+                        logging.error("Worker of trial %d died: %s", trial_no, e)
+                        row = failed_result(trial, trial_no)
+                    except Exception as e:
+                        logging.error("Trial %d (%s) failed: %s", trial_no, trial.scenario, e)
+                        row = failed_result(trial, trial_no)
+
+                    if row[5] == "error" and attempt < self.retries:
+                        retry.append((trial, trial_no, attempt + 1))
+                        continue
+                    write_result(self.DATA_FOLDER_PATH, row)
+                    results.append(row)
+                    print_progress(len(results), total, row, time.perf_counter() - started)
+        return retry
+
+    def save_catalogue(self) -> None:
+        """Index the blueprints of the first server, so the workers find the index saved."""
+        server = self.servers[0]
+        try:
+            client = (self.runner_options.get("client_factory") or carla.Client)(server.host, server.port)
+            client.set_timeout(10.0)
+            BlueprintCatalogue.snapshot(client, client.get_world(),
+                                        os.path.join(self.DATA_FOLDER_PATH, BLUEPRINT_CATALOGUE_FILE))
+        except RuntimeError as e:
+            logging.warning("Could not index the blueprints of %s:%d: %s", server.host, server.port, e)
+
+    def run(self, trials: List[Trial]) -> List[list]:
+        self.save_catalogue()
+        first_trial_no = load_config("{}{}".format(self.CONTENT_FOLDER_PATH, "/ConfigFiles/config.txt"),
+                                     self.runner_options.get("config_overrides")).trial_no
+        pending = [(trial, first_trial_no + i, 0) for i, trial in enumerate(trials)]
+        results = []
+        started = time.perf_counter()
+        while pending:
+            pending = self.run_round(pending, results, len(trials), started)
+            if pending:
+                print("Retrying {} failed trials".format(len(pending)))
+        return results
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description="Run scenario trials in parallel on several local servers")
+    add_batch_arguments(argparser)
+    argparser.add_argument('--servers', type=int, default=2, help='number of local servers (default: 2)')
+    argparser.add_argument('--first-port', type=int, default=FIRST_PORT)
+    argparser.add_argument('--first-tm-port', type=int, default=FIRST_TM_PORT)
+    argparser.add_argument('--retries', type=int, default=RETRIES)
+    args = argparser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    trials = trials_from_arguments(args)
+    pool = TrialPool(args.content, local_servers(args.servers, args.host, args.first_port, args.first_tm_port),
+                     args.retries, reload_world=args.reload, no_rendering=args.no_rendering,
+                     spawn_point=args.spawn_point, config_overrides=args.config_overrides)
+    started = time.perf_counter()
+    try:
+        results = pool.run(trials)
+    except KeyboardInterrupt:
+        print("Execution terminated!")
+        results = []
+    elapsed = time.perf_counter() - started
+    if results:
+        print("{} trials on {} servers in {:.1f} s: {:.1f} trials/hour".format(
+            len(results), args.servers, elapsed, len(results) * 3600.0 / elapsed))
@@ -0,0 +1,86 @@
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# File name of the trial store inside the data folder.
+TRIAL_STORE_FILE = "TrialStore.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    participant_id TEXT NOT NULL,
+    rsvp INTEGER NOT NULL,
+    tts INTEGER NOT NULL,
+    trial_no INTEGER NOT NULL,
+    scenario TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trials_by_participant ON trials (participant_id, trial_no);
+CREATE INDEX IF NOT EXISTS trials_by_scenario ON trials (scenario, rsvp, tts);
+CREATE TABLE IF NOT EXISTS columns (
+    trial_id INTEGER NOT NULL REFERENCES trials (id),
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (trial_id, name)
+);
+"""
+
+class TrialStore:
+    """
+    Append-only store of trial results in a single SQLite database (WAL mode).
+
+    Each trial is one row in `trials`, indexed by participant/trial and by
+    scenario/RSVP/TTS, and its typed columns are stored as raw NumPy buffers.
+    A trial and all of its columns are written in one transaction, so readers
+    never see a partially written trial.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def write_trial(self, participant_id: str, rsvp: int, tts: int, trial_no: int, scenario: str,
+                    columns: Dict[str, np.ndarray]) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO trials (participant_id, rsvp, tts, trial_no, scenario, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (participant_id, rsvp, tts, trial_no, scenario, time.time()))
+            trial_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO columns (trial_id, name, dtype, data) VALUES (?, ?, ?, ?)",
+                [(trial_id, name, column.dtype.str, column.tobytes()) for name, column in columns.items()])
+        return trial_id
+
+    def find_trials(self, participant_id: Optional[str] = None, rsvp: Optional[int] = None,
+                    tts: Optional[int] = None, trial_no: Optional[int] = None,
+                    scenario: Optional[str] = None) -> List[sqlite3.Row]:
+        """Trials matching every given key, e.g. find_trials(scenario="LVAD", rsvp=1)."""
+        filters = {"participant_id": participant_id, "rsvp": rsvp, "tts": tts, "trial_no": trial_no,
+                   "scenario": scenario}
+        filters = {key: value for key, value in filters.items() if value is not None}
+        query = "SELECT * FROM trials"
+        if filters:
+            query += " WHERE " + " AND ".join("{} = ?".format(key) for key in filters)
+        self.connection.row_factory = sqlite3.Row
+        try:
+            return self.connection.execute(query + " ORDER BY id", tuple(filters.values())).fetchall()
+        finally:
+            self.connection.row_factory = None
+
+    def load_columns(self, trial_id: int) -> Dict[str, np.ndarray]:
+        rows = self.connection.execute("SELECT name, dtype, data FROM columns WHERE trial_id = ?", (trial_id,))
+        return {name: np.frombuffer(data, dtype=np.dtype(dtype)) for name, dtype, data in rows}
@@ -1,68 +1,60 @@
 from tkinter.tix import TEXT
 import numpy as np
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+import os
+import threading
 import time
 import carla
+from data_sink import TrialDataSink
+from trial_store import TrialStore, TRIAL_STORE_FILE
 
-def get_lane_offset(world, DReyeVR_vehicle, last_logged_at):
-    ego_position = DReyeVR_vehicle.get_location()
-    lane_center = world.get_map().get_waypoint(ego_position).transform.location
-    if (time.time() - last_logged_at >= 0.2):
-        return (ego_position.distance(lane_center), time.time())
-    else:
-        return (None, None)
-
-def collision_performance(carla, world, DReyeVR_vehicle, collision_data):
-    blueprint_library = world.get_blueprint_library()
-    collision_sensor = world.spawn_actor(blueprint_library.find('sensor.other.collision'),
-                                        carla.Transform(), attach_to=DReyeVR_vehicle)
-    collision_sensor.listen(lambda event: collision_handler(event, collision_data))
-    
-def collision_handler(event, list):
-    list.append([str(event.time_stamp), str(event.other_actor)])
-
-def write_performance_data(DATA_FILE_PATH, configurations, lp_data, collision_data, scenario):
-    if configurations["IGNORE"] == "0":
-        first_rows = [configurations["PARTICIPANT_ID"], configurations["RSVP"], configurations["TTS"], configurations["TRIAL_NO"]]
-        append_csv_row(DATA_FILE_PATH + "/LanePositionDifference.csv", first_rows + lp_data)
-        if len(collision_data) == 0:
-            append_csv_row(DATA_FILE_PATH + "/CollisionData.csv", first_rows + ["No Collision"])
-        else:
-            append_csv_row(DATA_FILE_PATH + "/CollisionData.csv", first_rows + collision_data)
-        append_csv_row(DATA_FILE_PATH + "/Scenario.csv", first_rows + [scenario])
-        print(first_rows + collision_data)
-
-def append_csv_row(FILE_PATH, list):
-    file = open(FILE_PATH, "a")
-    row = "\n"
-    for i in range(0, len(list) - 1):
-        row += "{}, ".format(list[i])
-    row += "{}".format(list[i+1])
-    file.write(row)
-    file.close()
-
-def read_config_file(CONFIG_FILE_PATH):
-    f = open(CONFIG_FILE_PATH, "r")
-    configurations = f.read()
-     
-    PARTICIPANT_ID_pos = configurations.find("PARTICIPANT_ID") + len("PARTICIPANT_ID") + 2
-    TRIAL_NO_pos = configurations.find("TRIAL_NO") + len("TRIAL_NO") + 2
-    IGNORE_pos = configurations.find("IGNORE") + len("IGNORE") + 2
-    RSVP_pos = configurations.find("RSVP") + len("RSVP") + 2
-    TTS_pos = configurations.find("TTS") + len("TTS") + 2
-    WPM_pos = configurations.find("WPM") + len("WPM") + 2
-    TEXTFILE_pos = configurations.find("TEXTFILE") + len("TEXTFILE") + 2
-
-    PARTICIPANT_ID = configurations[PARTICIPANT_ID_pos : PARTICIPANT_ID_pos + 3]
-    TRIAL_NO = configurations[TRIAL_NO_pos: TRIAL_NO_pos + 1]
-    IGNORE = configurations[IGNORE_pos: IGNORE_pos + 1]
-    RSVP = configurations[RSVP_pos: RSVP_pos + 1]
-    WPM = configurations[WPM_pos: WPM_pos + 3]
-    TTS = configurations[TTS_pos: TTS_pos + 1]
-    TEXTFILE = configurations[TEXTFILE_pos: TEXTFILE_pos + 5]
-
-    return {"PARTICIPANT_ID": PARTICIPANT_ID, "TRIAL_NO": TRIAL_NO, "IGNORE": IGNORE, "RSVP": RSVP, "WPM": WPM, "TTS": TTS, "TEXTFILE": TEXTFILE}
+# Sub-folder of the data folder with the raw lane offset samples of each trial, when they are kept.
+RAW_LANE_OFFSET_FOLDER = "LaneOffsets"
+
+def write_performance_data(DATA_FILE_PATH, configurations, lp_stats, lp_data, collision_data, scenario):
+    if not configurations.ignore:
+        first_rows = configurations.first_rows()
+        sink = TrialDataSink(DATA_FILE_PATH, "_".join(str(value) for value in first_rows + [scenario]))
+        # Summary of the lane offsets (samples, mean, SDLP, min, max, percentiles), see running_stats.py
+        lp_summary = lp_stats.summary()
+        sink.add_row("LanePositionDifference.csv", first_rows + [round(value, 4) for value in lp_summary])
+        if configurations.raw_lane_offsets:
+            sink.write_array(RAW_LANE_OFFSET_FOLDER, lp_data, dtype=np.float32)
+        # One row per contact (see collisions.py): first, last, actor type, actor id, peak impulse, events
+        contacts = [[round(float(contact["first"]), 4), round(float(contact["last"]), 4), str(contact["actor_type"]),
+                     int(contact["actor_id"]), round(float(contact["peak_impulse"]), 2), int(contact["events"])]
+                    for contact in collision_data]
+        if len(contacts) == 0:
+            sink.add_row("CollisionData.csv", first_rows + ["No Collision"])
+        for contact in contacts:
+            sink.add_row("CollisionData.csv", first_rows + contact)
+        sink.add_row("Scenario.csv", first_rows + [scenario])
+
+        sink.add_column("lane_offset_summary", lp_summary, dtype=np.float64)
+        sink.add_column("collision_time", collision_data["first"], dtype=np.float64)
+        sink.add_column("collision_end", collision_data["last"], dtype=np.float64)
+        sink.add_column("collision_actor", collision_data["actor_type"], dtype=np.str_)
+        sink.add_column("collision_actor_id", collision_data["actor_id"], dtype=np.int64)
+        sink.add_column("collision_peak_impulse", collision_data["peak_impulse"], dtype=np.float64)
+        # Index the trial in the session store before the columns are flushed to disk
+        with TrialStore(os.path.join(DATA_FILE_PATH, TRIAL_STORE_FILE)) as store:
+            store.write_trial(configurations.participant_id, int(configurations.rsvp), int(configurations.tts),
+                              configurations.trial_no, scenario, sink.columns)
+        sink.flush()
+        print(first_rows + contacts)
+
+def write_tick_profile(DATA_FILE_PATH, configurations, profiler, scenario):
+    # Frame time percentiles per phase and the slowest frames, next to the performance data
+    if not configurations.ignore:
+        first_rows = configurations.first_rows()
+        sink = TrialDataSink(DATA_FILE_PATH, "_".join(str(value) for value in first_rows + [scenario]))
+        for row in profiler.summary_rows():
+            sink.add_row("TickProfile.csv", first_rows + [scenario] + row)
+        for row in profiler.outlier_rows():
+            sink.add_row("TickOutliers.csv", first_rows + [scenario] + row)
+        sink.flush(columnar=False)
+    print(profiler.report())
 
 def reset_stream_file(file_path):
     try:
@@ -72,56 +64,35 @@ def reset_stream_file(file_path):
     except:
         print("Error occured while opening/writing to the signal file")   
 
-def write_signal_file(file_path, signal):
-    for i in range(0, 10):
-        bool = write_signal_helper(file_path, signal)
-        if bool:
-            break
+def get_actor_blueprints(catalogue, filter, generation):
+    bps = catalogue.filter(filter)
 
-def write_signal_helper(file_path, signal):
-    try:
-        f = open(file_path, "w", encoding="utf8")
-        f.write(str(signal))
-        f.close()
-        return True
-    except:
-        print("Error occured while opening/writing to the signal file")
-    return False
+    if generation.lower() == "all":
+        return bps
 
-def read_signal_file(file_path):
-    for i in range(0, 10):
-        signal, bool = read_signal_helper(file_path)
-        if bool:
-            return signal
-    return None
+    # If the filter returns only one bp, we assume that this one needed
+    # and therefore, we ignore the generation
+    if len(bps) == 1:
+        return bps
 
-def read_signal_helper(file_path):
     try:
-        f = open(file_path, "r", encoding="utf8")
-        signal = int(f.read())
-        f.close()
-        return (signal, True)
+        int_generation = int(generation)
+        # Check if generation is in available generations
+        if int_generation in [1, 2]:
+            bps = [x for x in bps if catalogue.generation(x.id) == int_generation]
+            return bps
+        else:
+            print("   Warning! Actor Generation is not valid. No actor will be spawned.")
+            return []
     except:
-        print("Error occured while opening/writing to the signal file")
-    return (None, False)
+        print("   Warning! Actor Generation is not valid. No actor will be spawned.")
+        return []
+
+def vehicle_blueprints(catalogue):
+    # Four-wheeled traffic vehicles, without the ego vehicle, in a stable order for seeding
+    blueprints = get_actor_blueprints(catalogue, 'vehicle.*', 'All')
+    return [bp for bp in blueprints if "dreyevr" not in bp.id and catalogue.wheels(bp.id) != 2]
 
-def extract_text(TEXT_FILE_PATH):
-    try:
-        f = open(TEXT_FILE_PATH, "r", encoding="utf8")
-        string = f.read()
-        f.close()
-        return string
-    except:
-        print("Error opening the reading comprehension text file.")
-
-def wait(world, duration):
-  target_time = time.time() + duration
-  while time.time() < target_time:
-    world.tick()
-    
-def wait_for_NDRT(SIGNAL_FILE_PATH, world):
-    while read_signal_file(SIGNAL_FILE_PATH) != 3:
-        world.tick()
 def find_ego_vehicle(world: carla.libcarla.World) -> Optional[carla.libcarla.Vehicle]:
     DReyeVR_vehicle = None
     ego_vehicles = world.get_actors().filter("vehicle.dreyevr.egovehicle")
@@ -142,12 +113,82 @@ def find_ego_sensor(world: carla.libcarla.World) -> Optional[carla.libcarla.Sens
     return sensor
 
 
+# Frames of eye tracker data a DReyeVRSensor keeps, about 40 s at the 90-120 Hz of the tracker.
+EYE_TRACKER_BUFFER = 4096
+# Characters kept of the string fields of the sensor data, e.g. the name of the focused actor.
+EYE_TRACKER_STRING_WIDTH = 64
+
+# How a field of the sensor data is decoded into the ring buffer
+VECTOR3, VECTOR2, TRANSFORM, SCALAR, STRING = range(5)
+
+def compile_sensor_schema(data) -> Tuple[np.dtype, List[Tuple[str, int]]]:
+    """
+    Record layout for the fields of a DReyeVR sensor frame: vectors become
+    float sub-arrays, transforms a location and a rotation (pitch, yaw, roll),
+    numbers and flags scalars and strings fixed-width text. Methods and
+    fields of any other type are left out.
+    """
+    fields = []
+    decoders = []
+    for name in dir(data):
+        if name.startswith("_"):
+            continue
+        value = getattr(data, name)
+        if callable(value):
+            continue
+        if isinstance(value, carla.libcarla.Vector3D):
+            fields.append((name, np.float64, (3,)))
+            decoders.append((name, VECTOR3))
+        elif isinstance(value, carla.libcarla.Vector2D):
+            fields.append((name, np.float64, (2,)))
+            decoders.append((name, VECTOR2))
+        elif isinstance(value, carla.libcarla.Transform):
+            fields.append((name + "_location", np.float64, (3,)))
+            fields.append((name + "_rotation", np.float64, (3,)))
+            decoders.append((name, TRANSFORM))
+        elif isinstance(value, (bool, np.bool_)):
+            fields.append((name, np.bool_))
+            decoders.append((name, SCALAR))
+        elif isinstance(value, (int, np.integer)):
+            fields.append((name, np.int64))
+            decoders.append((name, SCALAR))
+        elif isinstance(value, (float, np.floating)):
+            fields.append((name, np.float64))
+            decoders.append((name, SCALAR))
+        elif isinstance(value, str):
+            fields.append((name, "U{}".format(EYE_TRACKER_STRING_WIDTH)))
+            decoders.append((name, STRING))
+    return np.dtype(fields), decoders
+
+
 class DReyeVRSensor:
-    def __init__(self, world: carla.libcarla.World):
+    """
+    Eye tracker data of the DReyeVR sensor, kept in a ring buffer.
+
+    The layout of a frame is compiled from the first frame the sensor sends
+    (see compile_sensor_schema), after which every frame is decoded straight
+    into the next preallocated row of a structured NumPy array, without
+    looking the fields up again or allocating arrays per field. recent(n)
+    returns the last n frames as one structured array. `data` keeps its
+    original shape: the fields of the latest frame under their own names, with
+    vectors as arrays and transforms as [location, rotation].
+    """
+
+    def __init__(self, world: carla.libcarla.World, capacity: int = EYE_TRACKER_BUFFER):
         self.ego_sensor: carla.sensor.dreyevrsensor = find_ego_sensor(world)
-        self.data: Dict[str, Any] = {}
+        self.capacity = capacity
+        self.buffer: Optional[np.ndarray] = None
+        self.decoders: List[Tuple[str, int]] = []
+        # Frames received so far; the latest is at (count - 1) % capacity
+        self.count = 0
+        self.latest = None
+        self.lock = threading.Lock()
         print("initialized DReyeVRSensor PythonAPI client")
 
+    def compile(self, data) -> None:
+        dtype, self.decoders = compile_sensor_schema(data)
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+
     def preprocess(self, obj: Any) -> Any:
         if isinstance(obj, carla.libcarla.Vector3D):
             return np.array([obj.x, obj.y, obj.z])
@@ -161,10 +202,44 @@ class DReyeVRSensor:
         return obj
 
     def update(self, data) -> None:
-        # update local variables
-        elements: List[str] = [key for key in dir(data) if "__" not in key]
-        for key in elements:
-            self.data[key] = self.preprocess(getattr(data, key))
+        with self.lock:
+            if self.buffer is None:
+                self.compile(data)
+            self.latest = data
+            row = self.buffer[self.count % self.capacity]
+            for name, kind in self.decoders:
+                value = getattr(data, name)
+                if kind == SCALAR:
+                    row[name] = value
+                elif kind == VECTOR3:
+                    row[name] = (value.x, value.y, value.z)
+                elif kind == TRANSFORM:
+                    location = value.location
+                    rotation = value.rotation
+                    row[name + "_location"] = (location.x, location.y, location.z)
+                    row[name + "_rotation"] = (rotation.pitch, rotation.yaw, rotation.roll)
+                elif kind == VECTOR2:
+                    row[name] = (value.x, value.y)
+                else:
+                    row[name] = value[:EYE_TRACKER_STRING_WIDTH]
+            self.count += 1
+
+    def recent(self, n: int) -> np.ndarray:
+        """Copy of the last `n` frames (fewer if not received yet), oldest first."""
+        with self.lock:
+            if self.buffer is None:
+                return np.zeros(0)
+            n = min(n, self.count, self.capacity)
+            return self.buffer[np.arange(self.count - n, self.count) % self.capacity]
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Fields of the latest frame, converted only when they are asked for."""
+        with self.lock:
+            latest = self.latest
+        if latest is None:
+            return {}
+        return {key: self.preprocess(getattr(latest, key)) for key in dir(latest) if "__" not in key}
 
     @classmethod
     def spawn(cls, world: carla.libcarla.World):
@@ -219,3 +294,37 @@ class DReyeVRSensor:
         FinalRay = ptM - oM  # Combined ray between midpoints of endpoints
         # returns the magnitude of the vector (length)
         return np.linalg.norm(FinalRay) / 100.0
+
+    def calc_vergence_from_dirs(self, L0, R0, LDir, RDir):
+        # Same as calc_vergence_from_dir for many ray pairs at once, see calc_vergence
+        return calc_vergence(L0, R0, LDir, RDir)
+
+
+def calc_vergence(L0, R0, LDir, RDir, epsilon=1e-8):
+    """
+    Vergence of N left/right gaze ray pairs given as (N, 3) arrays of origins
+    and directions, as an (N,) array; the vectorised calc_vergence_from_dir.
+    Near-parallel pairs (no closest approach) get 1.0 like the scalar version.
+    """
+    L0 = np.asarray(L0, dtype=np.float64)
+    R0 = np.asarray(R0, dtype=np.float64)
+    LDir = np.asarray(LDir, dtype=np.float64)
+    RDir = np.asarray(RDir, dtype=np.float64)
+
+    L0R0 = L0 - R0
+    d1343 = np.einsum("...i,...i->...", L0R0, RDir)
+    d4321 = np.einsum("...i,...i->...", RDir, LDir)
+    d1321 = np.einsum("...i,...i->...", L0R0, LDir)
+    d4343 = np.einsum("...i,...i->...", RDir, RDir)
+    d2121 = np.einsum("...i,...i->...", LDir, LDir)
+    denom = d2121 * d4343 - d4321 * d4321
+    numer = d1343 * d4321 - d1321 * d4343
+
+    # Divide by 1 where the rays are parallel, those entries are replaced afterwards
+    parallel = np.abs(denom) < epsilon
+    muL = numer / np.where(parallel, 1.0, denom)
+    muR = (d1343 + d4321 * muL) / np.where(parallel, 1.0, d4343)
+
+    # Midpoint of the shortest segment between the rays relative to the midpoint of the origins
+    FinalRay = (muL[..., None] * LDir + muR[..., None] * RDir) / 2.0
+    return np.where(parallel, 1.0, np.linalg.norm(FinalRay, axis=-1) / 100.0)
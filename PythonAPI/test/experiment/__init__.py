@@ -0,0 +1,37 @@
+# Tests of the experiment scripts (PythonAPI/experiment), run against the
+# in-process fake server of fake_carla.py, so no simulator or GPU is needed:
+#
+#   python -m pytest PythonAPI/test/experiment
+
+import os
+import sys
+
+EXPERIMENT_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "experiment"))
+if EXPERIMENT_FOLDER not in sys.path:
+    sys.path.insert(0, EXPERIMENT_FOLDER)
+
+import fake_carla
+fake_carla.install()
+
+# Settings of the config.txt of a test content folder
+CONFIG = {
+    "PARTICIPANT_ID": "test",
+    "TRIAL_NO": "1",
+    "IGNORE": "0",
+    "RSVP": "0",
+    "WPM": "180",
+    "TTS": "0",
+    "TEXTFILE": "Text0",
+}
+TEXT = "This is a short reading text. It has two sentences."
+
+def make_content_folder(root: str, **settings) -> str:
+    """Content folder with a config.txt (CONFIG updated with `settings`), a text and an empty DataFiles folder."""
+    config = dict(CONFIG, **{key.upper(): str(value) for key, value in settings.items()})
+    os.makedirs(os.path.join(root, "ConfigFiles"), exist_ok=True)
+    os.makedirs(os.path.join(root, "DataFiles"), exist_ok=True)
+    with open(os.path.join(root, "ConfigFiles", "config.txt"), "w", encoding="utf8") as file:
+        file.write("\n".join("{}: {}".format(key, value) for key, value in config.items()))
+    with open(os.path.join(root, "ConfigFiles", config["TEXTFILE"] + ".txt"), "w", encoding="utf8") as file:
+        file.write(TEXT)
+    return root
@@ -0,0 +1,130 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from . import make_content_folder
+
+import batch_runner
+import fake_carla
+import lane_offset
+import utils
+from batch_runner import BATCH_RESULTS_FILE, RESULT_COLUMNS, BatchRunner, Trial, trial_matrix
+from scenario import Scenario
+from telemetry import TELEMETRY_FOLDER, read_telemetry
+
+
+class FailingScenario(Scenario):
+    name = "Failing"
+
+    def setup(self, run):
+        raise RuntimeError("setup fails")
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.runner = None
+
+    def tearDown(self):
+        if self.runner is not None:
+            self.runner.close()
+        shutil.rmtree(self.folder)
+
+    def make_runner(self, **options):
+        self.runner = BatchRunner(self.folder, client_factory=fake_carla.Client, **options)
+        return self.runner
+
+    def result_rows(self):
+        with open(os.path.join(self.folder, "DataFiles", BATCH_RESULTS_FILE), encoding="utf8") as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[0], ", ".join(RESULT_COLUMNS))
+        return [line.split(", ") for line in lines[1:]]
+
+    def test_run_writes_results(self):
+        results = self.make_runner().run([Trial("LVAD", 0, 0, 0), Trial("EW", 1, 1, 3)])
+        self.assertEqual([row[5] for row in results], ["ok", "ok"])
+        rows = self.result_rows()
+        self.assertEqual([row[:6] for row in rows],
+                         [["LVAD", "0", "0", "0", "1", "ok"], ["EW", "1", "1", "3", "2", "ok"]])
+        self.assertTrue(all(len(row) == len(RESULT_COLUMNS) for row in rows))
+
+    def test_reset_puts_ego_back(self):
+        runner = self.make_runner()
+        self.assertEqual(runner.run_trial(Trial("CSA", 0, 0, 0), 1)[5], "ok")
+        runner.reset_world(7)
+        ego = utils.find_ego_vehicle(runner.client.get_world())
+        self.assertEqual(ego.get_location().distance(runner.ego_start.location), 0)
+        # The teardown pins the ego and brakes; the reset releases it so the autopilot can drive the next trial
+        self.assertIsNone(ego.constant_velocity)
+        self.assertEqual(ego.get_control().brake, 0)
+        self.assertEqual(runner.client.get_trafficmanager(runner.tm_port).seed, 7)
+        self.assertEqual(runner.run_trial(Trial("CSA", 0, 0, 0), 2)[5], "ok")
+
+    def test_same_seed_reproduces_trial(self):
+        runner = self.make_runner()
+        # The first trial of a batch runs on a fresh world, the others after a trial of another seed
+        trials = [Trial("ACR", 0, 0, 0), Trial("ACR", 0, 0, 1), Trial("ACR", 0, 0, 0), Trial("ACR", 0, 0, 0)]
+        rows = runner.run(trials)
+        logs = [read_telemetry(glob.glob(os.path.join(self.folder, "DataFiles", TELEMETRY_FOLDER,
+                                                      "*_{}_ACR.tlm".format(trial_no)))[0])
+                for trial_no in (1, 3, 4)]
+        fields = [name for name in logs[0].dtype.names if name not in ("frame", "elapsed_seconds")]
+        for log in logs[1:]:
+            self.assertEqual(len(log), len(logs[0]))
+            for name in fields:
+                np.testing.assert_array_equal(log[name], logs[0][name], err_msg=name)
+        for row in (rows[2], rows[3]):
+            # Everything but the trial number and the wall clock measurements
+            self.assertEqual(row[:4] + row[5:6] + row[7:-1], rows[0][:4] + rows[0][5:6] + rows[0][7:-1])
+
+    def test_lane_index_built_once(self):
+        lane_offset.INDEX_CACHE.clear()
+        generate_waypoints = fake_carla.Map.generate_waypoints
+        with mock.patch.object(fake_carla.Map, "generate_waypoints", autospec=True,
+                               side_effect=generate_waypoints) as scan:
+            results = self.make_runner(reload_world=True).run([Trial("EW", 0, 0, 0), Trial("LVAD", 0, 0, 1)])
+        self.assertEqual([row[5] for row in results], ["ok", "ok"])
+        # The map is scanned for the first trial only, also when the world is reloaded
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(list(lane_offset.INDEX_CACHE), [("FakeHighway", lane_offset.WAYPOINT_RESOLUTION,
+                                                          lane_offset.GRID_CELL_SIZE)])
+
+    def test_reload_world(self):
+        runner = self.make_runner(reload_world=True)
+        episode = runner.client.get_world().episode_id
+        results = runner.run([Trial("ACR", 0, 0, 0), Trial("ACR", 0, 0, 1)])
+        self.assertEqual([row[5] for row in results], ["ok", "ok"])
+        self.assertEqual(runner.client.get_world().episode_id, episode + 2)
+
+    def test_stand_in_ego(self):
+        # A stock server has no DReyeVR ego, so one is spawned for every trial
+        fake_carla.SERVERS[("127.0.0.1", 2000)] = fake_carla.Server(ego=False)
+        runner = self.make_runner()
+        self.assertEqual(runner.run_trial(Trial("LVAD", 0, 0, 0), 1)[5], "ok")
+        self.assertEqual(len(runner.client.get_world().get_actors().filter("vehicle.*")), 0)
+
+    def test_failed_trial(self):
+        batch_runner.SCENARIOS["Failing"] = FailingScenario
+        try:
+            results = self.make_runner().run([Trial("Failing", 0, 0, 0), Trial("EW", 0, 0, 0)])
+        finally:
+            del batch_runner.SCENARIOS["Failing"]
+        # The failure is recorded and the world is reset for the next trial
+        self.assertEqual([row[5] for row in results], ["error", "ok"])
+        self.assertEqual(len(self.result_rows()), 2)
+
+    def test_trial_matrix(self):
+        trials = trial_matrix(["ACR", "EW"], [0, 1])
+        self.assertEqual(len(trials), 16)
+        self.assertEqual(len(set(trials)), 16)
+        self.assertEqual(trials[0], Trial("ACR", 0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import fake_carla
+from utils import DReyeVRSensor
+
+
+class EyeTrackerFrame:
+    """Stand-in for the carla.DReyeVRSensor data of one frame."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.timestamp_carla = 1000 * frame
+        self.gaze_valid = True
+        self.gaze_ray = fake_carla.Vector3D(1.0, 0.1 * frame, 0.0)
+        self.pupil_diameter = 3.5
+        self.focus_actor_name = "Vehicle_{}".format(frame)
+        self.transform = fake_carla.Transform(fake_carla.Location(1.0, 2.0, 3.0), fake_carla.Rotation(0.0, 90.0, 0.0))
+
+
+class TestDReyeVRSensor(unittest.TestCase):
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.sensor = DReyeVRSensor(fake_carla.Client("127.0.0.1", 2000).get_world(), capacity=4)
+
+    def test_data_keeps_sensor_values(self):
+        self.assertEqual(self.sensor.data, {})
+        self.sensor.update(EyeTrackerFrame(1))
+        self.sensor.update(EyeTrackerFrame(2))
+        data = self.sensor.data
+        self.assertEqual(data["frame"], 2)
+        self.assertIsInstance(data["frame"], int)
+        self.assertEqual(data["focus_actor_name"], "Vehicle_2")
+        np.testing.assert_array_equal(data["gaze_ray"], [1.0, 0.2, 0.0])
+        location, rotation = data["transform"]
+        np.testing.assert_array_equal(location, [1.0, 2.0, 3.0])
+        np.testing.assert_array_equal(rotation, [0.0, 90.0, 0.0])
+        self.assertNotIn("transform_location", data)
+
+    def test_recent_frames(self):
+        for frame in range(1, 7):
+            self.sensor.update(EyeTrackerFrame(frame))
+        recent = self.sensor.recent(10)
+        np.testing.assert_array_equal(recent["frame"], [3, 4, 5, 6])
+        np.testing.assert_allclose(recent["gaze_ray"][:, 1], [0.3, 0.4, 0.5, 0.6])
+        np.testing.assert_array_equal(recent["transform_rotation"][-1], [0.0, 90.0, 0.0])
+        self.assertEqual(recent["focus_actor_name"][-1], "Vehicle_6")
+
+    def test_schema_compiled_under_lock(self):
+        compile = DReyeVRSensor.compile
+
+        def locked_compile(sensor, data):
+            # recent() must not see the buffer before it is compiled
+            self.assertTrue(sensor.lock.locked())
+            compile(sensor, data)
+
+        with mock.patch.object(DReyeVRSensor, "compile", locked_compile):
+            self.sensor.update(EyeTrackerFrame(1))
+        self.assertEqual(len(self.sensor.recent(1)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
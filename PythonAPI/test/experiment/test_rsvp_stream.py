@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from . import make_content_folder
+
+from config import load_config
+from rsvp_stream import RING_CAPACITY, RingStream, RingStreamReader, open_stream_writer
+from scenario import ScenarioRun, Scenario
+
+
+class TestRingStreamReader(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.stream_file = os.path.join(self.folder, "TTSStreamFile.txt")
+        self.index_file = os.path.join(self.folder, "SentenceIndexFile.txt")
+        self.ring_file = os.path.join(self.folder, "RSVPStream.ring")
+        self.reader = RingStreamReader(self.ring_file)
+
+    def tearDown(self):
+        self.reader.close()
+        shutil.rmtree(self.folder)
+
+    def open_writer(self):
+        return open_stream_writer(self.stream_file, self.index_file, self.ring_file)
+
+    def write_words(self, writer, words):
+        for i, word in enumerate(words):
+            writer.write(word, i, 0, 0)
+
+    def test_reads_every_word_once(self):
+        self.assertEqual(self.reader.poll(), [])
+        writer = self.open_writer()
+        self.write_words(writer, ["one", "two"])
+        self.assertEqual([record.word for record in self.reader.poll()], ["one", "two"])
+        self.assertEqual(self.reader.poll(), [])
+        self.write_words(writer, ["three"])
+        writer.end_sentence(1, 14)
+        self.assertEqual([record.word for record in self.reader.poll()], ["three"])
+        self.assertEqual(self.reader.dropped, 0)
+        writer.close()
+        # The HUD's file protocol is still written
+        with open(self.stream_file) as file:
+            self.assertEqual(file.read(), "three")
+        with open(self.index_file) as file:
+            self.assertEqual(file.read(), "14")
+
+    def test_counts_overwritten_words(self):
+        writer = self.open_writer()
+        words = [str(i) for i in range(RING_CAPACITY + 10)]
+        self.write_words(writer, words)
+        records = self.reader.poll()
+        self.assertEqual([record.word for record in records], words[10:])
+        self.assertEqual(self.reader.dropped, 10)
+        writer.close()
+
+    def test_follows_recreated_ring(self):
+        writer = self.open_writer()
+        self.write_words(writer, ["a", "b", "c"])
+        self.assertEqual(len(self.reader.poll()), 3)
+        writer.close()
+        inode = os.stat(self.ring_file).st_ino
+        # A new TTS service starts the stream over while the reader keeps the ring mapped
+        writer = self.open_writer()
+        self.assertEqual(os.stat(self.ring_file).st_ino, inode)
+        self.assertEqual(self.reader.poll(), [])
+        self.write_words(writer, ["d"])
+        self.assertEqual([record.word for record in self.reader.poll()], ["d"])
+        self.assertEqual(self.reader.dropped, 0)
+        writer.close()
+
+    def test_recreated_while_writing(self):
+        # The reader is open while the old writer is still running, e.g. a TTS service that was not stopped
+        writer = self.open_writer()
+        self.write_words(writer, ["a", "b"])
+        self.assertEqual(len(self.reader.poll()), 2)
+        new_writer = RingStream(self.ring_file, capacity=RING_CAPACITY * 2, create=True)
+        self.write_words(new_writer, ["c"])
+        self.assertEqual([record.word for record in self.reader.poll()], ["c"])
+        self.assertEqual(self.reader.stream.capacity, RING_CAPACITY * 2)
+        writer.close()
+        new_writer.close()
+
+    def test_ignores_unfinished_ring(self):
+        open(self.ring_file, "wb").close()
+        self.assertEqual(self.reader.poll(), [])
+        with open(self.ring_file, "wb") as file:
+            file.write(b"\0" * 64)
+        self.assertEqual(self.reader.poll(), [])
+        writer = self.open_writer()
+        self.write_words(writer, ["a"])
+        self.assertEqual([record.word for record in self.reader.poll()], ["a"])
+        writer.close()
+
+
+class TestRingStreamConfig(unittest.TestCase):
+    def setUp(self):
+        self.folder = make_content_folder(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def start_tts(self, overrides):
+        configurations = load_config(os.path.join(self.folder, "ConfigFiles", "config.txt"), overrides)
+        run = ScenarioRun(Scenario(), self.folder, configurations)
+        with mock.patch("TTS.TTSService") as service:
+            run.start_tts()
+        return run, service.call_args[0]
+
+    def test_ring_disabled_by_default(self):
+        _, args = self.start_tts([])
+        self.assertIsNone(args[-1])
+
+    def test_ring_enabled(self):
+        run, args = self.start_tts(["RSVP_RING=1"])
+        self.assertEqual(args[-1], run.RING_STREAM_FILE)
+
+
+if __name__ == '__main__':
+    unittest.main()
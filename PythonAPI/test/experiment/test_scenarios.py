@@ -0,0 +1,111 @@
+import glob
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import make_content_folder
+
+import fake_carla
+from batch_runner import BatchRunner, Trial
+from telemetry import TELEMETRY_FOLDER, read_phases, read_telemetry
+from tor_metrics import tor_metrics
+
+
+class TestScenarios(unittest.TestCase):
+    """Every scenario runs end to end on the fake server, driven by the scripted driver."""
+
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.data_folder = os.path.join(self.folder, "DataFiles")
+        self.runner = BatchRunner(self.folder, client_factory=fake_carla.Client)
+        self.world = self.runner.client.get_world()
+        self.actors_before = sorted(actor.id for actor in self.world.get_actors())
+
+    def tearDown(self):
+        self.runner.close()
+        shutil.rmtree(self.folder)
+
+    def run_scenario(self, scenario):
+        row = self.runner.run_trial(Trial(scenario, 0, 0, 0), 1)
+        self.assertEqual(row[0], scenario)
+        self.assertEqual(row[5], "ok")
+        self.assertGreater(row[7], 0)
+        # The trial's actors are gone, the ego is left for the next trial
+        self.assertEqual(sorted(actor.id for actor in self.world.get_actors()), self.actors_before)
+
+        trial_name = "test_0_0_1_{}".format(scenario)
+        log = os.path.join(self.data_folder, TELEMETRY_FOLDER, trial_name + ".tlm")
+        records = read_telemetry(log)
+        phases = read_phases(log)
+        for phase in ("approach", "tor", "handover", "recovery"):
+            self.assertIn(phases.index(phase), records["phase"])
+        with open(os.path.join(self.data_folder, "Scenario.csv"), encoding="utf8") as file:
+            self.assertIn("test, 0, 0, 1, " + scenario, file.read())
+        trials = glob.glob(os.path.join(self.data_folder, "Trials", trial_name + ".*"))
+        self.assertEqual(len(trials), 1)
+        return row, tor_metrics(records, phases), trials[0]
+
+    def assert_reacted(self, metrics):
+        # The scripted driver reacts a fixed time after the TOR
+        self.assertGreater(metrics["time_to_hands_on"], 0)
+        self.assertLess(metrics["time_to_hands_on"], 2)
+
+    def test_animal_crossing(self):
+        row, metrics, _ = self.run_scenario("ACR")
+        self.assert_reacted(metrics)
+        self.assertEqual(row[8], 0)
+        # The crossing animals have left the ego's lane when it gets there, and the
+        # stationary one stands in the next lane, so there is no time to contact
+        self.assertTrue(math.isnan(metrics["min_ttc"]))
+        records = read_telemetry(os.path.join(self.data_folder, TELEMETRY_FOLDER, "test_0_0_1_ACR.tlm"))
+        self.assertLess(np.nanmin(records["hazard_gap"]), 3.5)
+
+    def test_construction_site(self):
+        row, metrics, _ = self.run_scenario("CSA")
+        self.assert_reacted(metrics)
+        self.assertEqual(row[8], 0)
+        # The barriers and the JCBs close the other lanes, the ego only passes them
+        self.assertTrue(math.isnan(metrics["min_ttc"]))
+
+    def test_lead_vehicle_deceleration(self):
+        row, metrics, trial = self.run_scenario("LVAD")
+        self.assert_reacted(metrics)
+        if row[8]:
+            self.assertEqual(metrics["min_ttc"], 0)
+            # One CollisionData row per contact, with a field per value
+            with open(os.path.join(self.data_folder, "CollisionData.csv"), encoding="utf8") as file:
+                contacts = [line.split(", ") for line in file.read().splitlines() if line]
+            self.assertEqual(len(contacts), row[8])
+            for contact in contacts:
+                self.assertEqual(len(contact), 10)
+                self.assertEqual(contact[:4], ["test", "0", "0", "1"])
+                self.assertGreaterEqual(float(contact[4]), metrics["tor_time"])
+                self.assertLessEqual(float(contact[4]), float(contact[5]))
+                self.assertTrue(contact[6].startswith("vehicle."))
+            # Contacts are timed in simulation seconds, within the handover window
+            if not trial.endswith(".npz"):
+                self.skipTest("the trial columns are written to Parquet")
+            with np.load(trial) as columns:
+                self.assertEqual(len(columns["collision_time"]), row[8])
+                self.assertTrue(np.all(columns["collision_time"] >= metrics["tor_time"]))
+        else:
+            self.assertGreater(metrics["min_ttc"], 0)
+
+    def test_extreme_weather(self):
+        weather = self.world.get_weather()
+        row, metrics, _ = self.run_scenario("EW")
+        self.assert_reacted(metrics)
+        self.assertEqual(row[8], 0)
+        # There is no obstacle, so no time to collision
+        self.assertTrue(math.isnan(metrics["min_ttc"]))
+        # The fog is lifted again in the recovery
+        self.assertEqual(self.world.get_weather().fog_density, weather.fog_density)
+
+
+if __name__ == '__main__':
+    unittest.main()
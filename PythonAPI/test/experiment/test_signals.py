@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+
+from . import make_content_folder
+
+import fake_carla
+from batch_runner import BatchRunner, Trial
+from config import load_config
+from signals import SHARED_MEMORY_NAME, FileSignalBus, SharedMemorySignalBus, open_signal_bus
+
+
+class TestSignalBusSetting(unittest.TestCase):
+    def setUp(self):
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.config_file = os.path.join(self.folder, "ConfigFiles", "config.txt")
+        self.signal_file = os.path.join(self.folder, "ConfigFiles", "SignalFile.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_setting(self):
+        self.assertEqual(load_config(self.config_file).signal_bus, "file")
+        self.assertEqual(load_config(self.config_file, ["SIGNAL_BUS=shm"]).signal_bus, "shm")
+        with self.assertRaises(ValueError):
+            load_config(self.config_file, ["SIGNAL_BUS=pipe"])
+
+    def test_file_bus(self):
+        bus = open_signal_bus("file", self.signal_file)
+        self.assertIsInstance(bus, FileSignalBus)
+        bus.write(1)
+        with open(self.signal_file) as file:
+            self.assertEqual(file.read(), "1")
+        bus.close()
+
+    def test_shared_memory_bus(self):
+        bus = open_signal_bus("shm", self.signal_file)
+        try:
+            self.assertIsInstance(bus, SharedMemorySignalBus)
+            reader = SharedMemorySignalBus()
+            self.assertIsNone(reader.read())
+            bus.write(2)
+            bus.write(2)
+            self.assertEqual(reader.read(), 2)
+            self.assertEqual(reader.sequence, 2)
+            reader.close()
+        finally:
+            bus.close()
+        self.assertFalse(os.path.exists(self.signal_file))
+
+    def test_stale_shared_memory_is_taken_over(self):
+        stale = SharedMemorySignalBus(create=True)
+        stale.write(3)
+        stale.memory.close()
+        bus = SharedMemorySignalBus(create=True)
+        self.assertIsNone(bus.read())
+        bus.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=SHARED_MEMORY_NAME)
+
+
+class TestScenarioSignalBus(unittest.TestCase):
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.signal_file = os.path.join(self.folder, "ConfigFiles", "SignalFile.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_trial(self, overrides):
+        runner = BatchRunner(self.folder, client_factory=fake_carla.Client, config_overrides=overrides)
+        try:
+            return runner.run_trial(Trial("EW", 0, 0, 0), 1)
+        finally:
+            runner.close()
+
+    def test_file_signals(self):
+        self.assertEqual(self.run_trial([])[5], "ok")
+        with open(self.signal_file) as file:
+            self.assertEqual(file.read(), "2")
+
+    def test_shared_memory_signals(self):
+        self.assertEqual(self.run_trial(["SIGNAL_BUS=shm"])[5], "ok")
+        self.assertFalse(os.path.exists(self.signal_file))
+        # The run removes its block when it ends
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=SHARED_MEMORY_NAME)
+
+
+if __name__ == '__main__':
+    unittest.main()
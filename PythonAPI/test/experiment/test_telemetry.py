@@ -0,0 +1,94 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import make_content_folder
+
+import fake_carla
+from batch_runner import BatchRunner, Trial
+from telemetry import TELEMETRY_FOLDER, TelemetryRecorder, read_phases, read_telemetry
+
+
+def record(recorder, frame):
+    transform = fake_carla.Transform()
+    recorder.record(frame, frame / 80.0, transform, fake_carla.Vector3D(), fake_carla.VehicleControl(),
+                    0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)
+
+
+class TestTelemetryRecorder(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, TELEMETRY_FOLDER, "trial.tlm")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        recorder = TelemetryRecorder(self.path, 100, ("setup", "approach"))
+        for frame in range(10, 20):
+            record(recorder, frame)
+        recorder.close()
+        records = read_telemetry(self.path)
+        self.assertEqual(list(records["frame"]), list(range(10, 20)))
+        self.assertEqual(read_phases(self.path), ("setup", "approach"))
+        self.assertEqual(recorder.gaps, 0)
+
+    def test_counts_skipped_frames(self):
+        recorder = TelemetryRecorder(self.path, 100, ("setup",))
+        for frame in (1, 2, 3, 7, 8, 10):
+            record(recorder, frame)
+        recorder.close()
+        self.assertEqual(recorder.gaps, 2)
+
+    def test_full_log_drops_records(self):
+        recorder = TelemetryRecorder(self.path, 3, ("setup",))
+        for frame in range(5):
+            record(recorder, frame)
+        recorder.close()
+        self.assertEqual(len(read_telemetry(self.path)), 3)
+        self.assertEqual(recorder.dropped, 2)
+
+
+class TestScenarioTelemetry(unittest.TestCase):
+    """Every tick of a run, including the ones scenarios make during setup and at the TOR, is logged."""
+
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.runner = BatchRunner(self.folder, client_factory=fake_carla.Client)
+
+    def tearDown(self):
+        self.runner.close()
+        shutil.rmtree(self.folder)
+
+    def assert_contiguous(self, scenario):
+        row = self.runner.run_trial(Trial(scenario, 0, 0, 0), 1)
+        self.assertEqual(row[5], "ok")
+        logs = glob.glob(os.path.join(self.folder, "DataFiles", TELEMETRY_FOLDER, "*_{}.tlm".format(scenario)))
+        self.assertEqual(len(logs), 1)
+        records = read_telemetry(logs[0])
+        self.assertGreater(len(records), 0)
+        np.testing.assert_array_equal(np.diff(records["frame"]), 1)
+        phases = read_phases(logs[0])
+        for phase in ("approach", "tor", "handover", "recovery"):
+            self.assertIn(phases.index(phase), records["phase"])
+        return records, phases
+
+    def test_construction_site_setup_ticks(self):
+        records, phases = self.assert_contiguous("CSA")
+        # The ticks of the construction site setup are part of the log
+        self.assertIn(phases.index("setup"), records["phase"])
+
+    def test_extreme_weather_fog_ramp(self):
+        records, phases = self.assert_contiguous("EW")
+        # The fog ramp ticks for 4.5 s of simulation time in the tor phase
+        tor = records[records["phase"] == phases.index("tor")]
+        self.assertGreaterEqual(tor["elapsed_seconds"][-1] - tor["elapsed_seconds"][0], 4.5 - 1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import fake_carla
+from hazard import HAZARD_RANGE, HazardProximity, box_corners, box_gap, time_to_contact
+from telemetry import TELEMETRY_DTYPE, TelemetryRecorder
+from tick_driver import ActorState, Frame
+from tor_metrics import analyse_log, tor_metrics, trial_keys
+
+PHASES = ("setup", "approach", "tor", "handover", "recovery")
+DT = 1 / 80
+
+
+def build_log(tor_tick=100, handover_ticks=400, recovery_ticks=50):
+    """
+    Ego driving along x at 20 m/s towards a hazard 60 m ahead, with the TOR at
+    `tor_tick`: the driver steers 0.5 s after the TOR and brakes 0.25 s later.
+    """
+    count = tor_tick + handover_ticks + recovery_ticks
+    records = np.zeros(count, TELEMETRY_DTYPE)
+    records["frame"] = np.arange(count)
+    records["elapsed_seconds"] = records["frame"] * DT
+    records["vx"] = 20.0
+    records["phase"] = PHASES.index("approach")
+    records["phase"][tor_tick] = PHASES.index("tor")
+    records["phase"][tor_tick + 1:tor_tick + handover_ticks] = PHASES.index("handover")
+    records["phase"][tor_tick + handover_ticks:] = PHASES.index("recovery")
+    # The autopilot's steering before the TOR is not a reaction
+    records["steer"] = 0.2
+    records["steer"][tor_tick + 40:] = 0.3
+    records["brake"][tor_tick + 60:] = 0.8
+    records["lane_offset"][tor_tick:tor_tick + handover_ticks] = np.tile([0.1, -0.1], handover_ticks // 2)
+    gap = 60.0 - records["elapsed_seconds"] * 20.0
+    records["hazard_gap"] = gap
+    records["closing_speed"] = 20.0
+    records["time_to_contact"] = gap / 20.0
+    # Passing beside the hazard: the gap still closes, but there is no collision course
+    records["time_to_contact"][tor_tick + 200:] = math.inf
+    # Before the TOR the smallest TTC doesn't count
+    records["time_to_contact"][:tor_tick] = 0.01
+    return records
+
+
+class TestTORMetrics(unittest.TestCase):
+    def test_reactions(self):
+        metrics = tor_metrics(build_log(), PHASES)
+        self.assertAlmostEqual(metrics["tor_time"], 100 * DT)
+        self.assertAlmostEqual(metrics["time_to_first_steer"], 0.5)
+        self.assertAlmostEqual(metrics["time_to_first_brake"], 0.75)
+        self.assertAlmostEqual(metrics["time_to_hands_on"], 0.5)
+        self.assertAlmostEqual(metrics["sdlp"], 0.1, places=3)
+        self.assertAlmostEqual(metrics["max_lateral_acceleration"], 0.0)
+
+    def test_min_ttc_while_on_collision_course(self):
+        metrics = tor_metrics(build_log(), PHASES)
+        # The last tick on a collision course is 199 ticks after the TOR
+        self.assertAlmostEqual(metrics["min_ttc"], (60.0 - 299 * DT * 20.0) / 20.0, places=4)
+
+    def test_no_ttc_without_hazard(self):
+        records = build_log()
+        for name in ("hazard_gap", "closing_speed", "time_to_contact"):
+            records[name] = math.nan
+        metrics = tor_metrics(records, PHASES)
+        self.assertTrue(math.isnan(metrics["min_ttc"]))
+        self.assertAlmostEqual(metrics["time_to_first_brake"], 0.75)
+
+    def test_no_ttc_when_never_on_collision_course(self):
+        records = build_log()
+        records["time_to_contact"][100:] = math.inf
+        self.assertTrue(math.isnan(tor_metrics(records, PHASES)["min_ttc"]))
+
+    def test_no_tor(self):
+        records = build_log()
+        records["phase"] = PHASES.index("approach")
+        metrics = tor_metrics(records, PHASES)
+        self.assertTrue(all(math.isnan(value) for value in metrics.values()))
+
+
+class TestAnalyseLog(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_row_from_log(self):
+        path = os.path.join(self.folder, "p1_1_0_3_ACR.tlm")
+        records = build_log()
+        recorder = TelemetryRecorder(path, len(records), PHASES)
+        recorder.records[:] = records
+        recorder.count = len(records)
+        recorder.header["count"] = recorder.count
+        recorder.close()
+        row = analyse_log(path)
+        self.assertEqual(row[:5], ["p1", "1", "0", "3", "ACR"])
+        self.assertAlmostEqual(row[5 + 2], 0.75)
+
+    def test_trial_keys(self):
+        self.assertEqual(trial_keys("/data/p_1_1_0_2_CSA.tlm"), ["p_1", "1", "0", "2", "CSA"])
+        self.assertEqual(trial_keys("odd.tlm"), ["odd", "", "", "", ""])
+
+
+def box_at(x, y, yaw=0.0, extent=(1.0, 1.0)):
+    transform = fake_carla.Transform(fake_carla.Location(x, y, 0), fake_carla.Rotation(yaw=yaw))
+    box = fake_carla.BoundingBox(fake_carla.Location(), fake_carla.Vector3D(extent[0], extent[1], 1.0))
+    return box_corners(transform, box)
+
+
+class TestHazardGeometry(unittest.TestCase):
+    def setUp(self):
+        fake_carla.reset_servers()
+
+    def test_gap(self):
+        self.assertAlmostEqual(box_gap(box_at(0, 0), box_at(5, 0))[0], 3.0)
+        self.assertAlmostEqual(box_gap(box_at(0, 0), box_at(5, 5))[0], math.hypot(3, 3))
+        self.assertEqual(box_gap(box_at(0, 0), box_at(1, 1))[0], 0.0)
+        # A box rotated by 45 degrees reaches out to its corner
+        self.assertAlmostEqual(box_gap(box_at(0, 0), box_at(5, 0, yaw=45))[0], 4 - math.sqrt(2))
+
+    def test_time_to_contact(self):
+        self.assertAlmostEqual(time_to_contact(box_at(10, 0), box_at(0, 0), 10, 0), 0.8)
+        self.assertEqual(time_to_contact(box_at(10, 3.5), box_at(0, 0), 10, 0), math.inf)
+        self.assertEqual(time_to_contact(box_at(10, 0), box_at(0, 0), -10, 0), math.inf)
+        self.assertEqual(time_to_contact(box_at(0, 0), box_at(1, 0), 0, 0), 0.0)
+        # Crossing into the path
+        self.assertAlmostEqual(time_to_contact(box_at(10, 5), box_at(0, 0), 10, 5), 0.8)
+
+    def spawn(self, ego_x=0.0, prop_x=20.0):
+        world = fake_carla.Client("proximity", 2000).get_world()
+        library = world.get_blueprint_library()
+        ego = world.spawn_actor(library.filter("vehicle.*")[0], fake_carla.Transform(fake_carla.Location(ego_x, 0, 0)))
+        prop = world.spawn_actor(library.filter("static.prop.*")[0],
+                                 fake_carla.Transform(fake_carla.Location(prop_x, 0, 0)))
+        return ego, prop
+
+    def frame(self, tick, ego, prop, prop_location=None):
+        prop_transform = prop.get_transform() if prop_location is None else fake_carla.Transform(prop_location)
+        return Frame(tick, fake_carla.Timestamp(tick, tick * DT, DT, 0.0), {
+            ego.id: ActorState(ego.get_transform(), fake_carla.Vector3D(10, 0, 0)),
+            prop.id: ActorState(prop_transform, fake_carla.Vector3D())})
+
+    def test_proximity(self):
+        ego, prop = self.spawn()
+        proximity = HazardProximity(ego, [prop])
+        frame = self.frame(1, ego, prop)
+        gap, closing_speed, contact = proximity.measure(frame)
+        extent = ego.bounding_box.extent.x + prop.bounding_box.extent.x
+        self.assertAlmostEqual(gap, 20 - extent)
+        self.assertAlmostEqual(closing_speed, 10)
+        self.assertAlmostEqual(contact, (20 - extent) / 10)
+        self.assertTrue(all(math.isnan(value) for value in HazardProximity(ego, []).measure(frame)))
+
+    def test_moved_prop(self):
+        # A prop the scenario moves towards the ego by 0.125 m a tick (10 m/s) reports no velocity
+        ego, prop = self.spawn()
+        proximity = HazardProximity(ego, [prop])
+        extent = ego.bounding_box.extent.x + prop.bounding_box.extent.x
+        self.assertAlmostEqual(proximity.measure(self.frame(1, ego, prop))[2], (20 - extent) / 10)
+        gap, closing_speed, contact = proximity.measure(self.frame(2, ego, prop, fake_carla.Location(19.875, 0, 0)))
+        self.assertAlmostEqual(gap, 19.875 - extent)
+        self.assertAlmostEqual(closing_speed, 20)
+        self.assertAlmostEqual(contact, (19.875 - extent) / 20)
+
+    def test_out_of_range(self):
+        ego, prop = self.spawn(prop_x=HAZARD_RANGE + 50)
+        proximity = HazardProximity(ego, [prop])
+        self.assertTrue(all(math.isnan(value) for value in proximity.measure(self.frame(1, ego, prop))))
+        # Within the range the prop is measured again
+        gap = proximity.measure(self.frame(2, ego, prop, fake_carla.Location(HAZARD_RANGE, 0, 0)))[0]
+        self.assertLess(gap, HAZARD_RANGE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from . import make_content_folder
+
+import batch_runner
+import fake_carla
+from batch_runner import BATCH_RESULTS_FILE, BatchRunner, Trial
+from blueprint_catalogue import BLUEPRINT_CATALOGUE_FILE, load_index
+from scenario import Scenario
+from trial_pool import TrialPool, local_servers
+
+
+class QuickScenario(Scenario):
+    """Short scenario without traffic that logs the worker and the server ports of every attempt."""
+
+    name = "Quick"
+    hazard_distance = 150.0
+    tor_distance = 50.0
+    handover_duration = 0.5
+    # File the attempts are logged to, set by the test before the pool forks its workers
+    log_file = None
+
+    def setup(self, run):
+        with open(self.log_file, "a", encoding="utf8") as file:
+            file.write("{} {} {} {} {}\n".format(self.name, run.configurations.trial_no, os.getpid(),
+                                                 run.client.address[1], run.tm_port))
+
+    def first_attempt(self, run):
+        with open(self.log_file, encoding="utf8") as file:
+            return sum(line.split()[:2] == [self.name, str(run.configurations.trial_no)] for line in file) == 1
+
+
+class CatalogueScenario(QuickScenario):
+    """Logs whether the worker had to index the blueprints itself."""
+
+    name = "Catalogue"
+
+    def setup(self, run):
+        super().setup(run)
+        with open(self.log_file + ".scanned", "a", encoding="utf8") as file:
+            file.write("{}\n".format(run.catalogue.scanned))
+
+
+class FlakyScenario(QuickScenario):
+    """Fails on the first attempt of every trial."""
+
+    name = "Flaky"
+
+    def setup(self, run):
+        super().setup(run)
+        if self.first_attempt(run):
+            raise RuntimeError("first attempt fails")
+
+
+class CrashingScenario(QuickScenario):
+    """Kills its worker process on the first attempt of every trial."""
+
+    name = "Crashing"
+
+    def setup(self, run):
+        super().setup(run)
+        if self.first_attempt(run):
+            os._exit(1)
+
+
+class BrokenScenario(QuickScenario):
+    name = "Broken"
+
+    def setup(self, run):
+        super().setup(run)
+        raise RuntimeError("always fails")
+
+
+class TestTrialPool(unittest.TestCase):
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+        self.log_file = os.path.join(self.folder, "attempts.txt")
+        QuickScenario.log_file = self.log_file
+        for scenario in (QuickScenario, CatalogueScenario, FlakyScenario, CrashingScenario, BrokenScenario):
+            batch_runner.SCENARIOS[scenario.name] = scenario
+        self.servers = local_servers(2)
+
+    def tearDown(self):
+        for name in ("Quick", "Catalogue", "Flaky", "Crashing", "Broken"):
+            del batch_runner.SCENARIOS[name]
+        shutil.rmtree(self.folder)
+
+    def run_pool(self, scenario, count, retries=2):
+        pool = TrialPool(self.folder, self.servers, retries, client_factory=fake_carla.Client)
+        return pool.run([Trial(scenario, 0, 0, seed) for seed in range(count)])
+
+    def attempts(self):
+        with open(self.log_file, encoding="utf8") as file:
+            return [(name, int(trial_no), int(pid), int(port), int(tm_port))
+                    for name, trial_no, pid, port, tm_port in (line.split() for line in file)]
+
+    def result_rows(self):
+        with open(os.path.join(self.folder, "DataFiles", BATCH_RESULTS_FILE), encoding="utf8") as file:
+            return file.read().splitlines()[1:]
+
+    def test_local_servers(self):
+        self.assertEqual([tuple(server) for server in self.servers],
+                         [("127.0.0.1", 2000, 8000), ("127.0.0.1", 2003, 8001)])
+
+    def test_every_trial_runs_once(self):
+        results = self.run_pool("Quick", 4)
+        self.assertEqual(sorted(row[4] for row in results), [1, 2, 3, 4])
+        self.assertEqual([row[5] for row in results], ["ok"] * 4)
+        self.assertEqual(len(self.result_rows()), 4)
+        self.assertEqual(sorted(trial_no for _, trial_no, _, _, _ in self.attempts()), [1, 2, 3, 4])
+
+    def test_worker_keeps_its_server(self):
+        self.run_pool("Quick", 6)
+        servers = {}
+        for _, _, pid, port, tm_port in self.attempts():
+            servers.setdefault(pid, set()).add((port, tm_port))
+        # Every worker runs all of its trials on one server, and no two workers share a server
+        self.assertTrue(all(len(ports) == 1 for ports in servers.values()))
+        used = [ports.pop() for ports in servers.values()]
+        self.assertEqual(len(used), len(set(used)))
+        self.assertTrue(set(used) <= {(server.port, server.tm_port) for server in self.servers})
+
+    def test_parent_saves_catalogue(self):
+        results = self.run_pool("Catalogue", 4)
+        self.assertEqual([row[5] for row in results], ["ok"] * 4)
+        path = os.path.join(self.folder, "DataFiles", BLUEPRINT_CATALOGUE_FILE)
+        version = fake_carla.Client("127.0.0.1", 2000).get_server_version()
+        self.assertIsNotNone(load_index(path, version))
+        # The index is saved before the workers start, so none of them scans the library
+        with open(self.log_file + ".scanned", encoding="utf8") as file:
+            self.assertEqual(file.read().split(), ["False"] * 4)
+
+    def test_failed_trials_are_retried(self):
+        results = self.run_pool("Flaky", 3)
+        self.assertEqual([row[5] for row in results], ["ok"] * 3)
+        self.assertEqual(sorted(row[4] for row in results), [1, 2, 3])
+        # The failed attempts are not written to the results
+        self.assertEqual(len(self.result_rows()), 3)
+        self.assertEqual(len(self.attempts()), 6)
+
+    def test_error_after_retries(self):
+        results = self.run_pool("Broken", 1, retries=1)
+        self.assertEqual([row[5] for row in results], ["error"])
+        self.assertEqual(len(self.attempts()), 2)
+
+    def test_recovers_from_dead_worker(self):
+        results = self.run_pool("Crashing", 2)
+        self.assertEqual(sorted(row[4] for row in results), [1, 2])
+        self.assertEqual([row[5] for row in results], ["ok"] * 2)
+
+
+class TestTrafficManagerPort(unittest.TestCase):
+    """Every autopilot command of a run goes to the traffic manager of its server, not the default port."""
+
+    def setUp(self):
+        fake_carla.reset_servers()
+        self.folder = make_content_folder(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_scenarios_use_run_tm_port(self):
+        runner = BatchRunner(self.folder, port=2003, tm_port=8001, client_factory=fake_carla.Client)
+        try:
+            for trial_no, scenario in enumerate(("ACR", "CSA", "LVAD", "EW"), 1):
+                self.assertEqual(runner.run_trial(Trial(scenario, 0, 0, 0), trial_no)[5], "ok")
+        finally:
+            runner.close()
+        self.assertEqual(set(fake_carla.SERVERS[("127.0.0.1", 2003)].traffic_managers), {8001})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import queue
+import unittest
+from unittest import mock
+
+import TTS
+
+
+class TestPause(unittest.TestCase):
+    def make_service(self):
+        # The queues of a service, without starting the TTS process
+        service = TTS.TTSService.__new__(TTS.TTSService)
+        service.commands = queue.Queue()
+        service.replies = queue.Queue()
+        service.pause_requests = 0
+        return service
+
+    def test_pause_returns_offset(self):
+        service = self.make_service()
+        service.replies.put(("paused", 1, 42))
+        self.assertEqual(service.pause(), 42)
+        self.assertEqual(service.commands.get_nowait(), ("pause", 1))
+
+    def test_late_reply_is_dropped(self):
+        service = self.make_service()
+        with mock.patch.object(TTS, "PAUSE_TIMEOUT", 0.01):
+            self.assertIsNone(service.pause())
+        # The reply to the timed out pause arrives before the one to the next pause
+        service.replies.put(("paused", 1, 10))
+        service.replies.put(("paused", 2, 42))
+        self.assertEqual(service.pause(), 42)
+        self.assertTrue(service.replies.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from utils import DReyeVRSensor, calc_vergence
+
+
+def scalar_vergence(L0, R0, LDir, RDir):
+    # The per-frame version does not use the sensor, so no world is needed
+    return DReyeVRSensor.calc_vergence_from_dir(None, np.asarray(L0, dtype=np.float64),
+                                                np.asarray(R0, dtype=np.float64),
+                                                np.asarray(LDir, dtype=np.float64),
+                                                np.asarray(RDir, dtype=np.float64))
+
+
+class TestVergence(unittest.TestCase):
+    L0 = [0.0, -3.2, 0.0]
+    R0 = [0.0, 3.2, 0.0]
+
+    def assert_matches_scalar(self, L0, R0, LDir, RDir):
+        vergence = calc_vergence(L0, R0, LDir, RDir)
+        self.assertEqual(vergence.shape, (len(L0),))
+        self.assertFalse(np.any(np.isnan(vergence)))
+        expected = [scalar_vergence(*pair) for pair in zip(L0, R0, LDir, RDir)]
+        np.testing.assert_allclose(vergence, expected, rtol=1e-9)
+        return vergence
+
+    def test_converging_rays(self):
+        # Both eyes look at a point 2 m ahead, the vergence is its distance in metres
+        target = np.array([200.0, 0.0, 0.0])
+        LDir = target - self.L0
+        RDir = target - self.R0
+        vergence = self.assert_matches_scalar([self.L0], [self.R0], [LDir], [RDir])
+        self.assertAlmostEqual(vergence[0], 2.0)
+
+    def test_random_rays(self):
+        rng = np.random.default_rng(0)
+        L0 = rng.normal(size=(100, 3))
+        R0 = rng.normal(size=(100, 3))
+        LDir = rng.normal(size=(100, 3))
+        RDir = rng.normal(size=(100, 3))
+        self.assert_matches_scalar(L0, R0, LDir, RDir)
+
+    def test_parallel_rays(self):
+        # Looking at infinity, and the same direction with a different length
+        LDir = [[1.0, 0.0, 0.0], [0.0, 0.6, 0.8]]
+        RDir = [[1.0, 0.0, 0.0], [0.0, 1.2, 1.6]]
+        vergence = self.assert_matches_scalar([self.L0] * 2, [self.R0] * 2, LDir, RDir)
+        np.testing.assert_array_equal(vergence, [1.0, 1.0])
+
+    def test_zero_length_directions(self):
+        # The eye tracker sends zero gaze directions while an eye is closed or not tracked
+        zero = [0.0, 0.0, 0.0]
+        gaze = [1.0, 0.1, 0.0]
+        LDir = [zero, gaze, zero]
+        RDir = [gaze, zero, zero]
+        vergence = self.assert_matches_scalar([self.L0] * 3, [self.R0] * 3, LDir, RDir)
+        np.testing.assert_array_equal(vergence, [1.0, 1.0, 1.0])
+
+    def test_mixed_batch(self):
+        # Parallel and degenerate pairs do not affect the other pairs of the batch
+        L0 = [self.L0] * 3
+        R0 = [self.R0] * 3
+        LDir = [[1.0, 0.0, 0.0], [0.0, 0.0, 0.0], [100.0, 3.2, 0.0]]
+        RDir = [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [100.0, -3.2, 0.0]]
+        vergence = self.assert_matches_scalar(L0, R0, LDir, RDir)
+        self.assertAlmostEqual(vergence[2], 1.0)
+        self.assertEqual(vergence[0], 1.0)
+
+    def test_sensor_method(self):
+        L0 = np.array([self.L0, self.R0])
+        LDir = np.array([[1.0, 0.05, 0.0], [1.0, 0.0, 0.0]])
+        RDir = np.array([[1.0, -0.05, 0.0], [1.0, 0.0, 0.0]])
+        np.testing.assert_array_equal(DReyeVRSensor.calc_vergence_from_dirs(None, L0, L0[::-1], LDir, RDir),
+                                      calc_vergence(L0, L0[::-1], LDir, RDir))
+
+
+if __name__ == '__main__':
+    unittest.main()